@@ -25,6 +25,7 @@ from dotenv import load_dotenv
 from src.agents.receive_sales_order import agent_receive_sales_order
 from src.agents.create_sales_order import agent_create_sales_order
 from src.prompt_engineering.topics.order_assistant import prompt_order_assistant
+from src.common.agent_setup_cache import setup_agent
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -84,7 +85,7 @@ def agent_flow_order():
 def agent_setup():
 
     agent_order = agent_flow_order()
-    agent_order.setup()
+    setup_agent(agent_order)
 
     payload = {
         "SourceTransactionNumber": "R13_Sample_Order_ATOModel_22",
@@ -28,6 +28,7 @@ from src.tools.vision_instruct_tools import image_to_text
 from src.prompt_engineering.topics.order_assistant import prompt_order_assistant
 from src.common.fency_title import animate
 from src.tools.dummy_email_tool import send_email_dummy
+from src.common.agent_setup_cache import setup_agent
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
 # ────────────────────────────────────────────────────────
@@ -71,7 +72,7 @@ def agent_create_sales_order():
         ]
     )
 
-    create_sales_order_agent.setup()
+    setup_agent(create_sales_order_agent)
     return create_sales_order_agent
 
 def test_agents():
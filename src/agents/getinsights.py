@@ -27,6 +27,7 @@ from anyio import get_cancelled_exc_class
 from src.prompt_engineering.topics.ask_data import prompt_Agent_Auditor
 from src.llm.oci_genai_agent import initialize_oci_genai_agent_service
 from src.common.config import *
+from src.common.agent_setup_cache import setup_agent
 
 async def agent_flow(input_prompt: str, session_id:str):
 
@@ -75,7 +76,7 @@ async def agent_flow(input_prompt: str, session_id:str):
             ],
         )
 
-        agent.setup()
+        setup_agent(agent)
 
         print(f"Running: {input_prompt}")
         try:
@@ -27,6 +27,7 @@ from oci.addons.adk.mcp import MCPClientStdio
 from anyio import get_cancelled_exc_class
 from src.llm.oci_genai_agent import initialize_oci_genai_agent_service
 from src.prompt_engineering.topics.oracle_db_operator import promt_oracle_db_operator
+from src.common.agent_setup_cache import setup_agent
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -69,7 +70,7 @@ async def start_sql_agent():
         ],
     )
 
-    agent.setup()
+    setup_agent(agent)
 
     return agent, adb_mcp_client  # return both to close later
 
@@ -9,7 +9,7 @@ This module is an order-taking assistant designed to support sales workflows by
 customer order information from uploaded images and interacting with external order APIs such as Fusion SCM
 Workflow Overview:
 1. Load config and credentials from .env
-2. Register tools with the agent - image_to_text, speech_to_text
+2. Register tools with the agent - image_to_text, images_to_text (multi-page orders), speech_to_text
 3. Extract structured output from image_to_text or speech_to_text tool that maps to a create and order Fusion SCM REST API
 4. Run the agent with user input and print response
 """
@@ -20,8 +20,9 @@ from oci.addons.adk import Agent, AgentClient, tool
 from pathlib import Path
 from dotenv import load_dotenv
 from src.toolkit.fusion_scm_order_toolkit import Fusion_SCM_Order_Toolkit
-from src.tools.vision_instruct_tools import image_to_text
+from src.tools.vision_instruct_tools import image_to_text, images_to_text
 from src.prompt_engineering.topics.order_assistant import prompt_order_assistant
+from src.common.agent_setup_cache import setup_agent
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -70,7 +71,8 @@ If the tool returns a JSON object, your final response must be the exact same JS
         agent_endpoint_id=AGENT_EP_ID,
         instructions=instructions,
         tools=[
-            image_to_text
+            image_to_text,
+            images_to_text
         ]
     )
 
@@ -79,7 +81,7 @@ If the tool returns a JSON object, your final response must be the exact same JS
 def agent_setup():
 
     agent_order = agent_receive_sales_order()
-    agent_order.setup()
+    setup_agent(agent_order)
 
     image_path = f"{PROJECT_ROOT}/images/orderhub_handwritten.jpg"
     question = """Get all information about the order such as - 
@@ -20,6 +20,7 @@ from dotenv import load_dotenv
 from src.toolkit.user_info import AccountToolkit
 from oci.addons.adk.tool.prebuilt import AgenticRagTool
 from src.prompt_engineering.topics.tax_auditor import prompt_Agent_Auditor
+from src.common.agent_setup_cache import setup_agent as setup_cached_agent  # this module defines its own setup_agent()
 import logging
 
 # ────────────────────────────────────────────────────────
@@ -75,7 +76,7 @@ def agent_flow():
 def setup_agent():
 
     agent = agent_flow()
-    agent.setup()
+    setup_cached_agent(agent)
 
     # This is a context your existing code is best at producing (e.g., fetching the authenticated user id)
     client_provided_context = "[Context: The logged in user ID is: user_123] "
@@ -0,0 +1,328 @@
+"""
+fusion_mock_server.py
+==========================
+==Local Fusion SCM salesOrdersForOrderHub Stand-in==
+==========================
+In-memory mock of the Fusion order hub REST resource used by Fusion_SCM_Order_Toolkit,
+for load tests and CI benchmarks without a Fusion tenant:
+
+- POST   {RESOURCE}                 create (duplicate SourceTransactionNumber + System -> 400)
+- GET    {RESOURCE}?finder=findBySourceOrderNumberAndSystem;SourceTransactionNumber=..,SourceTransactionSystem=..
+- GET    {RESOURCE}?q=...           "Attr IN ('a','b') and Attr='v'" or "Attr=v;Attr2=v2"
+- GET    {RESOURCE}                 list; limit / offset / hasMore / totalResults=true
+- GET    {RESOURCE}/{HeaderId}      single order
+  all GETs honour fields=, onlyData=true and expand=lines
+
+Orders move through FUSION_MOCK_STATUS_FLOW, one step every FUSION_MOCK_STATUS_INTERVAL seconds.
+
+Latency, error rate and throttling come from a profile (FUSION_MOCK_PROFILE) and can be
+changed at runtime:
+- GET  /_mock/stats     request counters
+- PUT  /_mock/profile   {"profile": "degraded"} or individual fields
+- POST /_mock/reset     drop all orders and counters
+
+Run:
+    python -m uvicorn src.app.fusion_mock.fusion_mock_server:app --port 8090
+    export FUSION_SCM_API_URL=http://localhost:8090/fscmRestApi/resources/11.13.18.05/salesOrdersForOrderHub
+"""
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Body, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from src.toolkit.fusion_projection import parse_fields
+
+RESOURCE = "/fscmRestApi/resources/11.13.18.05/salesOrdersForOrderHub"
+
+PROFILES = {
+    # latency_ms: mean added latency, jitter_ms: +/- uniform, error_rate: share of 500s,
+    # rate_limit: requests/second before 429 (0 = unlimited)
+    "fast":      {"latency_ms": 0,    "jitter_ms": 0,   "error_rate": 0.0,  "rate_limit": 0},
+    "realistic": {"latency_ms": 300,  "jitter_ms": 150, "error_rate": 0.01, "rate_limit": 20},
+    "degraded":  {"latency_ms": 2000, "jitter_ms": 1000, "error_rate": 0.2, "rate_limit": 0},
+    "throttled": {"latency_ms": 100,  "jitter_ms": 50,  "error_rate": 0.0,  "rate_limit": 5},
+}
+
+
+def _profile_from_env() -> Dict[str, float]:
+    profile = dict(PROFILES[os.getenv("FUSION_MOCK_PROFILE", "fast")])
+    for key in profile:
+        value = os.getenv(f"FUSION_MOCK_{key.upper()}")
+        if value is not None:
+            profile[key] = float(value)
+    return profile
+
+
+STATUS_FLOW = [s.strip() for s in os.getenv("FUSION_MOCK_STATUS_FLOW", "OPEN,PROCESSING,SHIPPED,CLOSED").split(",")]
+STATUS_INTERVAL = float(os.getenv("FUSION_MOCK_STATUS_INTERVAL", "30"))
+SEED_ORDERS = int(os.getenv("FUSION_MOCK_SEED_ORDERS", "0"))
+MAX_LIMIT = 500
+
+_random = random.Random(os.getenv("FUSION_MOCK_RANDOM_SEED"))
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class OrderStore:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.orders: Dict[int, Dict[str, Any]] = {}
+            self._by_source: Dict[tuple, int] = {}
+            self._created_at: Dict[int, float] = {}
+            self._next_header_id = 300000100000001
+            self._next_order_number = 100001
+
+    def create(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        source = (payload.get("SourceTransactionNumber"), payload.get("SourceTransactionSystem"))
+        with self._lock:
+            if None not in source and source in self._by_source:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"An order with source transaction {source[0]} from {source[1]} already exists.",
+                )
+            header_id = self._next_header_id
+            self._next_header_id += 1
+            order = {
+                **{k: v for k, v in payload.items() if k != "lines"},
+                "HeaderId": header_id,
+                "OrderNumber": str(self._next_order_number),
+                "CreationDate": _now_iso(),
+                "lines": [
+                    {**line, "LineId": header_id * 100 + i, "StatusCode": STATUS_FLOW[0]}
+                    for i, line in enumerate(payload.get("lines") or [], start=1)
+                ],
+            }
+            self._next_order_number += 1
+            self.orders[header_id] = order
+            self._created_at[header_id] = time.monotonic()
+            if None not in source:
+                self._by_source[source] = header_id
+        return self.current(order)
+
+    def current(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """The order with its status advanced by the time elapsed since creation."""
+        age = time.monotonic() - self._created_at.get(order["HeaderId"], time.monotonic())
+        step = min(len(STATUS_FLOW) - 1, int(age // STATUS_INTERVAL)) if STATUS_INTERVAL > 0 else 0
+        status = STATUS_FLOW[step]
+        return {
+            **order,
+            "StatusCode": status,
+            "lines": [{**line, "StatusCode": status} for line in order["lines"]],
+        }
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            orders = list(self.orders.values())
+        return [self.current(order) for order in orders]
+
+    def get(self, header_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            order = self.orders.get(header_id)
+        return self.current(order) if order else None
+
+
+class Throttle:
+    """Fixed one-second window: beyond rate_limit requests per second -> 429."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._window = 0
+        self._count = 0
+
+    def allow(self, rate_limit: float) -> bool:
+        if rate_limit <= 0:
+            return True
+        with self._lock:
+            window = int(time.time())
+            if window != self._window:
+                self._window, self._count = window, 0
+            self._count += 1
+            return self._count <= rate_limit
+
+
+store = OrderStore()
+throttle = Throttle()
+profile = _profile_from_env()
+stats = {"requests": 0, "created": 0, "errors": 0, "throttled": 0}
+
+app = FastAPI(title="Fusion SCM mock")
+
+
+@app.middleware("http")
+async def apply_profile(request: Request, call_next):
+    if not request.url.path.startswith(RESOURCE):
+        return await call_next(request)
+    stats["requests"] += 1
+    if not throttle.allow(profile["rate_limit"]):
+        stats["throttled"] += 1
+        return JSONResponse(status_code=429, content={"detail": "Too many requests"}, headers={"Retry-After": "1"})
+    latency = profile["latency_ms"] + _random.uniform(-profile["jitter_ms"], profile["jitter_ms"])
+    if latency > 0:
+        await asyncio.sleep(latency / 1000)
+    if _random.random() < profile["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"detail": "Simulated Fusion error"})
+    return await call_next(request)
+
+
+def _links(request: Request, order: Dict[str, Any]) -> List[Dict[str, str]]:
+    href = f"{str(request.base_url).rstrip('/')}{RESOURCE}/{order['HeaderId']}"
+    return [
+        {"rel": "self", "href": href, "name": "salesOrdersForOrderHub", "kind": "item"},
+        {"rel": "child", "href": f"{href}/child/lines", "name": "lines", "kind": "collection"},
+    ]
+
+
+def _shape(order: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    """Apply fields=, expand= and onlyData= to one order."""
+    params = request.query_params
+    fields = parse_fields(params.get("fields"))
+    expand = {name.strip() for name in (params.get("expand") or "").split(",")}
+    top = fields.get(None)
+    shaped = {k: v for k, v in order.items() if k != "lines" and (top is None or k in top)}
+    if "lines" in fields or "lines" in expand or "all" in expand:
+        names = fields.get("lines")
+        shaped["lines"] = [
+            {k: v for k, v in line.items() if names is None or k in names} for line in order["lines"]
+        ]
+    if params.get("onlyData", "false").lower() != "true":
+        shaped["links"] = _links(request, order)
+    return shaped
+
+
+_FINDER = re.compile(r"findBySourceOrderNumberAndSystem;(.*)")
+_IN = re.compile(r"^\s*(\w+)\s+IN\s*\((.*)\)\s*$", re.IGNORECASE)
+_EQ = re.compile(r"^\s*(\w+)\s*=\s*'?([^']*)'?\s*$")
+
+
+def _filters(request: Request) -> List[tuple]:
+    """(attribute, allowed values) pairs from finder= or q=."""
+    params = request.query_params
+    filters = []
+    finder = params.get("finder")
+    if finder:
+        match = _FINDER.match(finder)
+        if not match:
+            raise HTTPException(status_code=400, detail=f"Unknown finder {finder}")
+        for binding in match.group(1).split(","):
+            name, _, value = binding.partition("=")
+            filters.append((name.strip(), {value.strip()}))
+    q = params.get("q")
+    if q:
+        for clause in re.split(r"\s+and\s+|;", q, flags=re.IGNORECASE):
+            if not clause.strip():
+                continue
+            match = _IN.match(clause)
+            if match:
+                values = re.findall(r"'((?:[^']|'')*)'", match.group(2))
+                filters.append((match.group(1), {value.replace("''", "'") for value in values}))
+                continue
+            match = _EQ.match(clause)
+            if not match:
+                raise HTTPException(status_code=400, detail=f"Unsupported q expression: {clause}")
+            filters.append((match.group(1), {match.group(2)}))
+    return filters
+
+
+@app.post(RESOURCE)
+async def create_order(payload: Dict = Body(...)):
+    if not payload.get("SourceTransactionNumber") or not payload.get("SourceTransactionSystem"):
+        raise HTTPException(status_code=400, detail="SourceTransactionNumber and SourceTransactionSystem are required")
+    order = store.create(payload)
+    stats["created"] += 1
+    return JSONResponse(status_code=201, content=order)
+
+
+@app.get(RESOURCE)
+async def list_orders(request: Request):
+    params = request.query_params
+    limit = min(int(params.get("limit", 25)), MAX_LIMIT)
+    offset = int(params.get("offset", 0))
+    filters = _filters(request)
+    orders = [
+        order for order in store.all()
+        if all(str(order.get(name)) in values for name, values in filters)
+    ]
+    page = orders[offset:offset + limit]
+    content = {
+        "items": [_shape(order, request) for order in page],
+        "count": len(page),
+        "hasMore": offset + len(page) < len(orders),
+        "limit": limit,
+        "offset": offset,
+    }
+    if params.get("totalResults", "false").lower() == "true":
+        content["totalResults"] = len(orders)
+    if params.get("onlyData", "false").lower() != "true":
+        content["links"] = [{"rel": "self", "href": str(request.url), "name": "salesOrdersForOrderHub", "kind": "collection"}]
+    return JSONResponse(content=content)
+
+
+@app.get(RESOURCE + "/{header_id}")
+async def get_order(header_id: int, request: Request):
+    order = store.get(header_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return JSONResponse(content=_shape(order, request))
+
+
+@app.get("/_mock/stats")
+async def mock_stats():
+    return {**stats, "orders": len(store.orders), "profile": profile}
+
+
+@app.put("/_mock/profile")
+async def set_profile(update: Dict = Body(...)):
+    name = update.pop("profile", None)
+    if name is not None:
+        if name not in PROFILES:
+            raise HTTPException(status_code=422, detail=f"profile must be one of {', '.join(PROFILES)}")
+        profile.update(PROFILES[name])
+    for key, value in update.items():
+        if key not in profile:
+            raise HTTPException(status_code=422, detail=f"Unknown profile field {key}")
+        profile[key] = float(value)
+    return profile
+
+
+@app.post("/_mock/reset")
+async def reset():
+    store.reset()
+    for key in stats:
+        stats[key] = 0
+    _seed()
+    return {"orders": len(store.orders)}
+
+
+def _seed() -> None:
+    for i in range(1, SEED_ORDERS + 1):
+        store.create({
+            "SourceTransactionNumber": f"MOCK-{i:06d}",
+            "SourceTransactionSystem": "OPS",
+            "SourceTransactionId": f"MOCK-{i:06d}",
+            "TransactionalCurrencyCode": "USD",
+            "BuyingPartyNumber": "10060",
+            "TransactionTypeCode": "STD",
+            "lines": [
+                {"SourceTransactionLineId": "1", "SourceTransactionLineNumber": "1",
+                 "ProductNumber": "AS6647431", "OrderedQuantity": 1 + i % 10, "OrderedUOMCode": "zzu"},
+            ],
+        })
+
+
+_seed()
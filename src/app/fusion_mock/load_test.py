@@ -0,0 +1,143 @@
+"""
+load_test.py
+Drive the async Fusion toolkit (or a running OrderX service) against the mock and report
+throughput and latency percentiles. The toolkit run replaces the Fusion rate limits
+(FUSION_SCM_RATE_LIMIT / FUSION_SCM_RATE_LIMITS) with --rate-limit, unlimited by default,
+so the report measures the mock rather than the client-side limiter; against --target
+the service's own limits apply. Either way the limits in effect are part of the report.
+
+    # terminal 1
+    FUSION_MOCK_PROFILE=realistic python -m uvicorn src.app.fusion_mock.fusion_mock_server:app --port 8090
+    # terminal 2
+    export FUSION_SCM_API_URL=http://localhost:8090/fscmRestApi/resources/11.13.18.05/salesOrdersForOrderHub
+    python -m src.app.fusion_mock.load_test --orders 200 --concurrency 20
+    python -m src.app.fusion_mock.load_test --orders 200 --concurrency 20 --rate-limit 10
+    python -m src.app.fusion_mock.load_test --orders 200 --concurrency 20 --target http://localhost:8084
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+from src.app.orderxhub.direct_ops import tool_failed
+from src.toolkit.fusion_http import pool_stats
+from src.toolkit.fusion_resilience import rate_limits, set_rate_limits
+from src.toolkit.fusion_scm_order_async_toolkit import Fusion_SCM_Order_Async_Toolkit
+
+
+def sample_order(number: str) -> Dict:
+    return {
+        "SourceTransactionNumber": number,
+        "SourceTransactionSystem": "OPS",
+        "SourceTransactionId": number,
+        "TransactionalCurrencyCode": "USD",
+        "BusinessUnitId": 300000046987012,
+        "BuyingPartyNumber": "10060",
+        "TransactionTypeCode": "STD",
+        "RequestedShipDate": "2018-09-19T19:51:48+00:00",
+        "SubmittedFlag": "true",
+        "lines": [
+            {
+                "SourceTransactionLineId": "1",
+                "SourceTransactionLineNumber": "1",
+                "SourceScheduleNumber": "1",
+                "SourceTransactionScheduleId": "1",
+                "OrderedUOMCode": "zzu",
+                "OrderedQuantity": 10,
+                "ProductNumber": "AS6647431",
+            }
+        ],
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(orders: int, concurrency: int, target: Optional[str], rate_limit: float = 0.0) -> Dict:
+    """
+    :param rate_limit: Fusion requests/second per endpoint for the toolkit run; 0 = unlimited
+    """
+    if not target:
+        set_rate_limits({}, rate_limit)
+    toolkit = Fusion_SCM_Order_Async_Toolkit()
+    client = httpx.AsyncClient(base_url=target, timeout=120) if target else None
+    semaphore = asyncio.Semaphore(concurrency)
+    prefix = uuid.uuid4().hex[:8]
+    latencies = {"create": [], "get": []}
+    failures = {"create": 0, "get": 0}
+
+    async def timed(kind: str, call) -> None:
+        started = time.perf_counter()
+        try:
+            ok = await call
+        except Exception:
+            ok = False
+        latencies[kind].append(time.perf_counter() - started)
+        if not ok:
+            failures[kind] += 1
+
+    async def create(number: str) -> bool:
+        if client:
+            response = await client.post("/orders/create?mode=direct", json=sample_order(number))
+            return response.status_code == 200
+        return not tool_failed(await toolkit.create_sales_order(sample_order(number)))
+
+    async def get(number: str) -> bool:
+        if client:
+            response = await client.get("/orders/query", params={"orderid": number, "mode": "direct"})
+            return response.status_code == 200
+        return not tool_failed(await toolkit.get_sales_order(number))
+
+    async def one(i: int) -> None:
+        number = f"LOAD-{prefix}-{i:06d}"
+        async with semaphore:
+            await timed("create", create(number))
+            await timed("get", get(number))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(orders)))
+    elapsed = time.perf_counter() - started
+    if client:
+        # the service's limiters, not this process's, throttled the run
+        service = (await client.get("/health/fusion")).json()
+        limits = {name: {"rate": bucket["rate"], "burst": bucket["burst"]} for name, bucket in service["limiters"].items()}
+        await client.aclose()
+    else:
+        limits = rate_limits()
+
+    report = {"orders": orders, "concurrency": concurrency, "elapsed_s": round(elapsed, 2),
+              "requests_per_s": round(2 * orders / elapsed, 1), "rate_limits": limits}
+    for kind, values in latencies.items():
+        report[kind] = {
+            "failures": failures[kind],
+            "p50_ms": round(percentile(values, 50) * 1000),
+            "p95_ms": round(percentile(values, 95) * 1000),
+            "p99_ms": round(percentile(values, 99) * 1000),
+            "mean_ms": round(statistics.fmean(values) * 1000) if values else 0,
+        }
+    if not target:
+        report["client"] = pool_stats()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test Fusion order create + lookup against the mock")
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--target", default=None, help="OrderX service base URL; default calls the toolkit directly")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0,
+        help="Fusion requests/second per endpoint for the toolkit run (0 = unlimited); ignored with --target",
+    )
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.orders, args.concurrency, args.target, args.rate_limit)), indent=2))
@@ -0,0 +1,188 @@
+"""
+admission.py
+==========================
+==Agent Run Admission Control==
+==========================
+Runs blocking ``agent.run`` calls on a dedicated, bounded thread pool instead of the
+default executor behind ``asyncio.to_thread`` and decides up front whether a request
+can be accepted:
+
+1. Per-endpoint concurrency caps -> AdmissionRejected(429) when an endpoint is saturated
+2. Global queue-depth limit      -> AdmissionRejected(503) when all workers are busy and
+                                    the wait queue is full
+3. Every rejection carries a Retry-After estimate derived from recent run times
+
+Queue wait (admission -> run start) and run time are measured separately per request.
+"""
+
+import asyncio
+import functools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is turned away; carries the HTTP status and a Retry-After hint."""
+
+    def __init__(self, status_code: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_endpoint_limits(spec: str) -> Dict[str, int]:
+    """
+    Parse "query_image=2,orders_create=4" into {"query_image": 2, "orders_create": 4}.
+    """
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        limits[name.strip()] = int(value)
+    return limits
+
+
+def _init_worker_loop() -> None:
+    # Agent.run() drives its async loop with asyncio.get_event_loop(), which only
+    # exists by default on the main thread; give every worker its own loop.
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+
+class RunTicket:
+    """Handle for one admitted request; records queue wait and run time."""
+
+    def __init__(self, controller: "AdmissionController", endpoint: str):
+        self.controller = controller
+        self.endpoint = endpoint
+        self.admitted_at = time.monotonic()
+        self.queue_wait: Optional[float] = None
+        self.run_time: Optional[float] = None
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run a blocking callable on the bounded agent executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.controller.executor,
+            functools.partial(self._timed, fn, *args, **kwargs),
+        )
+
+    def _timed(self, fn: Callable, *args, **kwargs):
+        started = time.monotonic()
+        self.queue_wait = started - self.admitted_at
+        self.controller._mark_running(+1)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.run_time = time.monotonic() - started
+            self.controller._mark_running(-1)
+            self.controller._observe(self.queue_wait, self.run_time)
+
+    def headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.queue_wait is not None:
+            headers["X-Queue-Wait-Ms"] = str(round(self.queue_wait * 1000))
+        if self.run_time is not None:
+            headers["X-Run-Time-Ms"] = str(round(self.run_time * 1000))
+        return headers
+
+
+class AdmissionController:
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue_depth: int = 8,
+        endpoint_limits: Optional[Dict[str, int]] = None,
+    ):
+        """
+        :param max_workers: threads available for concurrent agent runs
+        :param max_queue_depth: admitted requests allowed to wait beyond max_workers
+        :param endpoint_limits: optional per-endpoint cap on admitted requests
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue_depth = max(0, int(max_queue_depth))
+        self.endpoint_limits = endpoint_limits or {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="agent-run",
+            initializer=_init_worker_loop,
+        )
+
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._per_endpoint: Dict[str, int] = {}
+        self._rejected = {429: 0, 503: 0}
+        # exponentially weighted averages, seconds
+        self._avg_run = 10.0
+        self._avg_wait = 0.0
+
+    @asynccontextmanager
+    async def admit(self, endpoint: str):
+        """
+        Admit one request or raise AdmissionRejected:
+
+            async with admission.admit("orders_create") as ticket:
+                response = await ticket.run(agent.run, prompt)
+        """
+        with self._lock:
+            limit = self.endpoint_limits.get(endpoint)
+            in_flight = self._per_endpoint.get(endpoint, 0)
+            if limit is not None and in_flight >= limit:
+                self._rejected[429] += 1
+                raise AdmissionRejected(
+                    429, f"Too many concurrent '{endpoint}' requests ({limit} allowed)", self.retry_after()
+                )
+            if self._admitted >= self.max_workers + self.max_queue_depth:
+                self._rejected[503] += 1
+                raise AdmissionRejected(503, "Agent run queue is full", self.retry_after())
+            self._admitted += 1
+            self._per_endpoint[endpoint] = in_flight + 1
+
+        try:
+            yield RunTicket(self, endpoint)
+        finally:
+            with self._lock:
+                self._admitted -= 1
+                self._per_endpoint[endpoint] -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until a worker is likely to free up, based on recent run times."""
+        waiting = max(0, self._admitted - self.max_workers)
+        rounds = waiting / self.max_workers + 1
+        return max(1, math.ceil(self._avg_run * rounds))
+
+    def _mark_running(self, delta: int) -> None:
+        with self._lock:
+            self._running += delta
+
+    def _observe(self, queue_wait: float, run_time: float, alpha: float = 0.2) -> None:
+        with self._lock:
+            self._avg_wait += alpha * (queue_wait - self._avg_wait)
+            self._avg_run += alpha * (run_time - self._avg_run)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self._admitted,
+                "running": self._running,
+                "queued": max(0, self._admitted - self._running),
+                "per_endpoint": dict(self._per_endpoint),
+                "endpoint_limits": dict(self.endpoint_limits),
+                "rejected": dict(self._rejected),
+                "avg_queue_wait_ms": round(self._avg_wait * 1000),
+                "avg_run_time_ms": round(self._avg_run * 1000),
+            }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
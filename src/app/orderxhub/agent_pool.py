@@ -0,0 +1,247 @@
+"""
+agent_pool.py
+==========================
+==Pre-warmed Agent Pool==
+==========================
+Keeps a fixed number of already set-up ADK ``Agent`` objects around so that API
+requests do not pay for ``AgentClient`` construction and ``Agent.setup()`` on
+every call. Agents are leased exclusively for the duration of one request and
+returned to the pool afterwards.
+
+Health handling:
+1. Agents are recycled after ``max_uses`` runs or ``max_age`` seconds
+2. Agents that fail ``max_failures`` runs in a row are discarded and replaced
+3. Idle agents are probed every ``health_interval`` seconds with ``health_check``
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AgentPoolExhausted(Exception):
+    """Raised when no agent could be leased within the acquire timeout."""
+
+
+@dataclass
+class PooledAgent:
+    agent: Any
+    created_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    failures: int = 0
+
+
+def default_health_check(agent) -> bool:
+    """
+    Probe the remote agent endpoint and report whether it is still usable.
+    :param agent: an ADK Agent
+    :return: True when the endpoint is ACTIVE
+    """
+    details = agent.client.get_agent_endpoint_details(agent.agent_endpoint_id)
+    return details.get("lifecycle_state") == "ACTIVE"
+
+
+class AgentPool:
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = 2,
+        acquire_timeout: float = 30.0,
+        max_uses: int = 0,
+        max_age: float = 3600.0,
+        max_failures: int = 2,
+        health_interval: float = 300.0,
+        health_check: Optional[Callable[[Any], bool]] = default_health_check,
+    ):
+        """
+        :param factory: zero-arg callable returning a set-up Agent (e.g. agent_create_sales_order)
+        :param size: number of agents kept warm
+        :param acquire_timeout: seconds a request waits for a free agent before AgentPoolExhausted
+        :param max_uses: recycle an agent after this many runs (0 = never)
+        :param max_age: recycle an agent after this many seconds (0 = never)
+        :param max_failures: discard an agent after this many consecutive failed runs
+        :param health_interval: seconds between idle health probes (0 = disabled)
+        :param health_check: callable(agent) -> bool used by the idle probe
+        """
+        self.factory = factory
+        self.size = max(1, int(size))
+        self.acquire_timeout = acquire_timeout
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.max_failures = max(1, int(max_failures))
+        self.health_interval = health_interval
+        self.health_check = health_check
+
+        self._idle: Optional[asyncio.Queue] = None
+        self._tasks: set = set()
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._leased = 0
+        self._created = 0
+        self._discarded = 0
+
+    # ────────────────────────────────────────────────────────
+    # lifecycle
+    # ────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        """Create and set up all agents. Call from the FastAPI lifespan hook."""
+        self._idle = asyncio.Queue()
+        self._closed = False
+
+        # The first setup() may have to push instructions/tools to the remote agent;
+        # build it alone so the remaining agents find the remote side already in sync.
+        await self._idle.put(await self._create())
+        rest = await asyncio.gather(
+            *(self._create() for _ in range(self.size - 1)), return_exceptions=True
+        )
+        for entry in rest:
+            if isinstance(entry, Exception):
+                logger.error("Agent pool warm-up failed: %s", entry)
+                self._spawn_replacement()
+            else:
+                await self._idle.put(entry)
+
+        if self.health_interval and self.health_check:
+            self._health_task = asyncio.create_task(self._health_loop())
+        logger.info("Agent pool started with %d/%d agents", self._idle.qsize(), self.size)
+
+    async def close(self) -> None:
+        """Stop background work and drop all idle agents."""
+        self._closed = True
+        for task in [self._health_task, *self._tasks]:
+            if task is not None:
+                task.cancel()
+        self._tasks.clear()
+        if self._idle is not None:
+            while not self._idle.empty():
+                self._idle.get_nowait()
+
+    # ────────────────────────────────────────────────────────
+    # leasing
+    # ────────────────────────────────────────────────────────
+
+    @asynccontextmanager
+    async def lease(self, timeout: Optional[float] = None):
+        """
+        Lease an agent for exclusive use:
+
+            async with agent_pool.lease() as agent:
+                response = await asyncio.to_thread(agent.run, prompt)
+        """
+        if self._idle is None or self._closed:
+            raise AgentPoolExhausted("Agent pool is not running")
+
+        entry = await self._acquire(self.acquire_timeout if timeout is None else timeout)
+        self._leased += 1
+        try:
+            yield entry.agent
+        except BaseException:
+            entry.failures += 1
+            self._release(entry)
+            raise
+        else:
+            entry.failures = 0
+            self._release(entry)
+
+    async def _acquire(self, timeout: float) -> PooledAgent:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise AgentPoolExhausted(f"No agent available within {timeout:g}s")
+            try:
+                entry = await asyncio.wait_for(self._idle.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise AgentPoolExhausted(f"No agent available within {timeout:g}s")
+            if self._expired(entry):
+                self._discard(entry, "expired")
+                continue
+            entry.uses += 1
+            return entry
+
+    def _release(self, entry: PooledAgent) -> None:
+        self._leased -= 1
+        if self._closed:
+            return
+        if entry.failures >= self.max_failures:
+            self._discard(entry, f"{entry.failures} consecutive failures")
+        elif self._expired(entry):
+            self._discard(entry, "expired")
+        else:
+            self._idle.put_nowait(entry)
+
+    def _expired(self, entry: PooledAgent) -> bool:
+        if self.max_uses and entry.uses >= self.max_uses:
+            return True
+        if self.max_age and time.monotonic() - entry.created_at >= self.max_age:
+            return True
+        return False
+
+    # ────────────────────────────────────────────────────────
+    # replacement + health
+    # ────────────────────────────────────────────────────────
+
+    async def _create(self) -> PooledAgent:
+        agent = await asyncio.to_thread(self.factory)
+        self._created += 1
+        return PooledAgent(agent=agent)
+
+    def _discard(self, entry: PooledAgent, reason: str) -> None:
+        logger.info("Discarding pooled agent (%s)", reason)
+        self._discarded += 1
+        self._spawn_replacement()
+
+    def _spawn_replacement(self) -> None:
+        if self._closed:
+            return
+        task = asyncio.create_task(self._replace())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _replace(self) -> None:
+        delay = 1.0
+        while not self._closed:
+            try:
+                entry = await self._create()
+            except Exception as e:
+                logger.error("Failed to create replacement agent, retrying in %.0fs: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+            self._idle.put_nowait(entry)
+            return
+
+    async def _health_loop(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(self.health_interval)
+            for _ in range(self._idle.qsize()):
+                try:
+                    entry = self._idle.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                try:
+                    healthy = await asyncio.to_thread(self.health_check, entry.agent)
+                except Exception as e:
+                    logger.warning("Agent health check raised: %s", e)
+                    healthy = False
+                if healthy and not self._expired(entry):
+                    self._idle.put_nowait(entry)
+                else:
+                    self._discard(entry, "failed health check")
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "leased": self._leased,
+            "replacing": len(self._tasks),
+            "created": self._created,
+            "discarded": self._discarded,
+        }
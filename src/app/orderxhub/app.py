@@ -10,6 +10,8 @@ with st.sidebar:
     base_url = st.text_input("Base URL", value="http://localhost:8084/", help="Root of your API (no trailing slash)")
     base_url = base_url.rstrip('/')
     timeout = st.number_input("HTTP Timeout (s)", value=180, min_value=1, max_value=600)
+    use_stream = st.checkbox("Stream agent progress (SSE)", value=True, help="Use the /stream variants and show traces as they arrive")
+    use_watcher = st.checkbox("Order status from watcher", value=True, help="Step 3 reads the status tracked by /orders/watch instead of asking the agent")
     st.markdown("---")
     st.subheader("Run server")
     st.code("streamlit run app.py --server.address 0.0.0.0 --server.port 8084")
@@ -30,6 +32,61 @@ def GET(path, **kw):
 def POST(path, **kw):
     return session.post(_url(path), timeout=timeout, **kw)
 
+
+class StreamedResult:
+    """Looks enough like a requests.Response for the step code below."""
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = {"content-type": "application/json"}
+        self.ok = 200 <= status_code < 400 and not (isinstance(payload, dict) and "error" in payload)
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+
+def _stream(method, path, **kw):
+    """
+    Call the SSE variant of an endpoint, log progress events as they arrive and
+    return the final event as a StreamedResult.
+    """
+    r = session.request(method, _url(path.rstrip("/") + "/stream"), timeout=timeout, stream=True, **kw)
+    if not r.headers.get("content-type", "").startswith("text/event-stream"):
+        try:
+            return StreamedResult(r.status_code, r.json())
+        except Exception:
+            return StreamedResult(r.status_code, {"error": r.text})
+
+    result = StreamedResult(r.status_code, {"error": "stream ended without a final answer"})
+    event, data = "message", []
+    for line in r.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif line == "" and data:
+            payload = json.loads("\n".join(data))
+            if event in ("final", "error"):
+                result = StreamedResult(r.status_code, payload)
+            elif event == "tool":
+                stream_log(f"   ↳ tool {payload.get('tool_name')} returned")
+            elif event == "trace":
+                trace = payload.get("trace", {})
+                detail = trace.get("tool_name") or ""
+                stream_log(f"   ↳ {payload.get('type')} {detail}".rstrip())
+            else:
+                stream_log(f"   ↳ {event}: {payload}")
+            event, data = "message", []
+    return result
+
+
+def POST_STREAM(path, **kw):
+    return _stream("POST", path, **kw)
+
+def GET_STREAM(path, **kw):
+    return _stream("GET", path, **kw)
+
 # ---------------- Preset Tools ----------------
 st.subheader("🛠️ Tools")
 st.caption("Wired to your endpoints: /query/image, /orders/create, /orders/query")
@@ -185,7 +242,7 @@ if run:
         if q_image is not None:
             files = {"image": (q_image.name, q_image.getvalue(), q_image.type or "image/jpeg")}
         data = {"question": q_question}
-        r1 = POST("/query/image", files=files, data=data, headers={"accept":"application/json"})
+        r1 = (POST_STREAM if use_stream else POST)("/query/image", files=files, data=data, headers={"accept":"application/json"})
         # ------------  debug
         try:
             p1 = r1.json() if r1.headers.get("content-type","").startswith("application/json") else r1.text
@@ -219,7 +276,7 @@ if run:
         stream_log("Step 2/4: Create_Sales_Order — posting order JSON…")
         try:
             payload2 = json.loads(q_body_raw)
-            r2 = POST("/orders/create", json=payload2, headers={"Content-Type":"application/json","accept":"application/json"})
+            r2 = (POST_STREAM if use_stream else POST)("/orders/create", json=payload2, headers={"Content-Type":"application/json","accept":"application/json"})
             try:
                 p2 = r2.json() if r2.headers.get("content-type","").startswith("application/json") else r2.text
             except Exception:
@@ -246,8 +303,13 @@ if run:
             pass
         stream_log(f"Step 3/4: Get_Sales_Order — querying order: {derived_id}")
         try:
-            prompt = f"get sales order for order id : {derived_id}"
-            r3 = GET("/orders/query", params={"input_prompt": prompt}, headers={"accept":"application/json"})
+            if use_watcher:
+                r3 = GET(f"/orders/watch/{transaction_number}", params={"wait": 30}, headers={"accept":"application/json"})
+                if r3.ok:
+                    stream_log(f"   ↳ status {r3.json().get('status')}")
+            else:
+                prompt = f"get sales order for order id : {derived_id}"
+                r3 = (GET_STREAM if use_stream else GET)("/orders/query", params={"input_prompt": prompt}, headers={"accept":"application/json"})
             try:
                 p3 = r3.json() if r3.headers.get("content-type","").startswith("application/json") else r3.text
             except Exception:
@@ -275,7 +337,7 @@ if run:
                 "final_message": str(r3.text),            # ensure string
             }
 
-            r4 = POST("/orders/email", json=payload4, headers={"Content-Type":"application/json","accept":"application/json"})
+            r4 = (POST_STREAM if use_stream else POST)("/orders/email", json=payload4, headers={"Content-Type":"application/json","accept":"application/json"})
             try:
                 p4 = r4.json() if r4.headers.get("content-type","").startswith("application/json") else r4.text
             except Exception:
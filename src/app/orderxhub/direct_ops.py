@@ -0,0 +1,222 @@
+"""
+direct_ops.py
+==========================
+==Direct (agent-less) Order Operations==
+==========================
+/orders/create, /orders/query and /orders/email mostly receive requests that are
+already structured: an order payload, an order id, an email body. Wrapping them in a
+natural-language prompt costs one or more LLM round trips just for the agent to call
+the obvious tool. These helpers validate the input and call the same tools directly.
+
+Modes accepted by the endpoints:
+- "direct": always call the tool; invalid input is rejected
+- "agent":  always go through the LLM agent
+- "auto":   direct when the input is structured and valid, agent otherwise
+
+validate_order() also checks ProductNumber / BuyingPartyNumber / OrderedUOMCode against
+the local master data cache (src/toolkit/fusion_master_data.py), correcting case and
+spacing mistakes; values the cache does not know are logged as warnings (rejected only
+with FUSION_SCM_MASTER_REJECT_UNKNOWN) and left for Fusion to judge.
+
+create_orders_batch() submits many validated orders to Fusion concurrently and yields
+each result as it completes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from src.data.sales_order import Transaction, LineItem
+from src.toolkit.fusion_scm_order_async_toolkit import Fusion_SCM_Order_Async_Toolkit
+from src.toolkit.fusion_master_data import MASTER_VALIDATE, get_master_data
+from src.tools.dummy_email_tool import send_email_dummy
+
+logger = logging.getLogger(__name__)
+
+MODES = ("auto", "direct", "agent")
+ORDER_EMAIL_TO = os.getenv("ORDERX_EMAIL_TO", "ops@example.com")
+BATCH_CONCURRENCY = int(os.getenv("ORDERX_BATCH_CONCURRENCY", "8"))
+# Every Transaction field is optional for extraction; an order posted without the agent needs these
+REQUIRED_ORDER_FIELDS = ("SourceTransactionNumber", "BuyingPartyNumber")
+
+_toolkit = Fusion_SCM_Order_Async_Toolkit()
+
+
+class OrderValidationError(Exception):
+    """The payload does not match the Transaction model."""
+
+    def __init__(self, errors: List):
+        super().__init__("Order payload does not match the Transaction model")
+        self.errors = errors
+
+
+class MasterDataError(OrderValidationError):
+    """The payload references products, customers or UOMs unknown to the master data cache."""
+
+    def __init__(self, errors: List):
+        Exception.__init__(self, "Order references unknown master data")
+        self.errors = errors
+
+
+class DirectCallFailed(Exception):
+    """The Fusion call made by a direct operation failed."""
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        # set when Fusion calls are short-circuited (see src/toolkit/fusion_resilience.py)
+        self.retry_after = retry_after
+
+
+def validate_order(payload: Dict, master_data: bool = MASTER_VALIDATE) -> Dict:
+    """
+    Validate a sales order payload against src.data.sales_order.Transaction and the
+    master data cache. Unknown fields are reported instead of being silently dropped;
+    REQUIRED_ORDER_FIELDS and at least one line must be present.
+    :param master_data: also check the order against the master data cache
+    :return: the payload as the model serializes it (unset fields omitted), with master
+             data corrections applied
+    :raises MasterDataError: a product, customer or UOM is unknown and could not be corrected
+    """
+    try:
+        order = Transaction.model_validate(payload)
+    except ValidationError as e:
+        raise OrderValidationError(json.loads(e.json()))
+
+    errors = [
+        {"loc": [key], "msg": "Unknown field"}
+        for key in payload if key not in Transaction.model_fields
+    ]
+    for i, line in enumerate(payload.get("lines") or []):
+        errors.extend(
+            {"loc": ["lines", i, key], "msg": "Unknown field"}
+            for key in line if key not in LineItem.model_fields
+        )
+    errors.extend(
+        {"loc": [key], "msg": "Field required"}
+        for key in REQUIRED_ORDER_FIELDS if not payload.get(key)
+    )
+    if not payload.get("lines"):
+        errors.append({"loc": ["lines"], "msg": "At least one line is required"})
+    if errors:
+        raise OrderValidationError(errors)
+    order = order.model_dump(exclude_unset=True)
+    if master_data:
+        check = get_master_data().check_order(order)
+        if check.errors:
+            raise MasterDataError(check.errors)
+        order = check.order
+        if check.corrections:
+            logger.info("Corrected master data of order %s: %s", order.get("SourceTransactionNumber"), check.corrections)
+        if check.warnings:
+            logger.warning(
+                "Order %s has values unknown to the master data cache: %s", order.get("SourceTransactionNumber"), check.warnings
+            )
+    return order
+
+
+def validate_orders(payloads: List[Dict]) -> List[Dict]:
+    """
+    Validate every payload of a batch before anything is submitted.
+    :raises OrderValidationError: errors of all invalid payloads, loc prefixed with the payload index
+    """
+    orders, errors = [], []
+    for index, payload in enumerate(payloads):
+        try:
+            orders.append(validate_order(payload))
+        except OrderValidationError as e:
+            errors.extend({**error, "loc": [index, *error.get("loc", [])]} for error in e.errors)
+    if errors:
+        raise OrderValidationError(errors)
+    return orders
+
+
+def tool_failed(result) -> bool:
+    """True for a toolkit result reporting a failed or refused Fusion call."""
+    # the toolkit reports HTTP failures (and orders it refused to send) as text so the agent can relay them
+    return isinstance(result, str) and result.startswith(("API call failed", "Order rejected"))
+
+
+def _check(result: str) -> str:
+    if tool_failed(result):
+        try:
+            detail = json.loads(result.split(":", 1)[1])
+        except ValueError:
+            detail = None
+        retry_after = detail.get("retry_after_seconds") if isinstance(detail, dict) else None
+        raise DirectCallFailed(result, retry_after)
+    return result
+
+
+async def create_order_direct(order: Dict) -> str:
+    """Post an order checked by validate_order() to Fusion SCM."""
+    # validate_order() already applied the master data check and its corrections
+    return _check(await _toolkit.post_sales_order(order, master_data=False))
+
+
+async def get_order_direct(orderid: str) -> str:
+    """Look up an order in Fusion SCM by its source transaction number."""
+    return _check(await _toolkit.get_sales_order(str(orderid)))
+
+
+async def lookup_orders_direct(orderids: List[str]) -> Dict:
+    """Look up many orders at once; see Fusion_SCM_Order_Async_Toolkit.lookup_sales_orders."""
+    return await _toolkit.lookup_sales_orders(orderids)
+
+
+def email_order_direct(saas_transaction_id, final_message: str) -> str:
+    """Send the order status email without asking the agent to compose the tool call."""
+    return send_email_dummy(
+        to=[ORDER_EMAIL_TO],
+        subject=f"Sales Order Status for orderid : {saas_transaction_id}",
+        body=final_message,
+    )
+
+
+def create_orders_batch(
+    payloads: List[Dict],
+    concurrency: int = BATCH_CONCURRENCY,
+    create: Optional[Callable[[Dict], Awaitable[str]]] = None,
+) -> AsyncIterator[Dict]:
+    """
+    Validate all payloads up front, then submit them to Fusion with at most
+    concurrency creates in flight.
+
+        async for result in create_orders_batch(payloads):
+            print(result["index"], result["status"])
+
+    :param create: async callable(order) -> tool output; defaults to create_order_direct
+    :raises OrderValidationError: before anything is submitted, if any payload is invalid
+    :return: async iterator of per-order results in completion order:
+             {"index", "SourceTransactionNumber", "status": "created"|"failed", "final_answer"|"error", "elapsed_ms"}
+    """
+    orders = validate_orders(payloads)
+    return _submit_batch(orders, max(1, int(concurrency)), create or create_order_direct)
+
+
+async def _submit_batch(orders: List[Dict], concurrency: int, create) -> AsyncIterator[Dict]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(index: int, order: Dict) -> Dict:
+        async with semaphore:
+            started = time.monotonic()
+            result = {"index": index, "SourceTransactionNumber": order.get("SourceTransactionNumber")}
+            try:
+                result.update(status="created", final_answer=await create(order))
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+            result["elapsed_ms"] = round((time.monotonic() - started) * 1000)
+            return result
+
+    tasks = [asyncio.create_task(submit(index, order)) for index, order in enumerate(orders)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # consumer went away (e.g. client disconnected): stop submitting the rest
+        for task in tasks:
+            task.cancel()
@@ -1,16 +1,492 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body, Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict
+from typing import Awaitable, Callable, Dict, List, Optional
 import shutil, traceback, asyncio
 # from src.agents.agent_image2text import agent_flow
 from src.agents.create_sales_order import agent_create_sales_order
-import traceback, json, os
+from src.app.orderxhub.agent_pool import AgentPool, AgentPoolExhausted
+from src.app.orderxhub.admission import AdmissionController, AdmissionRejected, parse_endpoint_limits
+from src.app.orderxhub.job_store import Job, JobRunner, make_job_store
+from src.app.orderxhub.idempotency import (
+    IdempotencyCache, IdempotencyConflict, IdempotencyMismatch, order_idempotency_key, request_fingerprint
+)
+from src.app.orderxhub.order_watcher import OrderWatcher
+from src.app.orderxhub.direct_ops import (
+    MODES, BATCH_CONCURRENCY, OrderValidationError, MasterDataError, DirectCallFailed,
+    validate_order, create_order_direct, get_order_direct, email_order_direct, create_orders_batch,
+    lookup_orders_direct, tool_failed
+)
+from src.toolkit.fusion_http import pool_stats, close_async_client
+from src.toolkit.fusion_master_data import SOURCES as MASTER_SOURCES, get_master_data
+from src.utils.vision_cache import get_vision_cache
+from src.utils.pdf_raster import get_render_cache
+from src.metro.tracing.trace_events import response_trace_events, tool_event, format_sse
+import traceback, json, os, time, uuid
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+THIS_DIR     = Path(__file__).resolve()
+PROJECT_ROOT = THIS_DIR.parent.parent.parent.parent
+
+# ────────────────────────────────────────────────────────
+# Agent pool configuration
+# ────────────────────────────────────────────────────────
+AGENT_POOL_SIZE = int(os.getenv("ORDERX_AGENT_POOL_SIZE", "2"))
+AGENT_POOL_ACQUIRE_TIMEOUT = float(os.getenv("ORDERX_AGENT_POOL_ACQUIRE_TIMEOUT", "30"))
+AGENT_POOL_MAX_USES = int(os.getenv("ORDERX_AGENT_POOL_MAX_USES", "0"))
+AGENT_POOL_MAX_AGE = float(os.getenv("ORDERX_AGENT_POOL_MAX_AGE", "3600"))
+AGENT_POOL_HEALTH_INTERVAL = float(os.getenv("ORDERX_AGENT_POOL_HEALTH_INTERVAL", "300"))
+
+agent_pool = AgentPool(
+    agent_create_sales_order,
+    size=AGENT_POOL_SIZE,
+    acquire_timeout=AGENT_POOL_ACQUIRE_TIMEOUT,
+    max_uses=AGENT_POOL_MAX_USES,
+    max_age=AGENT_POOL_MAX_AGE,
+    health_interval=AGENT_POOL_HEALTH_INTERVAL,
+)
+
+# ────────────────────────────────────────────────────────
+# Admission control configuration
+# ────────────────────────────────────────────────────────
+AGENT_WORKERS = int(os.getenv("ORDERX_AGENT_WORKERS", str(AGENT_POOL_SIZE)))
+AGENT_QUEUE_DEPTH = int(os.getenv("ORDERX_AGENT_QUEUE_DEPTH", "8"))
+# e.g. "query_image=1,orders_create=2,orders_query=2,orders_email=1"
+ENDPOINT_CONCURRENCY = parse_endpoint_limits(os.getenv("ORDERX_ENDPOINT_CONCURRENCY", ""))
+
+admission = AdmissionController(
+    max_workers=AGENT_WORKERS,
+    max_queue_depth=AGENT_QUEUE_DEPTH,
+    endpoint_limits=ENDPOINT_CONCURRENCY,
+)
+
+# ────────────────────────────────────────────────────────
+# Direct mode configuration: "auto", "direct" or "agent" (see direct_ops.py)
+# ────────────────────────────────────────────────────────
+DEFAULT_ORDER_MODE = os.getenv("ORDERX_DEFAULT_MODE", "auto")
+BATCH_MAX_ORDERS = int(os.getenv("ORDERX_BATCH_MAX_ORDERS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("ORDERX_BATCH_MAX_CONCURRENCY", "32"))
+
+# ────────────────────────────────────────────────────────
+# Background job configuration
+# ────────────────────────────────────────────────────────
+JOB_STORE = os.getenv("ORDERX_JOB_STORE", "memory")  # "memory" or "sqlite"
+JOB_DIR = Path(os.getenv("ORDERX_JOB_DIR", PROJECT_ROOT / ".orderx_jobs"))
+JOB_TTL = float(os.getenv("ORDERX_JOB_TTL", "86400"))
+JOB_LEASE = float(os.getenv("ORDERX_JOB_LEASE", "900"))
+JOB_RECOVER_INTERVAL = float(os.getenv("ORDERX_JOB_RECOVER_INTERVAL", "60"))
+JOB_MAX_CAPACITY_WAIT = float(os.getenv("ORDERX_JOB_MAX_CAPACITY_WAIT", "1800"))
+JOB_UPLOAD_DIR = JOB_DIR / "uploads"
+
+# ────────────────────────────────────────────────────────
+# Idempotency configuration for /orders/create
+# ────────────────────────────────────────────────────────
+# uvicorn and gunicorn both take their default worker count from WEB_CONCURRENCY
+SERVER_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+IDEMPOTENCY_STORE = os.getenv("ORDERX_IDEMPOTENCY_STORE", "sqlite" if SERVER_WORKERS > 1 else "memory")  # "memory" or "sqlite"
+IDEMPOTENCY_TTL = float(os.getenv("ORDERX_IDEMPOTENCY_TTL", "86400"))
+
+if IDEMPOTENCY_STORE == "memory" and SERVER_WORKERS > 1:
+    # each worker would keep its own cache, and retries routed to another worker create duplicate orders
+    raise RuntimeError(
+        f"ORDERX_IDEMPOTENCY_STORE=memory does not deduplicate across the {SERVER_WORKERS} workers "
+        "of WEB_CONCURRENCY; use ORDERX_IDEMPOTENCY_STORE=sqlite"
+    )
+
+idempotency = IdempotencyCache(
+    path=JOB_DIR / "idempotency.db" if IDEMPOTENCY_STORE == "sqlite" else None,
+    ttl=IDEMPOTENCY_TTL,
+)
+
+# ────────────────────────────────────────────────────────
+# Order status watcher configuration
+# ────────────────────────────────────────────────────────
+WATCH_ON_CREATE = os.getenv("ORDERX_WATCH_ON_CREATE", "true").lower() == "true"
+
+order_watcher = OrderWatcher(
+    lookup=lookup_orders_direct,
+    min_interval=float(os.getenv("ORDERX_WATCH_MIN_INTERVAL", "5")),
+    max_interval=float(os.getenv("ORDERX_WATCH_MAX_INTERVAL", "300")),
+    backoff=float(os.getenv("ORDERX_WATCH_BACKOFF", "2")),
+    max_batch=int(os.getenv("ORDERX_WATCH_BATCH", "100")),
+    max_age=float(os.getenv("ORDERX_WATCH_MAX_AGE", "86400")),
+    terminal_statuses=os.getenv("ORDERX_WATCH_TERMINAL_STATUSES", "CLOSED,CANCELED,CANCELLED").split(","),
+)
+
+
+def watch_created_order(payload: Dict) -> None:
+    if WATCH_ON_CREATE and payload.get("SourceTransactionNumber"):
+        order_watcher.watch(payload["SourceTransactionNumber"])
+
+
+# ────────────────────────────────────────────────────────
+# Master data cache sync (see src/toolkit/fusion_master_data.py); 0 disables
+# ────────────────────────────────────────────────────────
+MASTER_SYNC_INTERVAL = float(os.getenv("FUSION_SCM_MASTER_SYNC_INTERVAL", "3600"))
+
+
+async def master_data_sync_loop() -> None:
+    while True:
+        results = await asyncio.to_thread(get_master_data().sync_all)
+        logger.info("Master data sync: %s", results)
+        await asyncio.sleep(MASTER_SYNC_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build and set up the agents once, before the first request is served
+    await agent_pool.start()
+    await job_runner.start()
+    await order_watcher.start()
+    master_sync = None
+    if MASTER_SYNC_INTERVAL > 0 and any(source.url for source in MASTER_SOURCES.values()):
+        master_sync = asyncio.create_task(master_data_sync_loop())
+    try:
+        yield
+    finally:
+        if master_sync is not None:
+            master_sync.cancel()
+        await order_watcher.close()
+        await job_runner.close()
+        await agent_pool.close()
+        await close_async_client()
+        admission.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def pool_exhausted_response(e: AgentPoolExhausted) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(e)},
+        headers={"Retry-After": str(admission.retry_after())},
+    )
+
+
+def rejected_response(e: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"error": str(e), "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+async def run_agent(endpoint: str, input_prompt: str, **run_kwargs):
+    """
+    Admit the request, lease a pooled agent and run it on the bounded agent executor.
+    :return: (RunResponse, RunTicket) - the ticket carries queue wait and run time
+    """
+    async with admission.admit(endpoint) as ticket:
+        async with agent_pool.lease() as agent:
+            response = await ticket.run(agent.run, input_prompt, **run_kwargs)
+    return response, ticket
+
+
+async def _agent_events(ticket, input_prompt: str, on_done=None, on_tool=None, **run_kwargs):
+    """
+    Run a pooled agent and yield SSE chunks for every trace / tool result as the
+    react loop produces them, followed by a final event with the answer.
+    :param on_done: optional callable(final_content or None) invoked once the run ends
+    :param on_tool: optional callable(required_action, performed_action) for every tool the agent ran
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    reported = False
+
+    def report(content) -> None:
+        nonlocal reported
+        if on_done and not reported:
+            reported = True
+            on_done(content)
+
+    def emit(event: str, data) -> None:
+        # called from the agent worker thread
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def on_invoked_remote_service(request, response):
+        for item in response_trace_events(response):
+            emit("trace", item)
+
+    def on_fulfilled_required_action(required_action, performed_action):
+        if on_tool:
+            on_tool(required_action, performed_action)
+        emit("tool", tool_event(required_action, performed_action))
+
+    try:
+        async with agent_pool.lease() as agent:
+            yield format_sse("status", {"status": "running"})
+            run = asyncio.ensure_future(ticket.run(
+                agent.run,
+                input_prompt,
+                on_invoked_remote_service=on_invoked_remote_service,
+                on_fulfilled_required_action=on_fulfilled_required_action,
+                **run_kwargs,
+            ))
+            try:
+                while not run.done() or not events.empty():
+                    next_event = asyncio.ensure_future(events.get())
+                    done, _ = await asyncio.wait({run, next_event}, return_when=asyncio.FIRST_COMPLETED)
+                    if next_event in done:
+                        event, data = next_event.result()
+                        yield format_sse(event, data)
+                    else:
+                        next_event.cancel()
+            finally:
+                # the worker thread keeps using the agent until the run ends;
+                # don't hand it back to the pool early if the client went away
+                if not run.done():
+                    await asyncio.wait({run})
+                if not run.cancelled() and run.exception() is None:
+                    report({"final_answer": run.result().data["message"]["content"]["text"]})
+            response = run.result()
+
+        yield format_sse("final", {
+            "final_answer": response.data["message"]["content"]["text"],
+            "queue_wait_ms": round((ticket.queue_wait or 0) * 1000),
+            "run_time_ms": round((ticket.run_time or 0) * 1000),
+        })
+    except AgentPoolExhausted as e:
+        yield format_sse("error", {"error": str(e), "retry_after": admission.retry_after()})
+    except Exception as e:
+        traceback.print_exc()
+        yield format_sse("error", {"error": str(e)})
+    finally:
+        report(None)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that awaits on_close() however the response ends, even when the body never started."""
+
+    def __init__(self, content, on_close: Callable[[], Awaitable[None]], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+
+async def stream_agent(endpoint: str, input_prompt: str, on_done=None, **run_kwargs):
+    """
+    Streaming counterpart of run_agent(). Admission happens before the response
+    starts, so rejections still surface as plain 429/503 responses. The admission slot
+    is released, and on_done(None) called, when the body ends - or when the response
+    ends without the body ever being iterated (client gone before the first chunk).
+    """
+    reported = False
+
+    def done(content) -> None:
+        nonlocal reported
+        if on_done and not reported:
+            reported = True
+            on_done(content)
+
+    admitted = admission.admit(endpoint)
+    try:
+        ticket = await admitted.__aenter__()
+    except AdmissionRejected as e:
+        done(None)
+        return rejected_response(e)
+
+    started = released = False
+
+    async def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            done(None)  # no-op once the run reported its answer
+            await admitted.__aexit__(None, None, None)
+
+    async def body():
+        nonlocal started
+        started = True
+        try:
+            async for chunk in _agent_events(ticket, input_prompt, on_done=done, **run_kwargs):
+                yield chunk
+        finally:
+            await release()
+
+    async def release_unstarted() -> None:
+        # a started body releases in its own finally, after the agent run has ended
+        if not started:
+            await release()
+
+    return ClosingStreamingResponse(
+        body(),
+        on_close=release_unstarted,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def save_upload(image: UploadFile) -> Path:
+    temp_path = Path("/tmp") / image.filename
+    with open(temp_path, "wb") as buffer:
+        shutil.copyfileobj(image.file, buffer)
+    return temp_path
+
+
+def image_prompt(image_path: Path, question: str) -> str:
+    return f"{str(image_path)}   \n{question}"
+
+
+def create_order_prompt(payload: Dict) -> str:
+    # Convert the Python dict to a properly escaped JSON string and
+    # construct a human-readable prompt with embedded JSON
+    payload_json = json.dumps(payload)
+    return f"Create a sales order using a properly structured JSON payload:\n{payload_json}"
+
+
+def check_mode(mode: str) -> str:
+    if mode not in MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {', '.join(MODES)}")
+    return mode
+
+
+def direct_error_response(e: Exception) -> JSONResponse:
+    if isinstance(e, OrderValidationError):
+        return JSONResponse(status_code=422, content={"error": str(e), "errors": e.errors})
+    if getattr(e, "retry_after", None):
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
+    return JSONResponse(status_code=502, content={"error": str(e)})
+
+
+class CreateToolResults:
+    """
+    Outputs of the create_sales_order tool during one agent run. The agent relays Fusion
+    failures in its answer text, so whether the order was created is read from the tool.
+    """
+
+    def __init__(self):
+        self.outputs: List[str] = []
+
+    def on_tool(self, required_action, performed_action) -> None:
+        # called from the agent worker thread
+        if required_action.function_call.name.endswith("create_sales_order") and performed_action:
+            self.outputs.append(performed_action.function_call_output)
+
+    @property
+    def created(self) -> bool:
+        # the agent may retry after a failure: the last attempt decides
+        return bool(self.outputs) and not tool_failed(self.outputs[-1])
+
+
+def order_created(content: Dict) -> bool:
+    """Only responses of created orders are stored for idempotent replay."""
+    return bool(content.get("created"))
+
+
+def direct_order(payload: Dict, mode: str) -> Optional[Dict]:
+    """
+    The validated order to post to Fusion without the agent, or None when the agent
+    should handle the payload (mode=agent, or auto with a payload that is not a valid order).
+    :raises OrderValidationError: mode=direct and the payload is invalid, or its master data is unknown
+    """
+    if mode == "agent":
+        return None
+    try:
+        return validate_order(payload)
+    except OrderValidationError as e:
+        # the agent cannot fix an unknown product or customer either
+        if mode == "direct" or isinstance(e, MasterDataError):
+            raise
+        return None
+
+
+async def create_order_once(
+    payload: Dict, key: Optional[str], mode: str = DEFAULT_ORDER_MODE, order: Optional[Dict] = None
+):
+    """
+    Create the order at most once per idempotency key; retries get the stored
+    response without another LLM run or Fusion write. In direct/auto mode a valid
+    Transaction payload is posted to Fusion without the agent.
+    :param order: the payload already validated by direct_order(), to skip validating it again
+    :return: (content, headers)
+    """
+    headers = {}
+    if order is None:
+        order = direct_order(payload, mode)
+
+    async def create():
+        if order is not None:
+            # failures raise DirectCallFailed, which releases the idempotency key
+            final_answer = await create_order_direct(order)
+            return {"final_answer": final_answer, "mode": "direct", "created": True}
+        # response = await agent_order.run_async(input_prompt)
+        results = CreateToolResults()
+        response, ticket = await run_agent(
+            "orders_create", create_order_prompt(payload), on_fulfilled_required_action=results.on_tool
+        )
+        headers.update(ticket.headers())
+        final_answer = response.data["message"]["content"]["text"]
+        print(final_answer)
+        return {"final_answer": final_answer, "mode": "agent", "created": results.created}
+
+    replayed = False
+    if key is None:
+        content = await create()
+    else:
+        content, replayed = await idempotency.run(key, request_fingerprint(payload), create, is_success=order_created)
+        if replayed:
+            headers["Idempotent-Replayed"] = "true"
+    if order_created(content) and not replayed:  # the first create already started watching
+        watch_created_order(payload)
+    return content, headers
+
+
+def idempotency_error_response(e: Exception) -> JSONResponse:
+    if isinstance(e, IdempotencyMismatch):
+        return JSONResponse(status_code=422, content={"error": str(e)})
+    return JSONResponse(
+        status_code=409,
+        content={"error": str(e)},
+        headers={"Retry-After": str(admission.retry_after())},
+    )
+
+
+def email_prompt(saas_transaction_id, final_message: str) -> str:
+    #input_prompt = f"Send an email to ops@example.com: subject: Sales Order Created for orderid : {saas_transaction_id}, body: {final_message}"
+    return (
+        f"Send an email to ops@example.com: "
+        f"subject: Sales Order Status for orderid : {saas_transaction_id}, "
+        f"body: {final_message}"
+    )
+
+
+@app.get("/health/agents")
+async def agent_pool_health():
+    return JSONResponse(content=agent_pool.stats())
+
+
+@app.get("/health/admission")
+async def admission_health():
+    return JSONResponse(content=admission.stats())
+
+
+@app.get("/health/idempotency")
+async def idempotency_health():
+    return JSONResponse(content=idempotency.stats())
+
+
+@app.get("/health/fusion")
+async def fusion_health():
+    return JSONResponse(content=pool_stats())
+
+
+@app.get("/health/vision_cache")
+async def vision_cache_health():
+    return JSONResponse(content=get_vision_cache().stats())
+
+@app.get("/health/render_cache")
+async def render_cache_health():
+    return JSONResponse(content=get_render_cache().stats())
 
 @app.post("/query/image")
 async def ask_agent_from_image(
@@ -19,24 +495,14 @@ async def ask_agent_from_image(
 ):
     try:
         # Save image locally
-        temp_path = Path("/tmp") / image.filename
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
-
+        temp_path = save_upload(image)
 
         # Build the prompt
-        input_prompt = f"{str(temp_path)}   \n{question}"
-        agent_image2text = agent_create_sales_order()
-        # print("----- agent_image2text response help: ----", help(agent_image2text))
-
+        input_prompt = image_prompt(temp_path, question)
         # response = await agent_image2text.run_async(input_prompt, max_steps=5)
 
-        # Offload the synchronous call to a thread
-        response = await asyncio.to_thread(
-            agent_image2text.run,
-            input_prompt,
-            max_steps=5
-        )
+        # Offload the synchronous call to the bounded agent executor
+        response, ticket = await run_agent("query_image", input_prompt, max_steps=5)
 
         ## ---- attempt to print/log agent tool/function call arguments
         try:
@@ -100,7 +566,7 @@ async def ask_agent_from_image(
 
         final_answer = response.data["message"]["content"]["text"]
 
-        return JSONResponse(content={"final_answer": final_answer})
+        return JSONResponse(content={"final_answer": final_answer}, headers=ticket.headers())
     
         # image_path = f"{PROJECT_ROOT}/images/orderhub_handwritten.jpg"
         # question = """
@@ -112,6 +578,10 @@ async def ask_agent_from_image(
         # final_message = response.data["message"]["content"]["text"]
         # print(final_message)
 
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except AgentPoolExhausted as e:
+        return pool_exhausted_response(e)
     except Exception as e:
         # Print the full stack trace to stdout/logs
         traceback.print_exc()
@@ -127,25 +597,30 @@ async def ask_agent_from_image(
 
 
 @app.post("/orders/create")
-async def create_sales_order(payload: Dict = Body(...)):
+async def create_sales_order(
+    payload: Dict = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    mode: str = Query(DEFAULT_ORDER_MODE, description="auto, direct or agent"),
+):
     """
-    Create an order using the OCI AI agent and a structured JSON payload.
+    Create an order from a structured JSON payload, either directly against Fusion SCM
+    (mode=direct, or auto with a valid Transaction payload) or through the OCI AI agent.
+    Retries with the same Idempotency-Key (or the same SourceTransactionNumber +
+    SourceTransactionSystem) return the stored response instead of creating the order again.
     """
+    check_mode(mode)
     try:
-        # Convert the Python dict to a properly escaped JSON string
-        payload_json = json.dumps(payload)
-
-        # Construct a human-readable prompt with embedded JSON
-        input_prompt = f"Create a sales order using a properly structured JSON payload:\n{payload_json}"
-
-        agent_order = agent_create_sales_order()
-        # response = await agent_order.run_async(input_prompt)
-        response = await asyncio.to_thread(agent_order.run, input_prompt)
-
-        final_answer = response.data["message"]["content"]["text"]
-        print(final_answer)
-
-        return JSONResponse(content={"final_answer": final_answer})
+        key = order_idempotency_key(idempotency_key, payload)
+        content, headers = await create_order_once(payload, key, mode)
+        return JSONResponse(content=content, headers=headers)
+    except (OrderValidationError, DirectCallFailed) as e:
+        return direct_error_response(e)
+    except (IdempotencyConflict, IdempotencyMismatch) as e:
+        return idempotency_error_response(e)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except AgentPoolExhausted as e:
+        return pool_exhausted_response(e)
     except Exception as e:
         # Print the full stack trace to stdout/logs
         traceback.print_exc()
@@ -158,22 +633,95 @@ async def create_sales_order(payload: Dict = Body(...)):
             }
         )
 
+@app.post("/orders/batch")
+async def create_sales_orders_batch(
+    payloads: List[Dict] = Body(...),
+    concurrency: int = Query(BATCH_CONCURRENCY, ge=1),
+):
+    """
+    Create many orders directly in Fusion SCM (no agent). All payloads are validated
+    first; then up to `concurrency` creates run at once and each result is streamed as
+    an SSE `order` event when it completes, followed by a `done` summary.
+    Every order goes through the idempotency cache, so resubmitting a batch does not
+    create the successful orders again.
+    """
+    if not payloads:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(payloads) > BATCH_MAX_ORDERS:
+        raise HTTPException(status_code=413, detail=f"Batch has more than {BATCH_MAX_ORDERS} orders")
+
+    async def create(order: Dict) -> str:
+        # create_orders_batch() validated every order already
+        content, _ = await create_order_once(order, order_idempotency_key(None, order), "direct", order=order)
+        return content["final_answer"]
+
+    try:
+        results = create_orders_batch(payloads, min(concurrency, BATCH_MAX_CONCURRENCY), create)
+    except OrderValidationError as e:
+        return direct_error_response(e)
+
+    async def events():
+        summary = {"total": len(payloads), "created": 0, "failed": 0}
+        yield format_sse("status", {"status": "submitting", "total": len(payloads)})
+        async for result in results:
+            summary[result["status"]] += 1
+            yield format_sse("order", result)
+        yield format_sse("done", summary)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/orders/lookup")
+async def lookup_sales_orders(orderids: List[str] = Body(...)):
+    """
+    Look up many orders directly in Fusion SCM (no agent), concurrently and with ids
+    combined into q= filters where Fusion accepts them.
+    :return: {"orders": {orderid: order, null when not found, or {"error": ...}}}
+    """
+    if len(orderids) > BATCH_MAX_ORDERS:
+        raise HTTPException(status_code=413, detail=f"More than {BATCH_MAX_ORDERS} order ids")
+    return JSONResponse(content={"orders": await lookup_orders_direct(orderids)})
+
+
 @app.get("/orders/query")
-async def query_sales_order(input_prompt: str):
+async def query_sales_order(
+    input_prompt: Optional[str] = None,
+    orderid: Optional[str] = None,
+    mode: str = Query(DEFAULT_ORDER_MODE, description="auto, direct or agent"),
+):
     """
     Get sales order using a query string for the Oracle SCM API.
+    With an orderid (and mode auto/direct) the order is looked up directly, without the agent.
     Example:
-    /orders/query?finder=findBySourceOrderNumberAndSystem;SourceTransactionNumber=404087,SourceTransactionSystem=GPR
+    /orders/query?orderid=404087
+    /orders/query?input_prompt=get sales order for orderid : 404087
     """
+    check_mode(mode)
+    if orderid is None and (mode == "direct" or not input_prompt):
+        raise HTTPException(status_code=422, detail="orderid is required in direct mode, input_prompt otherwise")
     try:
-        agent_get = agent_create_sales_order()
-        response = await asyncio.to_thread(agent_get.run, input_prompt)
+        if orderid is not None and mode != "agent":
+            final_answer = await get_order_direct(orderid)
+            return JSONResponse(content={"final_answer": final_answer, "mode": "direct"})
+
+        input_prompt = input_prompt or f"get sales order for orderid : {orderid}"
+        response, ticket = await run_agent("orders_query", input_prompt)
         # response = await agent_get.run_async(input_prompt)
 
         final_answer = response.data["message"]["content"]["text"]
         print(final_answer)
 
-        return JSONResponse(content={"final_answer": final_answer})
+        return JSONResponse(content={"final_answer": final_answer, "mode": "agent"}, headers=ticket.headers())
+    except DirectCallFailed as e:
+        return direct_error_response(e)
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except AgentPoolExhausted as e:
+        return pool_exhausted_response(e)
     except Exception as e:
         # Print the full stack trace to stdout/logs
         traceback.print_exc()
@@ -186,7 +734,7 @@ async def query_sales_order(input_prompt: str):
             }
         )
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 class SalesEmailRequest(BaseModel):
     saas_transaction_id: str | int = Field(..., description="Sales order id")
@@ -197,33 +745,35 @@ class SalesEmailResponse(BaseModel):
     final_message_email: str
 
 @app.post("/orders/email")
-async def email_sales_order(payload: SalesEmailRequest):
+async def email_sales_order(
+    payload: SalesEmailRequest,
+    mode: str = Query(DEFAULT_ORDER_MODE, description="auto, direct or agent"),
+):
     """
     Email the status of the Sales Order to a CSR
     """
+    check_mode(mode)
     try:
-        agent_order_email = agent_create_sales_order()
-        
+        if mode != "agent":
+            final_answer = await asyncio.to_thread(
+                email_order_direct, payload.saas_transaction_id, payload.final_message
+            )
+            return JSONResponse(content={"final_answer": final_answer, "mode": "direct"})
 
-        saas_transaction_id = payload.saas_transaction_id
-        final_message = payload.final_message
-
-        input_prompt = (
-            f"Send an email to ops@example.com: "
-            f"subject: Sales Order Status for orderid : {saas_transaction_id}, "
-            f"body: {final_message}"
-        )
+        input_prompt = email_prompt(payload.saas_transaction_id, payload.final_message)
 
-        #input_prompt = f"Send an email to ops@example.com: subject: Sales Order Created for orderid : {saas_transaction_id}, body: {final_message}"
-
-        response = await asyncio.to_thread(agent_order_email.run, input_prompt, max_steps=3)
+        response, ticket = await run_agent("orders_email", input_prompt, max_steps=3)
         # response = await agent_order_email.run_async(input_prompt, max_steps=3)
 
         final_answer = response.data["message"]["content"]["text"]
         print(final_answer)
 
-        return JSONResponse(content={"final_answer": final_answer})
+        return JSONResponse(content={"final_answer": final_answer, "mode": "agent"}, headers=ticket.headers())
         
+    except AdmissionRejected as e:
+        return rejected_response(e)
+    except AgentPoolExhausted as e:
+        return pool_exhausted_response(e)
     except Exception as e:
         # Print the full stack trace to stdout/logs
         traceback.print_exc()
@@ -234,4 +784,336 @@ async def email_sales_order(payload: SalesEmailRequest):
                 "error": str(e),
                 "traceback": traceback.format_exc()
             }
-        )
\ No newline at end of file
+        )
+
+
+# ────────────────────────────────────────────────────────
+# Streaming (SSE) variants: events "status", "trace", "tool", then "final" or "error"
+# ────────────────────────────────────────────────────────
+
+@app.post("/query/image/stream")
+async def ask_agent_from_image_stream(
+    image: UploadFile = File(...),
+    question: str = Form(...)
+):
+    temp_path = save_upload(image)
+    return await stream_agent("query_image", image_prompt(temp_path, question), max_steps=5)
+
+
+@app.post("/orders/create/stream")
+async def create_sales_order_stream(
+    payload: Dict = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    mode: str = Query(DEFAULT_ORDER_MODE, description="auto, direct or agent"),
+):
+    """
+    Streaming /orders/create. In direct mode (or auto with a valid Transaction payload)
+    there is nothing to stream: the order is created without the agent and returned as
+    a single "final" event.
+    """
+    check_mode(mode)
+    key = order_idempotency_key(idempotency_key, payload)
+    try:
+        order = direct_order(payload, mode)
+        if order is not None:
+            content, headers = await create_order_once(payload, key, "direct", order=order)
+    except (OrderValidationError, DirectCallFailed) as e:
+        return direct_error_response(e)
+    except (IdempotencyConflict, IdempotencyMismatch) as e:
+        return idempotency_error_response(e)
+    if order is not None:
+        return StreamingResponse(
+            iter([format_sse("final", {**content, "replayed": "Idempotent-Replayed" in headers})]),
+            media_type="text/event-stream",
+            headers=headers,
+        )
+
+    if key is None:
+        unkeyed = CreateToolResults()
+
+        def on_created(content):
+            if content is not None and unkeyed.created:
+                watch_created_order(payload)
+
+        return await stream_agent(
+            "orders_create", create_order_prompt(payload), on_done=on_created, on_tool=unkeyed.on_tool
+        )
+
+    try:
+        status, stored = idempotency.reserve(key, request_fingerprint(payload))
+    except IdempotencyMismatch as e:
+        return idempotency_error_response(e)
+    if status == "in_flight":
+        return idempotency_error_response(IdempotencyConflict("A request with this idempotency key is already being processed"))
+    if status == "done":
+        return StreamingResponse(
+            iter([format_sse("final", {**stored, "replayed": True})]),
+            media_type="text/event-stream",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    results = CreateToolResults()
+
+    def on_done(content):
+        if content is not None:
+            content = {**content, "mode": "agent", "created": results.created}
+        if content is None or not order_created(content):
+            idempotency.release(key)
+        else:
+            idempotency.complete(key, content)
+            watch_created_order(payload)
+
+    return await stream_agent(
+        "orders_create", create_order_prompt(payload), on_done=on_done, on_tool=results.on_tool
+    )
+
+
+@app.get("/orders/query/stream")
+async def query_sales_order_stream(input_prompt: str):
+    return await stream_agent("orders_query", input_prompt)
+
+
+@app.post("/orders/email/stream")
+async def email_sales_order_stream(payload: SalesEmailRequest):
+    input_prompt = email_prompt(payload.saas_transaction_id, payload.final_message)
+    return await stream_agent("orders_email", input_prompt, max_steps=3)
+
+
+# ────────────────────────────────────────────────────────
+# Order status watch: Fusion is polled by the watcher, clients subscribe to changes
+# ────────────────────────────────────────────────────────
+
+class WatchRequest(BaseModel):
+    orderids: List[str] = Field(..., min_length=1)
+
+
+@app.post("/orders/watch")
+async def watch_orders(request: WatchRequest):
+    """Start watching orders (by SourceTransactionNumber); the first poll happens right away."""
+    watched = [order_watcher.watch(orderid, poll_now=True) for orderid in request.orderids]
+    return JSONResponse(content={"watching": [w.to_dict() for w in watched]})
+
+
+@app.get("/orders/watch")
+async def list_watched_orders():
+    return JSONResponse(content={
+        "orders": [w.to_dict() for w in order_watcher.watched()],
+        **order_watcher.stats(),
+    })
+
+
+@app.get("/orders/watch/events")
+async def order_status_events(orderids: Optional[str] = None):
+    """
+    SSE stream of status events: "status" on every change (including the first status
+    seen), "done" when an order reaches a terminal status, "expired" when its watch ends.
+    :param orderids: comma separated filter; all watched orders when omitted
+    """
+    ids = [orderid.strip() for orderid in orderids.split(",") if orderid.strip()] if orderids else None
+    for orderid in ids or []:
+        order_watcher.watch(orderid)
+
+    async def events():
+        async with order_watcher.subscribe(ids) as queue:
+            yield format_sse("status", {"status": "subscribed", "orderids": ids})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse("order", event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/orders/watch/{orderid}")
+async def get_watched_order(orderid: str, wait: float = Query(0, ge=0, le=60)):
+    """
+    Latest status known to the watcher. With wait > 0 an order whose status is not
+    known yet is watched, polled immediately and awaited for up to wait seconds.
+    """
+    watched = order_watcher.get(orderid)
+    if wait > 0 and (watched is None or watched.status is None):
+        watched = await order_watcher.wait_for_status(orderid, wait)
+    if watched is None:
+        raise HTTPException(status_code=404, detail="Order is not being watched")
+    return JSONResponse(content=watched.to_dict())
+
+
+@app.delete("/orders/watch/{orderid}")
+async def unwatch_order(orderid: str):
+    if not order_watcher.unwatch(orderid):
+        raise HTTPException(status_code=404, detail="Order is not being watched")
+    return JSONResponse(content={"orderid": orderid, "watching": False})
+
+
+# ────────────────────────────────────────────────────────
+# Master data: check orders locally before they reach Fusion
+# ────────────────────────────────────────────────────────
+
+@app.post("/orders/validate")
+async def validate_sales_order(payload: Dict = Body(...)):
+    """
+    Check an order against the Transaction model and the master data cache without
+    creating it. Returns the corrected order, the corrections made, the errors and the
+    values unknown to the cache (warnings: they may be newer than the last sync).
+    """
+    try:
+        order = validate_order(payload, master_data=False)
+    except OrderValidationError as e:
+        return JSONResponse(content={"valid": False, "order": payload, "corrections": [], "errors": e.errors, "warnings": []})
+    check = get_master_data().check_order(order)
+    return JSONResponse(content={"valid": not check.errors, **check._asdict()})
+
+
+@app.get("/master/{kind}")
+async def search_master_data(kind: str, search: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100)):
+    """Exact and fuzzy lookup of products, customers or uoms by number or name."""
+    if kind not in MASTER_SOURCES:
+        raise HTTPException(status_code=404, detail=f"kind must be one of {', '.join(MASTER_SOURCES)}")
+    return JSONResponse(content={"kind": kind, "results": get_master_data().search(kind, search, limit)})
+
+
+@app.post("/master/sync")
+async def sync_master_data(full: bool = False):
+    """Pull master data changed since the last sync from Fusion (everything with full=true)."""
+    return JSONResponse(content={"results": await asyncio.to_thread(get_master_data().sync_all, full)})
+
+
+@app.get("/health/master")
+async def master_data_health():
+    return JSONResponse(content=get_master_data().stats())
+
+
+# ────────────────────────────────────────────────────────
+# Background jobs: submit, get a job id back immediately, poll /jobs/{job_id}
+# ────────────────────────────────────────────────────────
+
+JOB_OPERATIONS = {
+    # operation -> (admission endpoint, params -> (input_prompt, run kwargs))
+    "query_image": lambda p: (image_prompt(Path(p["image_path"]), p["question"]), {"max_steps": 5}),
+    "orders_create": lambda p: (create_order_prompt(p["payload"]), {}),
+    "orders_query": lambda p: (p["input_prompt"], {}),
+    "orders_email": lambda p: (email_prompt(p["saas_transaction_id"], p["final_message"]), {"max_steps": 3}),
+}
+
+
+async def execute_job(job: Job) -> Dict:
+    input_prompt, run_kwargs = JOB_OPERATIONS[job.operation](job.params)
+    deadline = time.monotonic() + JOB_MAX_CAPACITY_WAIT
+
+    async def wait_for_capacity(delay: float, reason: Exception) -> None:
+        if time.monotonic() + delay > deadline:
+            raise RuntimeError(f"No capacity within {JOB_MAX_CAPACITY_WAIT:.0f}s: {reason}")
+        await asyncio.sleep(delay)
+
+    while True:
+        # Jobs wait for capacity (up to JOB_MAX_CAPACITY_WAIT) instead of being rejected like interactive requests
+        try:
+            if job.operation == "orders_create":
+                content, headers = await create_order_once(
+                    job.params["payload"], job.params.get("idempotency_key"), job.params.get("mode", DEFAULT_ORDER_MODE)
+                )
+                return {**content, "replayed": "Idempotent-Replayed" in headers}
+            response, ticket = await run_agent(job.operation, input_prompt, **run_kwargs)
+        except AdmissionRejected as e:
+            await wait_for_capacity(e.retry_after, e)
+            continue
+        except (AgentPoolExhausted, IdempotencyConflict) as e:
+            await wait_for_capacity(admission.retry_after(), e)
+            continue
+        except OrderValidationError as e:
+            raise ValueError(f"{e}: {json.dumps(e.errors, default=str)}")
+        return {
+            "final_answer": response.data["message"]["content"]["text"],
+            "queue_wait_ms": round((ticket.queue_wait or 0) * 1000),
+            "run_time_ms": round((ticket.run_time or 0) * 1000),
+        }
+
+
+def remove_job_upload(job: Job) -> None:
+    image_path = job.params.get("image_path")
+    if image_path and Path(image_path).parent == JOB_UPLOAD_DIR:
+        Path(image_path).unlink(missing_ok=True)
+
+
+job_runner = JobRunner(
+    make_job_store(JOB_STORE, JOB_DIR / "jobs.db"),
+    execute_job,
+    ttl=JOB_TTL,
+    lease_seconds=JOB_LEASE,
+    on_evict=remove_job_upload,
+    recover_interval=JOB_RECOVER_INTERVAL,
+)
+
+
+class JobRequest(BaseModel):
+    operation: str = Field(..., description="orders_create, orders_query or orders_email")
+    params: Dict = Field(..., description="Same body/params as the synchronous endpoint")
+
+
+def validate_job_params(operation: str, params: Dict, idempotency_key: Optional[str] = None) -> Dict:
+    if operation == "orders_create":
+        # accept either {"payload": {...}, "mode": ...} or the order payload itself
+        payload = params.get("payload", params)
+        return {
+            "payload": payload,
+            "idempotency_key": order_idempotency_key(idempotency_key, payload),
+            "mode": check_mode(params.get("mode", DEFAULT_ORDER_MODE)) if "payload" in params else DEFAULT_ORDER_MODE,
+        }
+    if operation == "orders_query":
+        if not params.get("input_prompt"):
+            raise HTTPException(status_code=422, detail="orders_query requires params.input_prompt")
+        return {"input_prompt": params["input_prompt"]}
+    if operation == "orders_email":
+        try:
+            return SalesEmailRequest(**params).model_dump()
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=json.loads(e.json()))
+    if operation == "query_image":
+        raise HTTPException(status_code=422, detail="Submit image jobs as multipart to /jobs/query/image")
+    raise HTTPException(status_code=422, detail=f"Unknown operation '{operation}'")
+
+
+def job_accepted(job: Job) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.job_id, "status": job.status, "status_url": f"/jobs/{job.job_id}"},
+        headers={"Location": f"/jobs/{job.job_id}"},
+    )
+
+
+@app.post("/jobs")
+async def submit_job(
+    request: JobRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    params = validate_job_params(request.operation, request.params, idempotency_key)
+    return job_accepted(job_runner.submit(request.operation, params))
+
+
+@app.post("/jobs/query/image")
+async def submit_image_job(
+    image: UploadFile = File(...),
+    question: str = Form(...)
+):
+    # keep the upload next to the job store so the job can be resumed after a restart
+    JOB_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    image_path = JOB_UPLOAD_DIR / f"{uuid.uuid4().hex}{Path(image.filename or '').suffix}"
+    with open(image_path, "wb") as buffer:
+        shutil.copyfileobj(image.file, buffer)
+    job = job_runner.submit("query_image", {"image_path": str(image_path), "question": question})
+    return job_accepted(job)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return JSONResponse(content=job.to_dict())
@@ -0,0 +1,199 @@
+"""
+idempotency.py
+==========================
+==Idempotent Order Creation==
+==========================
+Clients retry /orders/create after timeouts; without protection every retry runs the
+agent again and may post a duplicate order to Fusion. This cache remembers, per
+idempotency key, the response of the first successful run:
+
+1. key from the ``Idempotency-Key`` header, else a hash of
+   SourceTransactionNumber + SourceTransactionSystem from the payload
+2. duplicates of a request still in flight in this worker wait for it: a stored
+   response is replayed, after a failure the waiter claims the key and runs itself;
+   in flight in another worker -> IdempotencyConflict (409)
+3. same key with a different payload -> IdempotencyMismatch (422)
+4. only successful responses are stored; failures release the key so a retry can run
+
+Backed by SQLite (shared between workers) or an in-memory SQLite database. The
+in-memory store only deduplicates within one process: run more than one server
+worker with the SQLite store.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+IN_FLIGHT = "in_flight"
+DONE = "done"
+
+
+class IdempotencyConflict(Exception):
+    """The same key is being processed by another worker."""
+
+
+class IdempotencyMismatch(Exception):
+    """The key was already used with a different request body."""
+
+
+def order_idempotency_key(header_key: Optional[str], payload: Dict) -> Optional[str]:
+    """
+    :param header_key: value of the Idempotency-Key header, if any
+    :param payload: sales order payload
+    :return: cache key, or None when the request cannot be deduplicated
+    """
+    if header_key:
+        return f"header:{header_key}"
+    number = payload.get("SourceTransactionNumber")
+    system = payload.get("SourceTransactionSystem")
+    if number and system:
+        digest = hashlib.sha256(f"{number}|{system}".encode("utf-8")).hexdigest()
+        return f"order:{digest}"
+    return None
+
+
+def request_fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class IdempotencyCache:
+
+    def __init__(self, path: Optional[Path] = None, ttl: float = 86400.0, in_flight_timeout: float = 900.0):
+        """
+        :param path: SQLite file shared between workers; None keeps entries in memory
+        :param ttl: seconds a stored response is replayed
+        :param in_flight_timeout: seconds after which an unfinished reservation is considered abandoned
+        """
+        self.ttl = ttl
+        self.in_flight_timeout = in_flight_timeout
+        if path is None:
+            database = ":memory:"
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            database = str(path)
+        self._conn = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        if path is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency (
+                key         TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                response    TEXT,
+                created_at  REAL NOT NULL
+            )
+        """)
+        self._lock = threading.Lock()
+        # key -> (fingerprint, future) for requests in flight in this worker; the future
+        # resolves to the stored response, or None when the run failed
+        self._waiters: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._last_evict = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def reserve(self, key: str, fingerprint: str) -> Tuple[str, Optional[dict]]:
+        """
+        Claim key for processing.
+        :return: ("new", None) if the caller should process the request,
+                 ("done", response) if a stored response should be replayed,
+                 ("in_flight", None) if another worker is processing it
+        :raises IdempotencyMismatch: key reused with a different payload
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_evict > 60:
+                self._conn.execute("DELETE FROM idempotency WHERE status = ? AND created_at < ?", (DONE, now - self.ttl))
+                self._conn.execute(
+                    "DELETE FROM idempotency WHERE status = ? AND created_at < ?", (IN_FLIGHT, now - self.in_flight_timeout)
+                )
+                self._last_evict = now
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO idempotency (key, fingerprint, status, created_at) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, IN_FLIGHT, now),
+            ).rowcount
+            if inserted:
+                return "new", None
+            row = self._conn.execute(
+                "SELECT fingerprint, status, response FROM idempotency WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:  # evicted between the two statements
+            return self.reserve(key, fingerprint)
+        stored_fingerprint, status, response = row
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyMismatch("Idempotency key was already used with a different order payload")
+        if status == DONE:
+            self.hits += 1
+        return status, json.loads(response) if response else None
+
+    def complete(self, key: str, response: dict) -> None:
+        """Store the response for a reserved key."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE idempotency SET status = ?, response = ?, created_at = ? WHERE key = ?",
+                (DONE, json.dumps(response, default=str), time.time(), key),
+            )
+
+    def release(self, key: str) -> None:
+        """Give up a reservation so a retry can process the request."""
+        with self._lock:
+            self._conn.execute("DELETE FROM idempotency WHERE key = ? AND status = ?", (key, IN_FLIGHT))
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        fn: Callable[[], Awaitable[dict]],
+        is_success: Callable[[dict], bool] = lambda response: True,
+    ) -> Tuple[dict, bool]:
+        """
+        Run fn() at most once per key.
+        :param fn: async callable producing a JSON-serializable response
+        :param is_success: only responses passing this check are stored
+        :return: (response, replayed)
+        """
+        while key in self._waiters:
+            in_flight_fingerprint, waiter = self._waiters[key]
+            if in_flight_fingerprint != fingerprint:
+                raise IdempotencyMismatch("Idempotency key was already used with a different order payload")
+            stored = await asyncio.shield(waiter)
+            if stored is not None:
+                self.hits += 1
+                return stored, True
+            # the run failed and released the key: try again, unless another waiter got there first
+
+        status, stored = self.reserve(key, fingerprint)
+        if status == DONE and stored is not None:
+            return stored, True
+        if status == IN_FLIGHT:
+            raise IdempotencyConflict("A request with this idempotency key is already being processed")
+
+        self.misses += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[key] = (fingerprint, waiter)
+        try:
+            response = await fn()
+        except BaseException:
+            self.release(key)
+            waiter.set_result(None)
+            raise
+        finally:
+            self._waiters.pop(key, None)
+
+        if is_success(response):
+            self.complete(key, response)
+            waiter.set_result(response)
+        else:
+            self.release(key)
+            waiter.set_result(None)
+        return response, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM idempotency WHERE status = ?", (DONE,)).fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "stored": stored, "in_flight": len(self._waiters)}
@@ -0,0 +1,409 @@
+"""
+job_store.py
+==========================
+==Background Job Store==
+==========================
+Lets clients submit a long-running OrderX agent operation, get a job id back
+immediately, and poll for the result later.
+
+- InMemoryJobStore: single process, jobs are lost on restart
+- SQLiteJobStore:   jobs live in a SQLite file; queued jobs, and running jobs whose
+                    lease expired (worker died mid-run), are picked up again by a
+                    running worker within recover_interval seconds, and at startup
+- JobRunner:        executes jobs as asyncio tasks, re-checks the store for orphaned jobs
+                    and evicts finished jobs after a TTL
+
+A claim stores a random owner token with the lease. The runner renews the lease every
+lease_seconds / 3 while the job runs, so a long job (or one waiting for admission) is not
+taken over by another worker; finish() only records a result while the caller still owns
+the job, so a worker that lost its lease cannot overwrite the result of the new owner.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    operation: str
+    params: Dict[str, Any]
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    lease_until: float = 0.0
+    owner: Optional[str] = None  # token of the worker run holding the lease
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("lease_until")
+        data.pop("owner")
+        return data
+
+
+class JobStore(ABC):
+    """Interface shared by the in-memory and SQLite stores."""
+
+    @abstractmethod
+    def create(self, operation: str, params: Dict[str, Any]) -> Job:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def claim(self, job_id: str, lease_seconds: float, owner: str) -> bool:
+        """Atomically move a job to RUNNING under owner; False if someone else holds it."""
+
+    @abstractmethod
+    def renew(self, job_id: str, lease_seconds: float, owner: str) -> bool:
+        """Extend the lease of a RUNNING job; False if owner no longer holds it."""
+
+    @abstractmethod
+    def finish(self, job_id: str, result: Any = None, error: Optional[str] = None, owner: Optional[str] = None) -> bool:
+        """Record the outcome; with owner, only while owner still holds the lease. False if not recorded."""
+
+    @abstractmethod
+    def recoverable(self) -> List[Job]:
+        """Jobs that are queued, or running with an expired lease."""
+
+    @abstractmethod
+    def evict(self, ttl: float) -> List[Job]:
+        """Delete finished jobs older than ttl seconds and return them."""
+
+
+class InMemoryJobStore(JobStore):
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def create(self, operation, params):
+        job = Job(operation=operation, params=params)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def claim(self, job_id, lease_seconds, owner):
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (job.status == RUNNING and job.lease_until > now) or job.status in (SUCCEEDED, FAILED):
+                return False
+            job.status = RUNNING
+            job.updated_at = now
+            job.lease_until = now + lease_seconds
+            job.owner = owner
+            return True
+
+    def renew(self, job_id, lease_seconds, owner):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != RUNNING or job.owner != owner:
+                return False
+            job.lease_until = time.time() + lease_seconds
+            return True
+
+    def finish(self, job_id, result=None, error=None, owner=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (owner is not None and (job.status != RUNNING or job.owner != owner)):
+                return False
+            job.status = FAILED if error else SUCCEEDED
+            job.result = result
+            job.error = error
+            job.updated_at = time.time()
+            return True
+
+    def recoverable(self):
+        now = time.time()
+        with self._lock:
+            return [
+                job for job in self._jobs.values()
+                if job.status == QUEUED or (job.status == RUNNING and job.lease_until < now)
+            ]
+
+    def evict(self, ttl):
+        cutoff = time.time() - ttl
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.status in (SUCCEEDED, FAILED) and job.updated_at < cutoff
+            ]
+            for job in expired:
+                del self._jobs[job.job_id]
+        return expired
+
+
+class SQLiteJobStore(JobStore):
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id      TEXT PRIMARY KEY,
+                operation   TEXT NOT NULL,
+                params      TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                result      TEXT,
+                error       TEXT,
+                created_at  REAL NOT NULL,
+                updated_at  REAL NOT NULL,
+                lease_until REAL NOT NULL DEFAULT 0,
+                owner       TEXT
+            )
+        """)
+        try:  # job databases created before leases had owners
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        except sqlite3.OperationalError:
+            pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, updated_at)")
+        self._lock = threading.Lock()
+
+    COLUMNS = "job_id, operation, params, status, result, error, created_at, updated_at, lease_until, owner"
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        job_id, operation, params, status, result, error, created_at, updated_at, lease_until, owner = row
+        return Job(
+            job_id=job_id,
+            operation=operation,
+            params=json.loads(params),
+            status=status,
+            result=json.loads(result) if result is not None else None,
+            error=error,
+            created_at=created_at,
+            updated_at=updated_at,
+            lease_until=lease_until,
+            owner=owner,
+        )
+
+    def create(self, operation, params):
+        job = Job(operation=operation, params=params)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, operation, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.job_id, job.operation, json.dumps(params), job.status, job.created_at, job.updated_at),
+            )
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self.COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, job_id, lease_seconds, owner):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, lease_until = ?, owner = ? "
+                "WHERE job_id = ? AND (status = ? OR (status = ? AND lease_until < ?))",
+                (RUNNING, now, now + lease_seconds, owner, job_id, QUEUED, RUNNING, now),
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, job_id, lease_seconds, owner):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND status = ? AND owner = ?",
+                (time.time() + lease_seconds, job_id, RUNNING, owner),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, result=None, error=None, owner=None):
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?"
+        params = [
+            FAILED if error else SUCCEEDED,
+            json.dumps(result, default=str) if result is not None else None,
+            error,
+            time.time(),
+            job_id,
+        ]
+        if owner is not None:
+            query += " AND status = ? AND owner = ?"
+            params += [RUNNING, owner]
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+        return cursor.rowcount == 1
+
+    def recoverable(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY created_at",
+                (QUEUED, RUNNING, time.time()),
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def evict(self, ttl):
+        cutoff = time.time() - ttl
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (SUCCEEDED, FAILED, cutoff)
+            ).fetchall()
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (SUCCEEDED, FAILED, cutoff)
+            )
+        return [self._row_to_job(row) for row in rows]
+
+
+def make_job_store(kind: str, path: Path) -> JobStore:
+    """
+    :param kind: "memory" or "sqlite"
+    :param path: SQLite database file (ignored for memory)
+    """
+    if kind == "sqlite":
+        return SQLiteJobStore(path)
+    if kind == "memory":
+        return InMemoryJobStore()
+    raise ValueError(f"Unknown job store '{kind}', expected 'memory' or 'sqlite'")
+
+
+class JobRunner:
+
+    def __init__(
+        self,
+        store: JobStore,
+        execute: Callable[[Job], Awaitable[Any]],
+        ttl: float = 86400.0,
+        lease_seconds: float = 900.0,
+        evict_interval: float = 60.0,
+        on_evict: Optional[Callable[[Job], None]] = None,
+        recover_interval: float = 60.0,
+    ):
+        """
+        :param store: where jobs are persisted
+        :param execute: async callable(job) -> JSON-serializable result
+        :param ttl: seconds a finished job stays retrievable
+        :param lease_seconds: how long a RUNNING job is owned without a renewal before another worker
+                              may retry it; renewed every lease_seconds / 3 while the job runs
+        :param evict_interval: seconds between TTL sweeps
+        :param on_evict: cleanup hook for evicted jobs (e.g. remove uploaded files)
+        :param recover_interval: seconds between checks for queued jobs and expired leases (0 = startup only)
+        """
+        self.store = store
+        self.execute = execute
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.evict_interval = evict_interval
+        self.on_evict = on_evict
+        self.recover_interval = recover_interval
+        self._tasks: set = set()
+        self._scheduled: set = set()  # job ids with a task in this worker
+        self._evict_task: Optional[asyncio.Task] = None
+        self._recover_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Resume unfinished jobs and start the TTL sweeper and the orphan check."""
+        self.recover()
+        self._evict_task = asyncio.create_task(self._evict_loop())
+        if self.recover_interval > 0:
+            self._recover_task = asyncio.create_task(self._recover_loop())
+
+    async def close(self) -> None:
+        # Running jobs keep their lease and are resumed by another worker once it expires
+        for task in [self._evict_task, self._recover_task, *self._tasks]:
+            if task is not None:
+                task.cancel()
+        self._tasks.clear()
+        self._scheduled.clear()
+
+    def recover(self) -> int:
+        """Schedule queued jobs and jobs whose lease expired; returns how many were scheduled."""
+        resumed = 0
+        for job in self.store.recoverable():
+            if job.job_id in self._scheduled:
+                continue
+            logger.info("Resuming job %s (%s)", job.job_id, job.operation)
+            self._schedule(job)
+            resumed += 1
+        return resumed
+
+    def submit(self, operation: str, params: Dict[str, Any]) -> Job:
+        job = self.store.create(operation, params)
+        self._schedule(job)
+        return job
+
+    def _schedule(self, job: Job) -> None:
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        self._scheduled.add(job.job_id)
+
+        def done(task: asyncio.Task) -> None:
+            self._tasks.discard(task)
+            self._scheduled.discard(job.job_id)
+
+        task.add_done_callback(done)
+
+    async def _run(self, job: Job) -> None:
+        owner = uuid.uuid4().hex
+        if not self.store.claim(job.job_id, self.lease_seconds, owner):
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job.job_id, owner))
+        try:
+            result = await self.execute(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Job %s failed", job.job_id)
+            outcome = {"error": str(e)}
+        else:
+            outcome = {"result": result}
+        finally:
+            heartbeat.cancel()
+        if not self.store.finish(job.job_id, owner=owner, **outcome):
+            logger.warning("Job %s lost its lease; the result of this run was discarded", job.job_id)
+
+    async def _heartbeat(self, job_id: str, owner: str) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.lease_seconds / 3))
+            try:
+                if not self.store.renew(job_id, self.lease_seconds, owner):
+                    logger.warning("Job %s lease was taken over by another worker", job_id)
+                    return
+            except Exception as e:  # a missed renewal is retried; the lease has two more periods
+                logger.warning("Job %s lease renewal failed: %s", job_id, e)
+
+    async def _recover_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.recover_interval)
+            try:
+                self.recover()
+            except Exception as e:
+                logger.warning("Job recovery failed: %s", e)
+
+    async def _evict_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            try:
+                for job in self.store.evict(self.ttl):
+                    if self.on_evict:
+                        self.on_evict(job)
+            except Exception as e:
+                logger.warning("Job eviction failed: %s", e)
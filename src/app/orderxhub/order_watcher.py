@@ -0,0 +1,258 @@
+"""
+order_watcher.py
+==========================
+==Order Status Watcher==
+==========================
+Tracks submitted orders and polls Fusion for their status so clients do not have to
+ask the agent through /orders/query over and over:
+
+1. every watched order has its own poll interval: reset to min_interval when the
+   status changes, multiplied by backoff (up to max_interval) while it does not
+2. all orders due in a tick are looked up with one bulk call (see fusion_lookup.py)
+3. status changes are published to subscriber queues (SSE endpoint) and callbacks
+4. orders reaching a terminal status, or watched longer than max_age, are dropped
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TERMINAL_STATUSES = ("CLOSED", "CANCELED", "CANCELLED")
+
+Callback = Callable[[Dict[str, Any]], Any]
+
+
+@dataclass
+class WatchedOrder:
+    orderid: str
+    interval: float
+    next_poll: float
+    status: Optional[str] = None
+    order: Optional[Dict[str, Any]] = None
+    added_at: float = field(default_factory=time.time)
+    changed_at: Optional[float] = None
+    polls: int = 0
+    errors: int = 0
+    callbacks: List[Callback] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "orderid": self.orderid,
+            "status": self.status,
+            "order": self.order,
+            "poll_interval": self.interval,
+            "next_poll_in": max(0.0, round(self.next_poll - time.monotonic(), 1)),
+            "added_at": self.added_at,
+            "changed_at": self.changed_at,
+            "polls": self.polls,
+            "errors": self.errors,
+        }
+
+
+class OrderWatcher:
+
+    def __init__(
+        self,
+        lookup: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+        min_interval: float = 5.0,
+        max_interval: float = 300.0,
+        backoff: float = 2.0,
+        max_batch: int = 100,
+        max_age: float = 86400.0,
+        terminal_statuses: Iterable[str] = DEFAULT_TERMINAL_STATUSES,
+    ):
+        """
+        :param lookup: async callable(orderids) -> {orderid: order | None | {"error": ...}}
+        :param min_interval: seconds between polls right after a watch starts or the status changes
+        :param max_interval: upper bound for the backed-off interval
+        :param backoff: interval multiplier while the status stays the same
+        :param max_batch: order ids per bulk lookup
+        :param max_age: seconds after which an order is no longer watched
+        :param terminal_statuses: statuses that end the watch
+        """
+        self.lookup = lookup
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_batch = max_batch
+        self.max_age = max_age
+        self.terminal_statuses = {status.upper() for status in terminal_statuses}
+
+        self._orders: Dict[str, WatchedOrder] = {}
+        self._subscribers: Dict[asyncio.Queue, Optional[Set[str]]] = {}
+        self._callbacks: List[Callback] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.events = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def watch(self, orderid: str, callback: Optional[Callback] = None, poll_now: bool = False) -> WatchedOrder:
+        """
+        Start (or keep) watching an order.
+        :param callback: called with every status event of this order
+        :param poll_now: poll on the next tick instead of after min_interval
+        """
+        orderid = str(orderid)
+        watched = self._orders.get(orderid)
+        if watched is None:
+            delay = 0.0 if poll_now else self.min_interval
+            watched = self._orders[orderid] = WatchedOrder(
+                orderid=orderid, interval=self.min_interval, next_poll=time.monotonic() + delay
+            )
+        elif poll_now:
+            watched.next_poll = time.monotonic()
+        if callback is not None:
+            watched.callbacks.append(callback)
+        self._wake.set()
+        return watched
+
+    def unwatch(self, orderid: str) -> bool:
+        return self._orders.pop(str(orderid), None) is not None
+
+    def get(self, orderid: str) -> Optional[WatchedOrder]:
+        return self._orders.get(str(orderid))
+
+    def watched(self) -> List[WatchedOrder]:
+        return list(self._orders.values())
+
+    def add_callback(self, callback: Callback) -> None:
+        """Call callback with every status event of every watched order."""
+        self._callbacks.append(callback)
+
+    @asynccontextmanager
+    async def subscribe(self, orderids: Optional[Iterable[str]] = None, maxsize: int = 1000):
+        """
+        Receive status events on a queue:
+
+            async with watcher.subscribe(["404087"]) as queue:
+                event = await queue.get()
+
+        :param orderids: only events of these orders; None for all
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._subscribers[queue] = {str(orderid) for orderid in orderids} if orderids else None
+        try:
+            yield queue
+        finally:
+            self._subscribers.pop(queue, None)
+
+    async def wait_for_status(self, orderid: str, timeout: float) -> Optional[WatchedOrder]:
+        """
+        Watch orderid, poll it right away and wait up to timeout seconds until its
+        status is known.
+        """
+        watched = self.watch(orderid, poll_now=True)
+        if watched.status is not None:
+            return watched
+        async with self.subscribe([orderid]) as queue:
+            try:
+                await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(orderid) or watched
+
+    def stats(self) -> dict:
+        statuses: Dict[str, int] = {}
+        for watched in self._orders.values():
+            statuses[watched.status or "unknown"] = statuses.get(watched.status or "unknown", 0) + 1
+        return {
+            "watched": len(self._orders),
+            "by_status": statuses,
+            "subscribers": len(self._subscribers),
+            "polls": self.polls,
+            "events": self.events,
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self._poll_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Order watcher poll failed: %s", e)
+            now = time.monotonic()
+            next_poll = min((w.next_poll for w in self._orders.values()), default=now + self.max_interval)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.05, next_poll - now))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_due(self) -> None:
+        now = time.monotonic()
+        for watched in list(self._orders.values()):
+            if time.time() - watched.added_at > self.max_age:
+                self._orders.pop(watched.orderid, None)
+                self._emit(watched, "expired")
+        due = sorted((w for w in self._orders.values() if w.next_poll <= now), key=lambda w: w.next_poll)
+        for start in range(0, len(due), self.max_batch):
+            batch = due[start:start + self.max_batch]
+            self.polls += 1
+            results = await self.lookup([w.orderid for w in batch])
+            for watched in batch:
+                self._update(watched, results.get(watched.orderid))
+
+    def _update(self, watched: WatchedOrder, result: Any) -> None:
+        watched.polls += 1
+        status = None
+        if isinstance(result, dict) and "error" in result:
+            watched.errors += 1
+        elif isinstance(result, dict):
+            status = result.get("StatusCode")
+
+        if status is not None and status != watched.status:
+            previous, watched.status, watched.order = watched.status, status, result
+            watched.changed_at = time.time()
+            watched.interval = self.min_interval
+            self._emit(watched, "status", previous)
+            if status.upper() in self.terminal_statuses:
+                self._orders.pop(watched.orderid, None)
+                self._emit(watched, "done")
+                return
+        else:
+            if result is not None and "error" not in result:
+                watched.order = result
+            watched.interval = min(self.max_interval, watched.interval * self.backoff)
+        watched.next_poll = time.monotonic() + watched.interval
+
+    def _emit(self, watched: WatchedOrder, event_type: str, previous: Optional[str] = None) -> None:
+        event = {
+            "type": event_type,
+            "orderid": watched.orderid,
+            "status": watched.status,
+            "previous_status": previous,
+            "order": watched.order,
+            "at": time.time(),
+        }
+        self.events += 1
+        for queue, orderids in list(self._subscribers.items()):
+            if orderids is not None and watched.orderid not in orderids:
+                continue
+            if queue.full():  # slow subscriber: drop its oldest event
+                queue.get_nowait()
+            queue.put_nowait(event)
+        for callback in [*self._callbacks, *watched.callbacks]:
+            try:
+                result = callback(event)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                logger.warning("Order watcher callback failed: %s", e)
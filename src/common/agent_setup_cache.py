@@ -0,0 +1,140 @@
+"""
+agent_setup_cache.py
+==========================
+==Agent Setup Cache==
+==========================
+``Agent.setup()`` checks the remote endpoint and pushes instructions and tools to the
+remote agent resource every time it is called. This module fingerprints everything
+setup() synchronizes (endpoint id, instructions, name/description and tool schemas),
+remembers the fingerprint on disk after a successful sync, and skips the remote sync
+when the local definition has not changed since.
+
+Usage:
+    from src.common.agent_setup_cache import setup_agent
+    setup_agent(agent)            # instead of agent.setup()
+    setup_agent(agent, force=True)
+
+Multiple workers sharing AGENT_SETUP_CACHE_DIR serialize on a lock file, so only the
+first worker of a cold start performs the sync.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+THIS_DIR     = Path(__file__).resolve()
+PROJECT_ROOT = THIS_DIR.parent.parent.parent
+
+AGENT_SETUP_CACHE_DIR = Path(os.getenv("AGENT_SETUP_CACHE_DIR", PROJECT_ROOT / ".agent_setup_cache"))
+# Re-sync at least this often even if nothing changed locally, in case the remote agent was edited
+AGENT_SETUP_CACHE_TTL = float(os.getenv("AGENT_SETUP_CACHE_TTL", "86400"))
+
+
+def _tool_schema(tool) -> dict:
+    if hasattr(tool, "to_dict"):
+        return tool.to_dict()
+    return tool.model_dump(mode="json", exclude={"callable"})
+
+
+def agent_fingerprint(agent) -> str:
+    """
+    Hash of everything Agent.setup() pushes to the remote agent.
+    :param agent: an ADK Agent
+    :return: hex sha256 digest
+    """
+    tools = []
+    for kind, local_tools in (
+        ("function", agent._local_handler_functions),
+        ("rag", agent._local_rag_tools),
+        ("sql", agent._local_sql_tools),
+    ):
+        tools.extend({"kind": kind, "schema": _tool_schema(t)} for t in local_tools)
+    tools.sort(key=lambda t: (t["kind"], t["schema"].get("name", "")))
+
+    material = {
+        "agent_endpoint_id": agent.agent_endpoint_id,
+        "instructions": agent.instructions,
+        "name": agent.name,
+        "description": agent.description,
+        "tools": tools,
+    }
+    encoded = json.dumps(material, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _cache_file(agent_endpoint_id: str) -> Path:
+    key = hashlib.sha256(agent_endpoint_id.encode("utf-8")).hexdigest()[:16]
+    return AGENT_SETUP_CACHE_DIR / f"{key}.json"
+
+
+@contextmanager
+def _locked(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix(".lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path: Path, record: dict) -> None:
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(record, indent=2))
+    os.replace(tmp, path)
+
+
+def setup_agent(agent, force: bool = False) -> bool:
+    """
+    Drop-in replacement for agent.setup() that skips the remote sync when the
+    local instructions and tools match the last successful sync.
+    :param agent: an ADK Agent
+    :param force: always run agent.setup()
+    :return: True if the remote sync ran, False if it was skipped
+    """
+    fingerprint = agent_fingerprint(agent)
+    path = _cache_file(agent.agent_endpoint_id)
+
+    with _locked(path):
+        record = _read(path)
+        fresh = time.time() - record.get("synced_at", 0) < AGENT_SETUP_CACHE_TTL
+        if not force and fresh and record.get("fingerprint") == fingerprint:
+            logger.info("Agent settings unchanged since last sync, skipping setup()")
+            return False
+
+        agent.setup()
+        _write(path, {
+            "fingerprint": fingerprint,
+            "agent_endpoint_id": agent.agent_endpoint_id,
+            "synced_at": time.time(),
+        })
+        return True
+
+
+def clear_setup_cache(agent_endpoint_id: str = None) -> None:
+    """Forget recorded syncs for one endpoint, or for all endpoints."""
+    if agent_endpoint_id is not None:
+        _cache_file(agent_endpoint_id).unlink(missing_ok=True)
+        return
+    for path in AGENT_SETUP_CACHE_DIR.glob("*.json"):
+        path.unlink(missing_ok=True)
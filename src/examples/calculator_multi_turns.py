@@ -3,6 +3,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 from oci.addons.adk import Agent, AgentClient
 from oci.addons.adk.tool.prebuilt import CalculatorToolkit
+from src.common.agent_setup_cache import setup_agent
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -40,7 +41,7 @@ def agent_flow():
         tools=[CalculatorToolkit()]
     )
 
-    agent.setup()
+    setup_agent(agent)
     return agent
 
 def test_cases():
@@ -4,6 +4,7 @@ from oci.addons.adk import Agent, AgentClient, tool
 
 from pathlib import Path
 from dotenv import load_dotenv
+from src.common.agent_setup_cache import setup_agent
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -91,9 +92,9 @@ def main():
     )
 
     # Set up the agents once
-    trend_analyzer.setup()
-    content_writer.setup()
-    marketing_director.setup()
+    setup_agent(trend_analyzer)
+    setup_agent(content_writer)
+    setup_agent(marketing_director)
 
     # Use the supervisor agent to process the end user request
     input = "Produce a blog post about current trends in the AI industry."
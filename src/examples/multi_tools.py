@@ -5,6 +5,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 from src.tools.custom_function_tools import AccountToolkit
 from oci.addons.adk.tool.prebuilt import AgenticRagTool
+from src.common.agent_setup_cache import setup_agent
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -55,7 +56,7 @@ def main():
         ]
     )
 
-    agent.setup()
+    setup_agent(agent)
 
     # This is a context your existing code is best at producing (e.g., fetching the authenticated user id)
     client_provided_context = "[Context: The logged in user ID is: user_123] "
@@ -3,6 +3,7 @@ from typing import Dict
 from oci.addons.adk import Agent, AgentClient, tool
 from pathlib import Path
 from dotenv import load_dotenv
+from src.common.agent_setup_cache import setup_agent
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -74,8 +75,9 @@ def main():
     )
 
     # Sync local instructions and tools to the remote agent resource
-    # You only need to invoke setup() when you change instructions and tools
-    agent.setup()
+    # You only need to invoke setup() when you change instructions and tools;
+    # setup_agent() skips the remote sync when neither has changed since the last run
+    setup_agent(agent)
 
     # Run the agent. You can embed this method in your webapp, slack bot, etc.
     # You invoke the run() when you need to handle your user's request.
@@ -3,8 +3,8 @@ from pathlib import Path
 # ─── OCI LLM ──────────────────────────────────────────
 from langchain_community.chat_models import ChatOCIGenAI
 from dotenv import load_dotenv
-import base64
 from langchain_core.messages import HumanMessage
+from src.utils.image_preprocess import encode_image, image_data_url
 
 
 # ────────────────────────────────────────────────────────
@@ -42,10 +42,9 @@ def initialize_vision_llm():
         auth_profile=OCI_PROFILE,
     )
 
-# Load and encode your image (local file)
+# Load, preprocess (orient, downscale, re-encode; see src/utils/image_preprocess.py) and encode your image (local file)
 def encode_image_as_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded = base64.b64encode(image_file.read()).decode("utf-8")
+    encoded, _ = encode_image(image_path)
     return encoded
 
 def test():
@@ -53,15 +52,15 @@ def test():
     image_path = f"{PROJECT_ROOT}/config/img.png"
     question = "What is happening in this image?"
 
-    # Encode image
-    image_base64 = encode_image_as_base64(image_path)
+    # Preprocess and encode image
+    image_url = image_data_url(image_path)
 
     # Construct message with image and text
     messages = [
         HumanMessage(
             content=[
                 {"type": "text", "text": "What is happening in this image?"},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
+                {"type": "image_url", "image_url": {"url": image_url}}
             ]
         )
     ]
@@ -3,14 +3,10 @@ import oracledb
 import time
 from langchain_community.vectorstores.oraclevs import OracleVS
 from langchain_community.vectorstores.utils import DistanceStrategy
-from langchain_core.documents import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-from io import BytesIO
-import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 from src.llm.oci_embedding_model import initialize_embedding_model
+from src.utils.ingest_pipeline import PrecomputedEmbeddings, ingest_pdf, local_pdf
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -100,67 +96,8 @@ def main():
     Tool to store docs as vectors in Oracle 23ai, with explicit vector index creation and demonstration.
     """
 
-    # RAG Step1 : Load the PDF document and create pdf reader object
-
-    if USE_LOCAL_PDF=="true":
-        loader = PyPDFLoader(LOCAL_PDF_PATH)
-        pages = loader.load()
-    else:
-        # OCI Object Storage configuration
-        config = oci.config.from_file()
-        object_storage = oci.object_storage.ObjectStorageClient(config)
-
-        # Bucket and object details
-        # Download the PDF from OCI Object Storage
-        response = object_storage.get_object(OBJECT_STORAGE_NAMESPACE_NAME, BUCKET_NAME, BUCKET_PDF_NAME)
-        pdf_content = response.data.content
-
-        # Load the PDF into PyPDFLoader
-        pdf_bytes = BytesIO(pdf_content)
-
-        ## Save pdf_bytes to a temporary file
-        # pdf_bytes is a BytesIO object
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
-            tmp_file.write(pdf_bytes.getvalue())  # Extract raw bytes
-            tmp_file_path = tmp_file.name
-
-        loader = PyPDFLoader(tmp_file_path)
-        pages = loader.load()
-        
-        ## clean up temporary file
-        os.remove(tmp_file_path)
-
-
-    ## RAG step2 : Combined raw text from all pages
-    raw_text = ''
-
-    for i, doc in enumerate(pages):
-        text = doc.page_content
-        if text:
-            raw_text += text
-
-    print("You have transformed the PDF document to text format")
-
-    ## RAG step3 : Chunk the text into smaller chunks
-    ### Text splitter
-
-    text_splitter = RecursiveCharacterTextSplitter(
-        # chunk_size should enable as many characters as can fit in max number of tokens allowed for embedding model\
-        #  i.e. 512 characters. Source: https://docs.oracle.com/en-us/iaas/Content/generative-ai/use-playground-embed.htm
-        chunk_size=2000,
-        chunk_overlap=100
-    )
-
-    chunks = text_splitter.split_text(raw_text)
-    print(len(chunks))
-
-    ## RAG step4 : Text chunk into a document structure
-
-    documents = []
-    for i in range(len(chunks)):
-        doc = Document(page_content=chunks[i])
-        # doc = texts[i]
-        documents.append(doc)
+    # RAG Step1-4 : Load the PDF page by page and chunk each page (chunks keep their page number);
+    # the chunks are embedded and inserted in batches below (see src/utils/ingest_pipeline.py)
 
     # RAG step5: Embed and store chunks as vectors in Oracle 23ai
     embed_model = initialize_embedding_model()
@@ -180,16 +117,20 @@ def main():
     # Create IVF index
     create_ivf_index(connection)
 
-    # Initialize OracleVS (this will use the table)
+    # Initialize OracleVS (this will use the table); it inserts the vectors computed by the
+    # pipeline's embed stage instead of embedding again
+    embeddings = PrecomputedEmbeddings(embed_model)
     vectordb = OracleVS(
         client=connection,
-        embedding_function=embed_model,
+        embedding_function=embeddings,
         table_name="vector_table",
         distance_strategy=DistanceStrategy.COSINE
     )
 
-    MAX_NUMBER_DOCUMENTS_IN_VECTOR_DB = 5461
-    vectordb.add_documents(documents[:MAX_NUMBER_DOCUMENTS_IN_VECTOR_DB])
+    # the table was just recreated: ingest from the start instead of resuming a checkpoint
+    with local_pdf(USE_LOCAL_PDF == "true", LOCAL_PDF_PATH, OBJECT_STORAGE_NAMESPACE_NAME,
+                   BUCKET_NAME, BUCKET_PDF_NAME) as pdf_path:
+        ingest_pdf(pdf_path, vectordb, embeddings, target=f"oracle:{DB_DSN}:{DB_USER}:vector_table", resume=False)
     connection.commit()
     print("Chunks are stored in vector_table.")
 
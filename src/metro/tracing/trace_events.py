@@ -0,0 +1,66 @@
+"""
+trace_events.py
+Turns ADK run callbacks into small JSON-serializable progress events, and formats
+them as server-sent events (SSE).
+
+Agent.run() accepts two hooks that fire while the react loop is still running:
+- on_invoked_remote_service(request, response): one call per chat round trip; the
+  response carries planning / tool invocation / generation traces
+- on_fulfilled_required_action(required_action, performed_action): one call per
+  local function tool the agent executed
+"""
+
+import json
+from typing import Any, Dict, List
+
+from oci.addons.adk.run.traces import Trace
+from oci.addons.adk.run.types import RawResponse
+
+# Keep tool outputs in progress events short; the final answer carries the full result
+MAX_EVENT_TEXT = 2000
+
+
+def _truncate(value: Any, limit: int = MAX_EVENT_TEXT) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + "…"
+    return value
+
+
+def trace_event(trace: Trace) -> Dict[str, Any]:
+    """
+    Convert an ADK trace to a progress event.
+    :param trace: PlanningTrace, ToolInvocationTrace, GenerationTrace, ...
+    :return: {"type": "planning", "trace": {...}}
+    """
+    return {
+        "type": trace.trace_type.title().lower().replace(" ", "_"),
+        "trace": {k: _truncate(v) for k, v in trace.to_dict.items()},
+    }
+
+
+def response_trace_events(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Extract progress events for every trace in one raw chat response."""
+    return [trace_event(trace) for trace in RawResponse(raw_data=response).get_traces()]
+
+
+def tool_event(required_action, performed_action) -> Dict[str, Any]:
+    """
+    Convert a fulfilled function-calling action to a progress event.
+    """
+    function_call = required_action.function_call
+    return {
+        "type": "tool_result",
+        "tool_name": function_call.name,
+        "arguments": function_call.arguments,
+        "output": _truncate(performed_action.function_call_output) if performed_action else None,
+    }
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Encode one server-sent event.
+    :param event: SSE event name, e.g. "trace" or "final"
+    :param data: JSON-serializable payload
+    """
+    payload = json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,253 @@
+"""
+fusion_http.py
+==========================
+==Shared HTTP Client for Fusion SCM==
+==========================
+One keep-alive ``requests.Session`` shared by every Fusion toolkit call instead of a
+new connection (and TLS handshake) per ``requests.get`` / ``requests.post``:
+
+1. connection pool sized by FUSION_SCM_POOL_SIZE
+2. connect / read timeouts so a hung Fusion call cannot block a worker forever
+3. retries with jittered exponential backoff, only for idempotent requests
+   (GETs, and creates Fusion deduplicates by source transaction key)
+4. rate limiting and circuit breaking per fusion_resilience.py
+5. pool_stats() for the /health endpoints
+
+fusion_request_async() applies the same timeouts and retry policy with an
+``httpx.AsyncClient`` (one per event loop), so async callers can await Fusion
+without holding a thread per call.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from src.toolkit.fusion_resilience import breaker, is_failure, limiter, resilience_stats
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+load_dotenv(PROJECT_ROOT / "config/.env")  # settings are read below, at import
+
+CONNECT_TIMEOUT = float(os.getenv("FUSION_SCM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("FUSION_SCM_READ_TIMEOUT", "60"))
+POOL_SIZE = int(os.getenv("FUSION_SCM_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.getenv("FUSION_SCM_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("FUSION_SCM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("FUSION_SCM_BACKOFF_MAX", "8"))
+ASYNC_POOL_SIZE = int(os.getenv("FUSION_SCM_ASYNC_POOL_SIZE", "100"))
+
+# Responses that mean "try again later" rather than "this request is wrong"
+RETRY_STATUS = {429, 502, 503, 504}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "retries": 0, "failures": 0}
+# httpx clients are bound to the loop that created them; admission workers run their own loops
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Seconds to wait before retry number attempt (0-based): full jitter over an
+    exponentially growing window, or the server's Retry-After when it sends one.
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def is_create_idempotent(payload: dict) -> bool:
+    # Fusion rejects a second order with the same source transaction key, so a
+    # replayed create cannot book the order twice.
+    return bool(payload.get("SourceTransactionNumber") and payload.get("SourceTransactionSystem"))
+
+
+def create_may_have_committed(response=None, error: Optional[Exception] = None) -> bool:
+    """
+    True when a create's outcome is unknown rather than failed: the retry of an attempt that
+    timed out (or got a 5xx) was rejected with a 4xx, e.g. as a duplicate of the order the
+    first attempt created, or the last attempt timed out after sending the request.
+    """
+    if error is not None:
+        return isinstance(error, (requests.exceptions.ReadTimeout, httpx.ReadTimeout, httpx.WriteTimeout))
+    return 400 <= response.status_code < 500 and getattr(response, "fusion_attempts", 1) > 1
+
+
+def get_session() -> requests.Session:
+    """The process-wide Fusion session, created on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=True)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def fusion_request(
+    method: str, url: str, idempotent: bool = False, endpoint: str = "default", **kwargs
+) -> requests.Response:
+    """
+    Send a request through the shared session.
+    :param method: "GET", "POST", ...
+    :param url: full Fusion resource URL
+    :param idempotent: retry timeouts, connection errors and RETRY_STATUS responses
+    :param endpoint: rate limit bucket, e.g. "get" or "create"
+    :param kwargs: passed to requests (auth, headers, data, ...)
+    :return: the last response, with fusion_attempts = requests sent; raise_for_status() is left
+             to the caller. After a retried create, a 4xx may mean an earlier attempt committed
+             the order (see find_created_order())
+    :raises CircuitOpen: Fusion is failing and calls are short-circuited
+    """
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    session = get_session()
+    bucket = limiter(endpoint)
+    attempts = MAX_RETRIES + 1 if idempotent else 1
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            # inside the try: a cancelled wait must still free a half-open probe slot
+            wait = bucket.reserve()
+            if wait:
+                time.sleep(wait)
+            _count("requests")
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            breaker.record(False)
+            if attempt + 1 >= attempts:
+                _count("failures")
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning("%s %s failed (%s), retrying in %.2fs", method, url, e, delay)
+        except BaseException:
+            breaker.record(None)
+            raise
+        else:
+            breaker.record(not is_failure(response.status_code))
+            if response.status_code not in RETRY_STATUS or attempt + 1 >= attempts:
+                if response.status_code >= 400:
+                    _count("failures")
+                response.fusion_attempts = attempt + 1
+                return response
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning("%s %s returned %s, retrying in %.2fs", method, url, response.status_code, delay)
+            response.close()
+        _count("retries")
+        time.sleep(delay)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """The Fusion AsyncClient for the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=ASYNC_POOL_SIZE, max_keepalive_connections=ASYNC_POOL_SIZE),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client() -> None:
+    """Close the running loop's client, e.g. from a FastAPI lifespan hook."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def fusion_request_async(
+    method: str, url: str, idempotent: bool = False, endpoint: str = "default", **kwargs
+) -> httpx.Response:
+    """
+    Async counterpart of fusion_request().
+    :param kwargs: passed to httpx (auth, headers, content, ...)
+    :raises CircuitOpen: Fusion is failing and calls are short-circuited
+    """
+    client = get_async_client()
+    bucket = limiter(endpoint)
+    attempts = MAX_RETRIES + 1 if idempotent else 1
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            # inside the try: a cancelled wait must still free a half-open probe slot
+            wait = bucket.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            _count("requests")
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            breaker.record(False)
+            if attempt + 1 >= attempts:
+                _count("failures")
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning("%s %s failed (%s), retrying in %.2fs", method, url, e, delay)
+        except BaseException:
+            breaker.record(None)
+            raise
+        else:
+            breaker.record(not is_failure(response.status_code))
+            if response.status_code not in RETRY_STATUS or attempt + 1 >= attempts:
+                if response.status_code >= 400:
+                    _count("failures")
+                response.fusion_attempts = attempt + 1
+                return response
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            logger.warning("%s %s returned %s, retrying in %.2fs", method, url, response.status_code, delay)
+        _count("retries")
+        await asyncio.sleep(delay)
+
+
+def pool_stats() -> dict:
+    """Request counters plus per-host connection pool usage."""
+    pools = {}
+    if _session is not None:
+        adapter = _session.get_adapter("https://")
+        container = adapter.poolmanager.pools
+        for key in list(container.keys()):
+            pool = container.get(key)
+            if pool is None:
+                continue
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                # the pool queue is pre-filled with None placeholders; count real connections
+                "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+            }
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        **stats,
+        "pool_size": POOL_SIZE,
+        "connect_timeout": CONNECT_TIMEOUT,
+        "read_timeout": READ_TIMEOUT,
+        "max_retries": MAX_RETRIES,
+        "pools": pools,
+        "async_pool_size": ASYNC_POOL_SIZE,
+        "async_clients": len(_async_clients),
+        **resilience_stats(),
+    }
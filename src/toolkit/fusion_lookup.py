@@ -0,0 +1,93 @@
+"""
+fusion_lookup.py
+==========================
+==Bulk Sales Order Lookup Helpers==
+==========================
+Shared by the sync and async Fusion toolkits' bulk lookups:
+
+1. order ids are split into chunks of FUSION_SCM_LOOKUP_CHUNK_SIZE
+2. each chunk is one ``q=SourceTransactionNumber IN (...)`` request (REST framework 2+),
+   falling back to one ``findBySourceOrderNumberAndSystem`` request per id when Fusion
+   rejects the filter (a 4xx other than auth / throttling) or FUSION_SCM_LOOKUP_USE_Q=false;
+   throttling, 5xx and network errors are reported for the chunk instead of multiplying
+   the load by the chunk size
+3. chunks / single lookups run concurrently over the pooled client
+4. results are keyed by order id: projected order, None when not found, or {"error": ...}
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional
+from pathlib import Path
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+from src.toolkit.fusion_projection import GET_FIELDS, parse_fields, project, query_params
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+load_dotenv(PROJECT_ROOT / "config/.env")  # settings are read below, at import
+
+LOOKUP_CHUNK_SIZE = int(os.getenv("FUSION_SCM_LOOKUP_CHUNK_SIZE", "25"))
+LOOKUP_CONCURRENCY = int(os.getenv("FUSION_SCM_LOOKUP_CONCURRENCY", "8"))
+LOOKUP_USE_Q = os.getenv("FUSION_SCM_LOOKUP_USE_Q", "true").lower() == "true"
+REST_FRAMEWORK_VERSION = os.getenv("FUSION_SCM_REST_FRAMEWORK_VERSION", "4")
+SOURCE_SYSTEM = "OPS"
+
+KEY_FIELD = "SourceTransactionNumber"
+
+
+def unique_ids(orderids: Iterable) -> List[str]:
+    """Order ids as strings, duplicates and blanks removed, order kept."""
+    return list(dict.fromkeys(str(orderid).strip() for orderid in orderids if str(orderid).strip()))
+
+
+def chunks(orderids: List[str], size: int = LOOKUP_CHUNK_SIZE) -> List[List[str]]:
+    size = max(1, size)
+    return [orderids[i:i + size] for i in range(0, len(orderids), size)]
+
+
+def lookup_fields(spec: Optional[str] = GET_FIELDS) -> Optional[str]:
+    # results are matched back to ids by SourceTransactionNumber, so it must be projected
+    fields = parse_fields(spec)
+    if not fields or KEY_FIELD in fields.get(None, [KEY_FIELD]):
+        return spec
+    return f"{KEY_FIELD},{spec}"
+
+
+def finder_query(orderid: str, system: str = SOURCE_SYSTEM) -> str:
+    query = (
+        f"finder=findBySourceOrderNumberAndSystem;SourceTransactionNumber={orderid},"
+        f"SourceTransactionSystem={system}"
+    )
+    return query + query_params(lookup_fields())
+
+
+def q_query(orderids: List[str]) -> str:
+    """One combined filter for a chunk of ids."""
+    quoted = ",".join("'" + orderid.replace("'", "''") + "'" for orderid in orderids)
+    q = f"{KEY_FIELD} IN ({quoted}) and SourceTransactionSystem='{SOURCE_SYSTEM}'"
+    return f"q={quote(q, safe=',=()')}&limit={len(orderids)}" + query_params(lookup_fields())
+
+
+def q_rejected(error: Exception) -> bool:
+    """True when Fusion refused the q= filter itself, so per-id finder requests can still work."""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (401, 403, 408, 429)
+
+
+def q_headers() -> Dict[str, str]:
+    return {"REST-Framework-Version": REST_FRAMEWORK_VERSION}
+
+
+def index_items(data: Any, orderids: List[str]) -> Dict[str, Any]:
+    """
+    Match a collection response back to the requested ids.
+    :return: {orderid: projected order or None}
+    """
+    results: Dict[str, Any] = {orderid: None for orderid in orderids}
+    collection = project(data, lookup_fields())
+    for item in collection.get("items", []) if isinstance(collection, dict) else []:
+        key = str(item.get(KEY_FIELD))
+        if key in results and results[key] is None:
+            results[key] = item
+    return results
@@ -0,0 +1,441 @@
+"""
+fusion_master_data.py
+==========================
+==Product / Customer / UOM Master Data Cache==
+==========================
+Orders extracted from images often carry a ProductNumber, BuyingPartyNumber or
+OrderedUOMCode that Fusion rejects, and each rejection costs an agent run plus a failed
+POST. This cache keeps the master data locally so orders are checked (and obvious
+mistakes corrected) before anything is sent:
+
+1. products (itemsV2), customers (accounts) and units of measure are stored in SQLite
+   and synced from Fusion in deltas: ``q=LastUpdateDate >= <last seen>``, paged with
+   fusion_listing.py; CSV exports can be imported instead (see __main__). Records with an
+   inactive status are removed, and every FUSION_SCM_MASTER_FULL_SYNC_INTERVAL a full sync
+   drops the rows Fusion no longer returns (deleted items)
+2. lookups use in-memory indexes rebuilt after every sync/import:
+   exact key, normalized key / name (case, spaces, dashes), an OCR-folded key
+   (O->0, I/L->1, S->5, B->8, Z->2) and a trigram index for fuzzy matches
+3. check_order() only corrects what cannot change the goods or the customer: case,
+   spacing and separators, or the exact name of a single record. OCR look-alikes and
+   fuzzy matches are returned as suggestions; near-identical codes (10M-BLU / 10M-BLK)
+   are different products
+4. a value the cache does not know is a warning, not an error: it may have been created
+   in Fusion after the last sync (FUSION_SCM_MASTER_REJECT_UNKNOWN=true rejects it).
+   Kinds without any cached rows are not checked, so an empty cache never blocks orders
+"""
+
+import csv
+import difflib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from copy import deepcopy
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from src.toolkit.fusion_http import fusion_request
+from src.toolkit.fusion_listing import list_headers, list_query, next_offset
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+load_dotenv(PROJECT_ROOT / "config/.env")  # API_URL and the resource URLs below are resolved at import
+
+API_USER = os.getenv("FUSION_SCM_API_USER")
+API_PASS = os.getenv("FUSION_SCM_API_PASS")
+API_URL = os.getenv("FUSION_SCM_API_URL") or ""
+
+MASTER_DB = Path(os.getenv("FUSION_SCM_MASTER_DB", PROJECT_ROOT / ".fusion_master" / "master_data.db"))
+MASTER_VALIDATE = os.getenv("FUSION_SCM_MASTER_VALIDATE", "true").lower() == "true"
+MASTER_AUTOCORRECT = os.getenv("FUSION_SCM_MASTER_AUTOCORRECT", "true").lower() == "true"
+MASTER_REJECT_UNKNOWN = os.getenv("FUSION_SCM_MASTER_REJECT_UNKNOWN", "false").lower() == "true"
+MASTER_PAGE_SIZE = int(os.getenv("FUSION_SCM_MASTER_PAGE_SIZE", "500"))
+MASTER_FULL_SYNC_INTERVAL = float(os.getenv("FUSION_SCM_MASTER_FULL_SYNC_INTERVAL", "86400"))
+
+PRODUCTS = "products"
+CUSTOMERS = "customers"
+UOMS = "uoms"
+
+
+def _resource_url(env: str, resource: str) -> Optional[str]:
+    # default: sibling of the sales order resource on the same pod
+    if os.getenv(env):
+        return os.getenv(env)
+    if "/salesOrdersForOrderHub" not in API_URL:
+        return None
+    url = API_URL.replace("salesOrdersForOrderHub", resource)
+    return url.replace("/fscmRestApi/", "/crmRestApi/") if resource == "accounts" else url
+
+
+@dataclass
+class Source:
+    url: Optional[str]
+    key: str    # Fusion attribute holding the value used on orders
+    name: str   # descriptive attribute, also matched exactly
+    fields: str
+    status: Optional[str] = None        # attribute whose inactive values remove the record
+    inactive: Tuple[str, ...] = ()
+
+
+SOURCES: Dict[str, Source] = {
+    PRODUCTS: Source(
+        _resource_url("FUSION_SCM_ITEMS_URL", "itemsV2"),
+        "ItemNumber", "ItemDescription", "ItemNumber,ItemDescription,PrimaryUOMCode,ItemStatusValue,LastUpdateDate",
+        "ItemStatusValue", ("Inactive", "Obsolete"),
+    ),
+    CUSTOMERS: Source(
+        _resource_url("FUSION_SCM_CUSTOMERS_URL", "accounts"),
+        "PartyNumber", "OrganizationName", "PartyNumber,OrganizationName,Status,LastUpdateDate",
+        "Status", ("I",),
+    ),
+    UOMS: Source(
+        _resource_url("FUSION_SCM_UOM_URL", "unitsOfMeasure"),
+        "UOMCode", "UOM", "UOMCode,UOM,LastUpdateDate",
+    ),
+}
+
+# order attribute -> master data kind
+ORDER_FIELDS = {"BuyingPartyNumber": CUSTOMERS}
+LINE_FIELDS = {"ProductNumber": PRODUCTS, "OrderedUOMCode": UOMS}
+
+_OCR_FOLD = str.maketrans("OILSBZ", "011582")
+
+
+def normalize(value: Any) -> str:
+    return re.sub(r"[\s\-_./]", "", str(value or "")).upper()
+
+
+def ocr_fold(value: Any) -> str:
+    return normalize(value).translate(_OCR_FOLD)
+
+
+def trigrams(value: str) -> Set[str]:
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class Index:
+    """In-memory lookup structures for one kind; replaced as a whole after a sync."""
+    keys: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    normalized: Dict[str, Set[str]] = field(default_factory=dict)
+    folded: Dict[str, Set[str]] = field(default_factory=dict)
+    grams: Dict[str, Set[str]] = field(default_factory=dict)
+    normalized_keys: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, Optional[str], str]]) -> "Index":
+        index = cls()
+        for key, name, attrs in rows:
+            index.keys[key] = {"key": key, "name": name, **json.loads(attrs or "{}")}
+            for value in (key, name):
+                if value:
+                    index.normalized.setdefault(normalize(value), set()).add(key)
+            index.folded.setdefault(ocr_fold(key), set()).add(key)
+            index.normalized_keys[key] = normalize(key)
+            for gram in trigrams(index.normalized_keys[key]):
+                index.grams.setdefault(gram, set()).add(key)
+        return index
+
+    def match(self, value: Any, limit: int = 3) -> Tuple[Optional[str], List[str]]:
+        """
+        :return: (key to use or None, suggestions); key is only set when the value is the key,
+                 or a single record's key or name up to case, spacing and separators
+        """
+        value = str(value)
+        if value in self.keys:
+            return value, []
+        found = self.normalized.get(normalize(value), set())
+        if len(found) == 1:
+            return next(iter(found)), []
+        if found:
+            return None, sorted(found)[:limit]
+        # OCR look-alikes and fuzzy matches may be other goods: suggestions only
+        found = self.folded.get(ocr_fold(value), set())
+        if found:
+            return None, sorted(found)[:limit]
+
+        probe = normalize(value)
+        shared = Counter(key for gram in trigrams(probe) for key in self.grams.get(gram, ()))
+        # score every key close to the best trigram overlap; near-identical codes tie there
+        ranked = shared.most_common(200)
+        best = ranked[0][1] if ranked else 0
+        matcher = difflib.SequenceMatcher(None, b=probe)  # probe analysed once, keys swapped in
+        scored = []
+        for key, count in ranked:
+            if count < best - 1:
+                break
+            matcher.set_seq1(self.normalized_keys[key])
+            scored.append((matcher.ratio(), key))
+        scored.sort(reverse=True)
+        return None, [key for _, key in scored[:limit]]
+
+
+class OrderCheck(NamedTuple):
+    order: Dict                # payload with corrections applied
+    corrections: List[Dict]
+    errors: List[Dict]         # the order must not be sent
+    warnings: List[Dict]       # values unknown to the cache, possibly newer than the last sync
+
+
+class MasterDataCache:
+
+    def __init__(self, path: Optional[Path] = MASTER_DB, sources: Dict[str, Source] = SOURCES):
+        """
+        :param path: SQLite file; None keeps the data in memory
+        :param sources: Fusion resources to sync per kind
+        """
+        self.sources = sources
+        if path is None:
+            database = ":memory:"
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            database = str(path)
+        self._conn = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        if path is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS master_data (
+                kind    TEXT NOT NULL,
+                key     TEXT NOT NULL,
+                name    TEXT,
+                attrs   TEXT,
+                updated TEXT,
+                synced  REAL,
+                PRIMARY KEY (kind, key)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS master_sync (
+                kind           TEXT PRIMARY KEY,
+                watermark      TEXT,
+                synced_at      REAL,
+                rows           INTEGER,
+                full_synced_at REAL
+            )
+        """)
+        for table, column in (("master_data", "synced"), ("master_sync", "full_synced_at")):
+            try:  # caches created before deletions were tracked
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} REAL")
+            except sqlite3.OperationalError:
+                pass
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, Index] = {kind: self._load(kind) for kind in sources}
+        self.checks = 0
+        self.corrections = 0
+        self.rejections = 0
+        self.warnings = 0
+
+    def _load(self, kind: str) -> Index:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, name, attrs FROM master_data WHERE kind = ?", (kind,)).fetchall()
+        return Index.build(rows)
+
+    def upsert(self, kind: str, records: Iterable[Dict[str, Any]], refresh: bool = True) -> Tuple[int, Optional[str]]:
+        """
+        Store Fusion records (attribute names as in the source's fields).
+        :param refresh: rebuild the in-memory index afterwards
+        :return: (rows written, highest LastUpdateDate seen); inactive records are deleted, not counted
+        """
+        source = self.sources[kind]
+        rows, removed, watermark, now = [], [], None, time.time()
+        for record in records:
+            key = record.get(source.key)
+            if key in (None, ""):
+                continue
+            updated = record.get("LastUpdateDate")
+            if updated and (watermark is None or updated > watermark):
+                watermark = updated
+            if source.status and record.get(source.status) in source.inactive:
+                removed.append((kind, str(key)))
+                continue
+            attrs = {k: v for k, v in record.items() if k not in (source.key, source.name, "LastUpdateDate", "links")}
+            rows.append((kind, str(key), record.get(source.name), json.dumps(attrs), updated, now))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO master_data (kind, key, name, attrs, updated, synced) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.executemany("DELETE FROM master_data WHERE kind = ? AND key = ?", removed)
+            self._conn.execute("COMMIT")
+        if refresh:
+            self._indexes[kind] = self._load(kind)
+        return len(rows), watermark
+
+    def sync(self, kind: str, full: bool = False) -> Dict[str, Any]:
+        """
+        Pull records changed since the last sync (everything when full) from Fusion. A full
+        sync, also run every MASTER_FULL_SYNC_INTERVAL, deletes the rows Fusion did not return:
+        deletions never show up in a LastUpdateDate delta.
+        :raises requests.exceptions.RequestException, CircuitOpen: when a page cannot be fetched
+        """
+        source = self.sources[kind]
+        if not source.url:
+            return {"kind": kind, "skipped": "no Fusion resource configured"}
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark, full_synced_at FROM master_sync WHERE kind = ?", (kind,)
+            ).fetchone()
+        full_synced_at = row[1] if row else None
+        if MASTER_FULL_SYNC_INTERVAL > 0 and (full_synced_at or 0) < time.time() - MASTER_FULL_SYNC_INTERVAL:
+            full = True
+        since = None if full or row is None else row[0]
+        q = f"LastUpdateDate >= '{since}'" if since else None
+
+        sync_started = time.time()
+        started, written, offset, watermark = time.monotonic(), 0, 0, since
+        while offset is not None:
+            response = fusion_request(
+                "GET",
+                f"{source.url}?{list_query(offset, MASTER_PAGE_SIZE, q=q, fields=source.fields, order_by='LastUpdateDate:asc')}",
+                idempotent=True,
+                endpoint="master",
+                auth=(API_USER, API_PASS),
+                headers=list_headers(),
+            )
+            response.raise_for_status()
+            data = response.json()
+            count, seen = self.upsert(kind, data.get("items", []), refresh=False)
+            written += count
+            if seen and (watermark is None or seen > watermark):
+                watermark = seen
+            offset = next_offset(data, offset)
+
+        deleted = 0
+        with self._lock:
+            if not since:  # every current record was just written: the others are gone from Fusion
+                deleted = self._conn.execute(
+                    "DELETE FROM master_data WHERE kind = ? AND (synced IS NULL OR synced < ?)", (kind, sync_started)
+                ).rowcount
+                full_synced_at = sync_started
+            self._conn.execute(
+                "INSERT OR REPLACE INTO master_sync (kind, watermark, synced_at, rows, full_synced_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, watermark, time.time(), written, full_synced_at),
+            )
+        self._indexes[kind] = self._load(kind)
+        return {
+            "kind": kind, "rows": written, "deleted": deleted, "since": since,
+            "elapsed_s": round(time.monotonic() - started, 2),
+        }
+
+    def sync_all(self, full: bool = False) -> List[Dict[str, Any]]:
+        results = []
+        for kind in self.sources:
+            try:
+                results.append(self.sync(kind, full))
+            except Exception as e:
+                print(f"Master data sync of {kind} failed: {e}")
+                results.append({"kind": kind, "error": str(e)})
+        return results
+
+    def lookup(self, kind: str, value: Any) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        :return: (matched record or None, suggestions)
+        """
+        index = self._indexes[kind]
+        key, suggestions = index.match(value)
+        return (index.keys[key] if key else None), suggestions
+
+    def search(self, kind: str, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        index = self._indexes[kind]
+        key, suggestions = index.match(text, limit=limit)
+        keys = list(dict.fromkeys(([key] if key else []) + suggestions))
+        return [index.keys[k] for k in keys[:limit]]
+
+    def check_order(
+        self, payload: Dict, autocorrect: bool = MASTER_AUTOCORRECT, reject_unknown: bool = MASTER_REJECT_UNKNOWN
+    ) -> OrderCheck:
+        """
+        Check the master data references of a sales order payload.
+        :param reject_unknown: report values missing from the cache as errors instead of warnings
+        :return: OrderCheck; corrections / errors / warnings are {"loc", "value", ...} like pydantic errors
+        """
+        self.checks += 1
+        order = deepcopy(payload)
+        corrections, errors, warnings = [], [], []
+
+        def check(target: Dict, name: str, kind: str, loc: List) -> None:
+            value = target.get(name)
+            if value in (None, "") or not self._indexes[kind].keys:
+                return
+            key, suggestions = self._indexes[kind].match(value)
+            if key == str(value):
+                return
+            if key and autocorrect:
+                target[name] = key
+                corrections.append({"loc": loc, "value": value, "corrected": key})
+                return
+            problem = {
+                "loc": loc, "value": value, "msg": f"Unknown {kind[:-1]} {value}",
+                "suggestions": [key] if key else suggestions,
+            }
+            (errors if reject_unknown else warnings).append(problem)
+
+        for name, kind in ORDER_FIELDS.items():
+            check(order, name, kind, [name])
+        for i, line in enumerate(order.get("lines") or []):
+            if isinstance(line, dict):
+                for name, kind in LINE_FIELDS.items():
+                    check(line, name, kind, ["lines", i, name])
+
+        self.corrections += len(corrections)
+        self.rejections += bool(errors)
+        self.warnings += len(warnings)
+        return OrderCheck(order, corrections, errors, warnings)
+
+    def stats(self) -> dict:
+        with self._lock:
+            synced = {
+                kind: {"watermark": watermark, "synced_at": synced_at, "rows": rows, "full_synced_at": full_synced_at}
+                for kind, watermark, synced_at, rows, full_synced_at in self._conn.execute(
+                    "SELECT kind, watermark, synced_at, rows, full_synced_at FROM master_sync"
+                )
+            }
+        return {
+            "counts": {kind: len(index.keys) for kind, index in self._indexes.items()},
+            "sync": synced,
+            "checks": self.checks,
+            "corrections": self.corrections,
+            "rejections": self.rejections,
+            "warnings": self.warnings,
+        }
+
+
+_cache: Optional[MasterDataCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_master_data() -> MasterDataCache:
+    """The process-wide cache, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MasterDataCache()
+        return _cache
+
+
+if __name__ == "__main__":
+    # python -m src.toolkit.fusion_master_data sync [--full]
+    # python -m src.toolkit.fusion_master_data import products items.csv
+    # python -m src.toolkit.fusion_master_data lookup products AS664743l
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("stats", [])
+    cache = get_master_data()
+    if command == "sync":
+        result = cache.sync_all(full="--full" in args)
+    elif command == "import":
+        with open(args[1], newline="", encoding="utf-8") as f:
+            result = cache.upsert(args[0], csv.DictReader(f))
+    elif command == "lookup":
+        result = cache.lookup(args[0], args[1])
+    else:
+        result = cache.stats()
+    print(json.dumps(result, indent=2, default=str))
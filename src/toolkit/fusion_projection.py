@@ -0,0 +1,128 @@
+"""
+fusion_projection.py
+==========================
+==Compact Fusion Tool Outputs==
+==========================
+Fusion returns the whole sales order resource (links, every header attribute, nested
+children). The tool output goes straight back into the agent context, so every
+extra field costs input tokens on the next LLM step. This module:
+
+1. builds Fusion ``fields=`` / ``onlyData=true`` query parameters so the server
+   returns less in the first place (GET)
+2. projects the response client side with the same spec (covers POST, which
+   returns the full resource, and servers that ignore ``fields``)
+3. serializes without indentation and without empty values
+
+Field specs use Fusion's syntax: ``Attr1,Attr2;child:Attr1,Attr2``.
+An empty spec keeps the full resource.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+load_dotenv(PROJECT_ROOT / "config/.env")  # settings are read below, at import
+
+DEFAULT_GET_FIELDS = (
+    "OrderNumber,SourceTransactionNumber,SourceTransactionSystem,StatusCode,HeaderId,"
+    "TransactionalCurrencyCode,OrderedDate,RequestedShipDate,BuyingPartyNumber;"
+    "lines:SourceTransactionLineNumber,ProductNumber,OrderedQuantity,OrderedUOMCode,StatusCode"
+)
+DEFAULT_CREATE_FIELDS = (
+    "OrderNumber,SourceTransactionNumber,SourceTransactionSystem,StatusCode,HeaderId,SubmittedFlag;"
+    "lines:SourceTransactionLineNumber,ProductNumber,OrderedQuantity,StatusCode"
+)
+
+GET_FIELDS = os.getenv("FUSION_SCM_GET_FIELDS", DEFAULT_GET_FIELDS)
+CREATE_FIELDS = os.getenv("FUSION_SCM_CREATE_FIELDS", DEFAULT_CREATE_FIELDS)
+COMPACT = os.getenv("FUSION_SCM_COMPACT_OUTPUT", "true").lower() == "true"
+
+# Collection envelope keys worth keeping alongside the projected items
+COLLECTION_KEYS = ("count", "hasMore", "limit", "offset", "totalResults")
+
+
+def parse_fields(spec: Optional[str]) -> Dict[Optional[str], List[str]]:
+    """
+    Parse "A,B;lines:C,D" into {None: ["A", "B"], "lines": ["C", "D"]}.
+    """
+    fields: Dict[Optional[str], List[str]] = {}
+    for part in (spec or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        child = None
+        if ":" in part:
+            child, part = part.split(":", 1)
+            child = child.strip()
+        fields[child] = [name.strip() for name in part.split(",") if name.strip()]
+    return fields
+
+
+def query_params(spec: Optional[str]) -> str:
+    """
+    Query string asking Fusion for data only, restricted to spec.
+    :return: "&onlyData=true&fields=..." to append to a query, "" when compaction is off
+    """
+    if not COMPACT:
+        return ""
+    params = "&onlyData=true"
+    if spec:
+        params += f"&fields={spec.replace(' ', '')}"
+    return params
+
+
+def _project_item(item: Dict[str, Any], fields: Dict[Optional[str], List[str]]) -> Dict[str, Any]:
+    top = fields.get(None)
+    projected = {k: v for k, v in item.items() if top is None or k in top}
+    for child, names in fields.items():
+        if child is None or child not in item:
+            continue
+        value = item[child]
+        if isinstance(value, dict) and "items" in value:  # expanded child collection
+            value = value["items"]
+        if isinstance(value, list):
+            projected[child] = [{k: v for k, v in row.items() if k in names} for row in value if isinstance(row, dict)]
+    return projected
+
+
+def project(data: Any, spec: Optional[str]) -> Any:
+    """
+    Keep only the fields in spec, for a single resource or an ``items`` collection.
+    """
+    if not isinstance(data, dict):
+        return data
+    data = _strip(data)
+    fields = parse_fields(spec)
+    if not fields:
+        return data
+    if isinstance(data.get("items"), list):
+        projected = {k: data[k] for k in COLLECTION_KEYS if k in data}
+        projected["items"] = [_project_item(item, fields) for item in data["items"] if isinstance(item, dict)]
+        return projected
+    return _project_item(data, fields)
+
+
+def _strip(value: Any) -> Any:
+    # drop HATEOAS links and empty values, recursively
+    if isinstance(value, dict):
+        return {
+            k: _strip(v) for k, v in value.items()
+            if k != "links" and v is not None and v != [] and v != {}
+        }
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    return value
+
+
+def format_output(data: Any, spec: Optional[str]) -> str:
+    """
+    Tool output for a Fusion response: projected and compact, or the full indented
+    resource when FUSION_SCM_COMPACT_OUTPUT=false.
+    """
+    if not COMPACT:
+        return f"Response: {json.dumps(data, indent=4)}"
+    return f"Response: {json.dumps(project(data, spec), separators=(',', ':'), ensure_ascii=False)}"
@@ -0,0 +1,254 @@
+"""
+fusion_resilience.py
+==========================
+==Fusion Rate Limiting and Circuit Breaking==
+==========================
+Process-wide guards applied by fusion_request() / fusion_request_async() before every
+attempt:
+
+1. TokenBucket per Fusion endpoint ("get", "lookup", "create", ...): callers wait for a
+   token instead of hitting Fusion's throttling; limits from FUSION_SCM_RATE_LIMITS
+2. CircuitBreaker shared by all calls: once the error rate over the recent window crosses
+   FUSION_SCM_BREAKER_ERROR_RATE, calls fail fast with CircuitOpen for
+   FUSION_SCM_BREAKER_OPEN_SECONDS, then one probe call decides whether to close again
+3. resilience_stats() reports breaker state and limiter waits
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+load_dotenv(PROJECT_ROOT / "config/.env")  # settings are read below, at import
+
+DEFAULT_RATE = float(os.getenv("FUSION_SCM_RATE_LIMIT", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("FUSION_SCM_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("FUSION_SCM_BREAKER_MIN_CALLS", "10"))
+BREAKER_WINDOW = float(os.getenv("FUSION_SCM_BREAKER_WINDOW", "60"))
+BREAKER_OPEN_SECONDS = float(os.getenv("FUSION_SCM_BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Fusion calls are short-circuited; str() is a JSON error the agent can relay."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(json.dumps({
+            "error": "fusion_unavailable",
+            "message": "Fusion SCM is failing; requests are paused. Try again later.",
+            "retry_after_seconds": self.retry_after,
+        }))
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse "get=20,lookup=5:10,create=2" into {endpoint: (rate per second, burst)}.
+    Burst defaults to the rate.
+    """
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        rate, _, burst = value.partition(":")
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: float):
+        """
+        :param rate: tokens added per second; 0 disables the limit
+        :param burst: bucket capacity
+        """
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def reserve(self) -> float:
+        """
+        Take one token, borrowing against future refills if the bucket is empty.
+        :return: seconds the caller must wait before sending
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+            self.acquired += 1
+            if wait > 0:
+                self.waited += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "avg_wait_ms": round(self.total_wait / self.waited * 1000) if self.waited else 0,
+                "max_wait_ms": round(self.max_wait * 1000),
+            }
+
+
+class CircuitBreaker:
+
+    def __init__(
+        self,
+        error_rate: float = BREAKER_ERROR_RATE,
+        min_calls: int = BREAKER_MIN_CALLS,
+        window: float = BREAKER_WINDOW,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        """
+        :param error_rate: failure ratio over the window that opens the breaker
+        :param min_calls: calls needed in the window before the ratio is trusted
+        :param window: seconds of outcomes considered
+        :param open_seconds: how long calls fail fast before a probe is let through
+        """
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes: deque = deque()  # (monotonic time, ok)
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self) -> None:
+        """:raises CircuitOpen: while the breaker is open (or a probe is already running)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpen(max(remaining, 1.0))
+
+    def record(self, ok: Optional[bool]) -> None:
+        """
+        :param ok: outcome of a call let through by before_call(); None when the call
+                   ended without an outcome (e.g. cancelled), which only frees the probe slot
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok is None:
+                    return
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+            if ok is None:
+                return
+            self._outcomes.append((now, ok))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, outcome in self._outcomes if not outcome)
+            if (
+                self.state == CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.error_rate
+            ):
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.opened += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self.state,
+                "window_calls": len(self._outcomes),
+                "window_failures": failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "open_seconds": self.open_seconds,
+            }
+
+
+RATE_LIMITS = parse_rate_limits(os.getenv("FUSION_SCM_RATE_LIMITS", ""))
+breaker = CircuitBreaker()
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def is_failure(status_code: int) -> bool:
+    # throttling and server errors count against Fusion; other 4xx are the caller's problem
+    return status_code == 429 or status_code >= 500
+
+
+def limiter(endpoint: str) -> TokenBucket:
+    """The shared bucket for endpoint, created with its configured (or the default) rate."""
+    with _limiters_lock:
+        bucket = _limiters.get(endpoint)
+        if bucket is None:
+            rate, burst = RATE_LIMITS.get(endpoint, (DEFAULT_RATE, DEFAULT_RATE))
+            bucket = _limiters[endpoint] = TokenBucket(rate, burst)
+        return bucket
+
+
+def set_rate_limits(limits: Dict[str, Tuple[float, float]], default: float) -> None:
+    """
+    Replace the configured limits, e.g. for a load test; buckets are recreated on next use.
+    :param limits: {endpoint: (rate per second, burst)} as returned by parse_rate_limits()
+    :param default: rate of endpoints without an explicit limit; 0 disables it
+    """
+    global RATE_LIMITS, DEFAULT_RATE
+    with _limiters_lock:
+        RATE_LIMITS = dict(limits)
+        DEFAULT_RATE = default
+        _limiters.clear()
+
+
+def rate_limits() -> dict:
+    """The configured limits: {"default": rate, endpoint: {"rate", "burst"}, ...}."""
+    with _limiters_lock:
+        return {"default": DEFAULT_RATE, **{name: {"rate": rate, "burst": burst} for name, (rate, burst) in RATE_LIMITS.items()}}
+
+
+def resilience_stats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {
+        "breaker": breaker.stats(),
+        "limiters": {name: bucket.stats() for name, bucket in limiters.items()},
+    }
@@ -0,0 +1,293 @@
+# Async variant of Fusion_SCM_Order_Toolkit: the same tools, awaited on the event loop
+# (FastAPI endpoints, Agent.run_async) instead of blocking a thread per Fusion call
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import httpx
+from dotenv import load_dotenv
+from oci.addons.adk import Toolkit, tool
+
+from src.toolkit.fusion_projection import CREATE_FIELDS, GET_FIELDS, format_output, query_params
+from src.toolkit.fusion_http import create_may_have_committed, fusion_request_async, is_create_idempotent
+from src.toolkit.fusion_resilience import CircuitOpen
+from src.toolkit.fusion_master_data import MASTER_VALIDATE, get_master_data
+from src.toolkit.fusion_lookup import (
+    LOOKUP_CONCURRENCY, LOOKUP_USE_Q, unique_ids, chunks, finder_query, q_query, q_headers, q_rejected, index_items
+)
+from src.toolkit.fusion_listing import (
+    LIST_PAGE_SIZE, LIST_PREFETCH, list_query, list_headers, page_items, next_offset
+)
+
+# ────────────────────────────────────────────────────────
+# 1) bootstrap paths + env
+# ────────────────────────────────────────────────────────
+THIS_DIR     = Path(__file__).resolve()
+PROJECT_ROOT = THIS_DIR.parent.parent.parent
+load_dotenv(PROJECT_ROOT / "config/.env")
+
+API_USER = os.getenv("FUSION_SCM_API_USER")
+API_PASS = os.getenv("FUSION_SCM_API_PASS")
+API_URL = os.getenv("FUSION_SCM_API_URL")
+# httpx, unlike requests, rejects a (None, None) auth tuple
+AUTH = (API_USER, API_PASS) if API_USER else None
+
+
+class Fusion_SCM_Order_Async_Toolkit(Toolkit):
+
+    @tool
+    async def create_sales_order(self, payload: dict) -> str:
+        """
+        You are a tools to create sales order by invoking an External REST API.
+        :param query:
+        :return:
+        """
+        return await self.post_sales_order(payload)
+
+    async def post_sales_order(self, payload: dict, master_data: bool = MASTER_VALIDATE) -> str:
+        """
+        create_sales_order() for callers outside the agent. Kept off the tool schema so
+        the agent cannot skip the master data check.
+        :param master_data: check the order against the master data cache first; False for
+                            orders already checked by direct_ops.validate_order()
+        """
+        order = None  # set for creates Fusion deduplicates by source transaction key
+        try:
+
+            headers = {
+                "Content-Type": "application/vnd.oracle.adf.resourceitem+json",
+                "Accept": "application/vnd.oracle.adf.resourceitem+json"
+            }
+
+            if master_data and isinstance(payload, dict):
+                # catch unknown products / customers / UOMs here instead of in a failed POST
+                check = get_master_data().check_order(payload)
+                if check.errors:
+                    return f"Order rejected before submission: {json.dumps({'errors': check.errors})}"
+                payload = check.order
+
+            idempotent = isinstance(payload, dict) and is_create_idempotent(payload)
+            if idempotent:
+                order = payload
+            if isinstance(payload, dict):
+                payload = json.dumps(payload)
+
+            response = await fusion_request_async(
+                "POST",
+                API_URL,
+                idempotent=idempotent,
+                endpoint="create",
+                auth=AUTH,
+                headers=headers,
+                content=payload,
+            )
+
+            print("Status Code:", response.status_code)
+
+            if order and create_may_have_committed(response):
+                created = await self._find_created_order(order)
+                if created:
+                    return format_output(created, CREATE_FIELDS)
+            response.raise_for_status()
+            return format_output(response.json(), CREATE_FIELDS)
+
+        except (httpx.HTTPError, CircuitOpen) as e:
+            created = order and create_may_have_committed(error=e) and await self._find_created_order(order)
+            if created:
+                return format_output(created, CREATE_FIELDS)
+            return f"API call failed: {str(e)}"
+
+    async def _find_created_order(self, order: dict):
+        # the order a timed-out create may have booked, found by its source transaction key
+        try:
+            response = await fusion_request_async(
+                "GET",
+                f"{API_URL}?{finder_query(order['SourceTransactionNumber'], order['SourceTransactionSystem'])}",
+                idempotent=True,
+                endpoint="get",
+                auth=AUTH,
+            )
+            response.raise_for_status()
+            items = response.json().get("items") or []
+        except (httpx.HTTPError, CircuitOpen):
+            return None
+        return items[0] if items else None
+
+    @tool
+    async def get_sales_order(self, orderid: str) -> str:
+        """
+        You are a tools to get sales order by invoking an External REST API.
+        :param query:
+        :return:
+        """
+        try:
+
+            query_string = f"finder=findBySourceOrderNumberAndSystem;SourceTransactionNumber={orderid},SourceTransactionSystem=OPS"
+            query_string += query_params(GET_FIELDS)
+            response = await fusion_request_async(
+                "GET",
+                f"{API_URL}?{query_string}",
+                idempotent=True,
+                endpoint="get",
+                auth=AUTH,
+            )
+
+            print("Status Code:", response.status_code)
+
+            response.raise_for_status()
+            return format_output(response.json(), GET_FIELDS)
+
+        except (httpx.HTTPError, CircuitOpen) as e:
+            return f"API call failed: {str(e)}"
+
+    @tool
+    async def get_sales_orders(self, orderids: list) -> str:
+        """
+        You are a tools to get many sales orders at once by invoking an External REST API.
+        :param orderids: list of order ids (source transaction numbers)
+        :return: orders keyed by order id, null when not found
+        """
+        return f"Response: {json.dumps(await self.lookup_sales_orders(orderids), separators=(',', ':'))}"
+
+    async def lookup_sales_orders(self, orderids: list) -> dict:
+        """
+        Look up many orders concurrently, a chunk of ids per request where Fusion accepts
+        a combined q= filter (see src/toolkit/fusion_lookup.py).
+        :return: {orderid: order, None when not found, or {"error": ...}}
+        """
+        orderids = unique_ids(orderids)
+        semaphore = asyncio.Semaphore(LOOKUP_CONCURRENCY)
+
+        async def limited(fn, arg):
+            async with semaphore:
+                return await fn(arg)
+
+        results, single = {}, orderids
+        if LOOKUP_USE_Q and len(orderids) > 1:
+            single = []
+            batches = chunks(orderids)
+            for chunk, found in zip(batches, await asyncio.gather(*(limited(self._lookup_chunk, c) for c in batches))):
+                if found is None:
+                    single.extend(chunk)
+                else:
+                    results.update(found)
+        results.update(zip(single, await asyncio.gather(*(limited(self._lookup_one, o) for o in single))))
+        return {orderid: results.get(orderid) for orderid in orderids}
+
+    async def _lookup_chunk(self, orderids: list):
+        # None -> q= filter not supported: fall back to one finder request per id
+        try:
+            response = await fusion_request_async(
+                "GET",
+                f"{API_URL}?{q_query(orderids)}",
+                idempotent=True,
+                endpoint="lookup",
+                auth=AUTH,
+                headers=q_headers(),
+            )
+            response.raise_for_status()
+            return index_items(response.json(), orderids)
+        except CircuitOpen as e:
+            return {orderid: {"error": f"API call failed: {str(e)}"} for orderid in orderids}
+        except httpx.HTTPError as e:
+            if not q_rejected(e):
+                return {orderid: {"error": f"API call failed: {str(e)}"} for orderid in orderids}
+            print(f"Bulk lookup of {len(orderids)} orders rejected ({e}), looking them up one by one")
+            return None
+
+    async def _lookup_one(self, orderid: str):
+        try:
+            response = await fusion_request_async(
+                "GET",
+                f"{API_URL}?{finder_query(orderid)}",
+                idempotent=True,
+                endpoint="get",
+                auth=AUTH,
+            )
+            response.raise_for_status()
+            return index_items(response.json(), [orderid])[orderid]
+        except (httpx.HTTPError, CircuitOpen) as e:
+            return {"error": f"API call failed: {str(e)}"}
+
+    @tool
+    async def list_sales_orders(self, filter: str = "", limit: int = 25, offset: int = 0) -> str:
+        """
+        You are a tools to list sales orders one page at a time by invoking an External REST API.
+        :param filter: Fusion q expression, e.g. StatusCode='OPEN'; empty for all orders
+        :param limit: orders per page
+        :param offset: orders to skip; use the previous offset + count while hasMore is true
+        :return: the page with count, hasMore and offset
+        """
+        try:
+            response = await fusion_request_async(
+                "GET",
+                f"{API_URL}?{list_query(offset, limit, q=filter or None)}",
+                idempotent=True,
+                endpoint="list",
+                auth=AUTH,
+                headers=list_headers(),
+            )
+            response.raise_for_status()
+            return format_output(response.json(), GET_FIELDS)
+
+        except (httpx.HTTPError, CircuitOpen) as e:
+            return f"API call failed: {str(e)}"
+
+    async def iter_sales_order_pages(
+        self, q: str = None, fields: str = GET_FIELDS, page_size: int = LIST_PAGE_SIZE,
+        prefetch: bool = LIST_PREFETCH, max_pages: int = None,
+    ):
+        """
+        Walk the sales order collection page by page (see src/toolkit/fusion_listing.py).
+        With prefetch the next page is requested as a task while the caller works on
+        the current one.
+        :param q: Fusion filter expression; None for all orders
+        :param fields: projection spec applied to every order
+        :param max_pages: stop after this many pages
+        :return: async generator of {"offset", "count", "hasMore", "items"}
+        :raises httpx.HTTPError, CircuitOpen: when a page cannot be fetched
+        """
+        async def fetch(offset):
+            response = await fusion_request_async(
+                "GET",
+                f"{API_URL}?{list_query(offset, page_size, q=q, fields=fields)}",
+                idempotent=True,
+                endpoint="list",
+                auth=AUTH,
+                headers=list_headers(),
+            )
+            response.raise_for_status()
+            return response.json()
+
+        offset, pages, pending = 0, 0, None
+        try:
+            while offset is not None and (max_pages is None or pages < max_pages):
+                data = await pending if pending else await fetch(offset)
+                pending = None
+                pages += 1
+                following = next_offset(data, offset)
+                if prefetch and following is not None and (max_pages is None or pages < max_pages):
+                    pending = asyncio.create_task(fetch(following))
+                items = page_items(data, fields)
+                yield {"offset": offset, "count": len(items), "hasMore": following is not None, "items": items}
+                offset = following
+        finally:
+            if pending:
+                pending.cancel()
+
+    async def iter_sales_orders(self, q: str = None, fields: str = GET_FIELDS, **kwargs):
+        """Every order matching q, one at a time; kwargs as for iter_sales_order_pages."""
+        async for page in self.iter_sales_order_pages(q, fields, **kwargs):
+            for item in page["items"]:
+                yield item
+
+
+async def test_get_sales_order():
+    toolkit = Fusion_SCM_Order_Async_Toolkit()
+    print(await toolkit.get_sales_order("R210_Sample_Order_ATOModel_230"))
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(test_get_sales_order())
@@ -2,8 +2,19 @@
 import requests, os
 import json
 from oci.addons.adk import Toolkit, tool
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
+from src.toolkit.fusion_projection import CREATE_FIELDS, GET_FIELDS, format_output, query_params
+from src.toolkit.fusion_http import create_may_have_committed, fusion_request, is_create_idempotent
+from src.toolkit.fusion_resilience import CircuitOpen
+from src.toolkit.fusion_master_data import MASTER_VALIDATE, get_master_data
+from src.toolkit.fusion_lookup import (
+    LOOKUP_CONCURRENCY, LOOKUP_USE_Q, unique_ids, chunks, finder_query, q_query, q_headers, q_rejected, index_items
+)
+from src.toolkit.fusion_listing import (
+    LIST_PAGE_SIZE, LIST_PREFETCH, list_query, list_headers, page_items, next_offset
+)
 
 # ────────────────────────────────────────────────────────
 # 1) bootstrap paths + env + llm
@@ -27,6 +38,7 @@ class Fusion_SCM_Order_Toolkit(Toolkit):
         :param query:
         :return:
         """
+        order = None  # set for creates Fusion deduplicates by source transaction key
         try:
 
             headers = {
@@ -34,13 +46,26 @@ class Fusion_SCM_Order_Toolkit(Toolkit):
                 "Accept": "application/vnd.oracle.adf.resourceitem+json"
             }
 
+            if MASTER_VALIDATE and isinstance(payload, dict):
+                # catch unknown products / customers / UOMs here instead of in a failed POST
+                check = get_master_data().check_order(payload)
+                if check.errors:
+                    return f"Order rejected before submission: {json.dumps({'errors': check.errors})}"
+                payload = check.order
+
+            idempotent = isinstance(payload, dict) and is_create_idempotent(payload)
+            if idempotent:
+                order = payload
             if isinstance(payload, dict):
                 payload = json.dumps(payload)
 
 
             print(payload)
-            response = requests.post(
+            response = fusion_request(
+                "POST",
                 API_URL,
+                idempotent=idempotent,
+                endpoint="create",
                 auth=(API_USER, API_PASS),
                 headers=headers,
                 data=payload  # ✅ Correctly serialized JSON
@@ -49,12 +74,35 @@ class Fusion_SCM_Order_Toolkit(Toolkit):
             print("Status Code:", response.status_code)
             print("Response Text:", response.text)
 
+            if order and create_may_have_committed(response):
+                created = self._find_created_order(order)
+                if created:
+                    return format_output(created, CREATE_FIELDS)
             response.raise_for_status()
-            return f"Response: {json.dumps(response.json(), indent=4)}"
+            return format_output(response.json(), CREATE_FIELDS)
 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, CircuitOpen) as e:
+            created = order and create_may_have_committed(error=e) and self._find_created_order(order)
+            if created:
+                return format_output(created, CREATE_FIELDS)
             return f"API call failed: {str(e)}"
 
+    def _find_created_order(self, order: dict):
+        # the order a timed-out create may have booked, found by its source transaction key
+        try:
+            response = fusion_request(
+                "GET",
+                f"{API_URL}?{finder_query(order['SourceTransactionNumber'], order['SourceTransactionSystem'])}",
+                idempotent=True,
+                endpoint="get",
+                auth=(API_USER, API_PASS),
+            )
+            response.raise_for_status()
+            items = response.json().get("items") or []
+        except (requests.exceptions.RequestException, CircuitOpen):
+            return None
+        return items[0] if items else None
+
     @tool
     def get_sales_order(self, orderid: str) -> str:
         """
@@ -69,10 +117,14 @@ class Fusion_SCM_Order_Toolkit(Toolkit):
             """
 
             query_string = f"finder=findBySourceOrderNumberAndSystem;SourceTransactionNumber={orderid},SourceTransactionSystem=OPS"
+            query_string += query_params(GET_FIELDS)
             resource = f"?{query_string}"
             print(resource)
-            response = requests.get(
+            response = fusion_request(
+                "GET",
                 API_URL + resource,
+                idempotent=True,
+                endpoint="get",
                 auth=(API_USER, API_PASS),
             )
 
@@ -80,11 +132,146 @@ class Fusion_SCM_Order_Toolkit(Toolkit):
             print("Response Text:", response.text)
 
             response.raise_for_status()
-            return f"Response: {json.dumps(response.json(), indent=4)}"
+            return format_output(response.json(), GET_FIELDS)
+
+        except (requests.exceptions.RequestException, CircuitOpen) as e:
+            return f"API call failed: {str(e)}"
+
+    @tool
+    def get_sales_orders(self, orderids: list) -> str:
+        """
+        You are a tools to get many sales orders at once by invoking an External REST API.
+        :param orderids: list of order ids (source transaction numbers)
+        :return: orders keyed by order id, null when not found
+        """
+        return f"Response: {json.dumps(self.lookup_sales_orders(orderids), separators=(',', ':'))}"
+
+    def lookup_sales_orders(self, orderids: list) -> dict:
+        """
+        Look up many orders concurrently, a chunk of ids per request where Fusion accepts
+        a combined q= filter (see src/toolkit/fusion_lookup.py).
+        :return: {orderid: order, None when not found, or {"error": ...}}
+        """
+        orderids = unique_ids(orderids)
+        results, single = {}, orderids
+        with ThreadPoolExecutor(max_workers=LOOKUP_CONCURRENCY) as executor:
+            if LOOKUP_USE_Q and len(orderids) > 1:
+                single = []
+                for chunk, found in zip(chunks(orderids), executor.map(self._lookup_chunk, chunks(orderids))):
+                    if found is None:
+                        single.extend(chunk)
+                    else:
+                        results.update(found)
+            results.update(zip(single, executor.map(self._lookup_one, single)))
+        return {orderid: results.get(orderid) for orderid in orderids}
 
+    def _lookup_chunk(self, orderids: list):
+        # None -> q= filter not supported: fall back to one finder request per id
+        try:
+            response = fusion_request(
+                "GET",
+                f"{API_URL}?{q_query(orderids)}",
+                idempotent=True,
+                endpoint="lookup",
+                auth=(API_USER, API_PASS),
+                headers=q_headers(),
+            )
+            response.raise_for_status()
+            return index_items(response.json(), orderids)
+        except CircuitOpen as e:
+            return {orderid: {"error": f"API call failed: {str(e)}"} for orderid in orderids}
         except requests.exceptions.RequestException as e:
+            if not q_rejected(e):
+                return {orderid: {"error": f"API call failed: {str(e)}"} for orderid in orderids}
+            print(f"Bulk lookup of {len(orderids)} orders rejected ({e}), looking them up one by one")
+            return None
+
+    def _lookup_one(self, orderid: str):
+        try:
+            response = fusion_request(
+                "GET",
+                f"{API_URL}?{finder_query(orderid)}",
+                idempotent=True,
+                endpoint="get",
+                auth=(API_USER, API_PASS),
+            )
+            response.raise_for_status()
+            return index_items(response.json(), [orderid])[orderid]
+        except (requests.exceptions.RequestException, CircuitOpen) as e:
+            return {"error": f"API call failed: {str(e)}"}
+
+    @tool
+    def list_sales_orders(self, filter: str = "", limit: int = 25, offset: int = 0) -> str:
+        """
+        You are a tools to list sales orders one page at a time by invoking an External REST API.
+        :param filter: Fusion q expression, e.g. StatusCode='OPEN'; empty for all orders
+        :param limit: orders per page
+        :param offset: orders to skip; use the previous offset + count while hasMore is true
+        :return: the page with count, hasMore and offset
+        """
+        try:
+            response = fusion_request(
+                "GET",
+                f"{API_URL}?{list_query(offset, limit, q=filter or None)}",
+                idempotent=True,
+                endpoint="list",
+                auth=(API_USER, API_PASS),
+                headers=list_headers(),
+            )
+            response.raise_for_status()
+            return format_output(response.json(), GET_FIELDS)
+
+        except (requests.exceptions.RequestException, CircuitOpen) as e:
             return f"API call failed: {str(e)}"
-        
+
+    def iter_sales_order_pages(
+        self, q: str = None, fields: str = GET_FIELDS, page_size: int = LIST_PAGE_SIZE,
+        prefetch: bool = LIST_PREFETCH, max_pages: int = None,
+    ):
+        """
+        Walk the sales order collection page by page (see src/toolkit/fusion_listing.py).
+        With prefetch the next page is fetched in a background thread while the caller
+        works on the current one.
+        :param q: Fusion filter expression; None for all orders
+        :param fields: projection spec applied to every order
+        :param max_pages: stop after this many pages
+        :return: generator of {"offset", "count", "hasMore", "items"}
+        :raises requests.exceptions.RequestException, CircuitOpen: when a page cannot be fetched
+        """
+        def fetch(offset):
+            response = fusion_request(
+                "GET",
+                f"{API_URL}?{list_query(offset, page_size, q=q, fields=fields)}",
+                idempotent=True,
+                endpoint="list",
+                auth=(API_USER, API_PASS),
+                headers=list_headers(),
+            )
+            response.raise_for_status()
+            return response.json()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            offset, pages, pending = 0, 0, None
+            try:
+                while offset is not None and (max_pages is None or pages < max_pages):
+                    data = pending.result() if pending else fetch(offset)
+                    pending = None
+                    pages += 1
+                    following = next_offset(data, offset)
+                    if prefetch and following is not None and (max_pages is None or pages < max_pages):
+                        pending = executor.submit(fetch, following)
+                    items = page_items(data, fields)
+                    yield {"offset": offset, "count": len(items), "hasMore": following is not None, "items": items}
+                    offset = following
+            finally:
+                if pending:
+                    pending.cancel()
+
+    def iter_sales_orders(self, q: str = None, fields: str = GET_FIELDS, **kwargs):
+        """Every order matching q, one at a time; kwargs as for iter_sales_order_pages."""
+        for page in self.iter_sales_order_pages(q, fields, **kwargs):
+            yield from page["items"]
+
     # @tool
     # def get_order_number(self, order_key: str) -> str:
     #     """
@@ -1,10 +1,12 @@
-import os
-from pdf2image import convert_from_path
 from oci.addons.adk import Toolkit, tool
-from PIL import Image
 from langchain_core.messages import HumanMessage
-from src.llm.oci_genai_vision import initialize_vision_llm
-from src.tools.vision_instruct_tools import encode_image_as_base64
+from src.llm.oci_genai_vision import MODEL_ID, initialize_vision_llm
+from src.llm.oci_genai import MODEL_ID as TEXT_MODEL_ID, initialize_llm
+from src.utils.image_preprocess import image_data_url, preprocess_settings
+from src.utils.vision_cache import cached_extraction
+from src.utils.vision_batch import extract_pages, load_pages
+from src.utils.pdf_raster import PDF_RENDER_DPI, iter_pdf_pages
+import json
 
 class MultiModal2Text(Toolkit):
     @tool
@@ -16,40 +18,72 @@ class MultiModal2Text(Toolkit):
         :return:
         """
 
-        # Encode image
-        image_base64 = encode_image_as_base64(image_path)
+        with open(image_path, "rb") as image_file:
+            image_bytes = image_file.read()
+        return self.extract_image(image_bytes, question)
 
-        # Construct message with image and text
-        messages = [
-            HumanMessage(
-                content=[
-                    {"type": "text", "text": f"{question}"},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
-                ]
-            )
-        ]
+    @tool
+    def images_to_text(self, image_paths: list, question: str) -> str:
+        """
+         a tool to convert a multi-page order (several images and/or PDF files) to one order
+        :param image_paths: image and PDF file paths, in page order
+        :param question:
+        :return: the merged order JSON, per-page results (with the tier used: "text" or "vision") and conflicting header values
+        """
+        # PDF pages with a text layer are read locally and answered by the text model; only the rest go to vision
+        result = extract_pages(
+            load_pages(image_paths),
+            lambda image: self.extract_image(image, question),
+            extract_text=lambda text: self.extract_text(text, question),
+        )
+        return json.dumps(result)
+
+    def extract_image(self, image_bytes: bytes, question: str) -> str:
+        def extract() -> str:
+            # Preprocess and encode image, labelled with its real MIME type
+            image_url = image_data_url(image_bytes)
+
+            # Construct message with image and text
+            messages = [
+                HumanMessage(
+                    content=[
+                        {"type": "text", "text": f"{question}"},
+                        {"type": "image_url", "image_url": {"url": image_url}}
+                    ]
+                )
+            ]
+
+            llm = initialize_vision_llm()
+            response = llm.invoke(messages)
+            # print(response.content)
+            return response.content
 
-        llm = initialize_vision_llm()
-        response = llm.invoke(messages)
-        # print(response.content)
-        return response.content
+        return cached_extraction(image_bytes, question, "none", MODEL_ID, extract, **preprocess_settings())
+
+    def extract_text(self, page_text: str, question: str) -> str:
+        def extract() -> str:
+            messages = [HumanMessage(content=f"{question}\n\nDocument text:\n{page_text}")]
+
+            llm = initialize_llm()
+            response = llm.invoke(messages)
+            return response.content
+
+        return cached_extraction(page_text.encode("utf-8"), question, "none", TEXT_MODEL_ID, extract, tier="text")
 
     @tool
-    def convert_pdf_to_png(self, pdf_path, output_dir):
+    def convert_pdf_to_png(self, pdf_path, output_dir, dpi: int = PDF_RENDER_DPI, first_page: int = None, last_page: int = None):
         """
         a tool to convert pdf to text
         :param pdf_path:
         :param output_dir:
-        :return:
+        :param dpi: render resolution; lowered for pages too large to render at it
+        :param first_page: first page to render (1-based), default the first
+        :param last_page: last page to render, default the last
+        :return: paths of the rendered pages
         """
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        # Convert all pages to images (each page = 1 PNG)
-        Image.MAX_IMAGE_PIXELS = None
-        pages = convert_from_path(pdf_path, dpi=1024)
-
-        for i, page in enumerate(pages):
-            output_path = os.path.join(output_dir, f"page_{i + 1}.png")
-            page.save(output_path, "PNG")
-            print(f"Saved: {output_path}")
\ No newline at end of file
+        # Render page by page straight to disk (see src/utils/pdf_raster.py)
+        paths = []
+        for output_path in iter_pdf_pages(pdf_path, output_dir, dpi=dpi, first_page=first_page, last_page=last_page, fmt="png"):
+            print(f"Saved: {output_path}")
+            paths.append(output_path)
+        return json.dumps(paths)
\ No newline at end of file
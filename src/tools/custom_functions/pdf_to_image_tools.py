@@ -1,27 +1,24 @@
-import os
-from pdf2image import convert_from_path
+import json
 from oci.addons.adk import Toolkit, tool
-from PIL import Image
+from src.utils.pdf_raster import PDF_RENDER_DPI, iter_pdf_pages
 
 @tool
-def convert_pdf_to_png(pdf_path, output_dir):
+def convert_pdf_to_png(pdf_path, output_dir, dpi: int = PDF_RENDER_DPI, first_page: int = None, last_page: int = None):
     """
     a tool to convert pdf to text
     :param pdf_path:
     :param output_dir:
-    :return:
+    :param dpi: render resolution; lowered for pages too large to render at it
+    :param first_page: first page to render (1-based), default the first
+    :param last_page: last page to render, default the last
+    :return: paths of the rendered pages
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # Convert all pages to images (each page = 1 PNG)
-    Image.MAX_IMAGE_PIXELS = None
-    pages = convert_from_path(pdf_path, dpi=1024)
-
-    for i, page in enumerate(pages):
-        output_path = os.path.join(output_dir, f"page_{i+1}.png")
-        page.save(output_path, "PNG")
+    # Render page by page straight to disk (see src/utils/pdf_raster.py)
+    paths = []
+    for output_path in iter_pdf_pages(pdf_path, output_dir, dpi=dpi, first_page=first_page, last_page=last_page, fmt="png"):
         print(f"Saved: {output_path}")
+        paths.append(output_path)
+    return json.dumps(paths)
 
 def test_case():
     # Example usage
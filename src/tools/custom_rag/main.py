@@ -30,9 +30,7 @@ print("USE_LOCAL_PDF: " + USE_LOCAL_PDF)
 
 # ─── OCI Custom RAG Configuration --------
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_community.document_loaders import PyPDFLoader
 
 ## Initialize LLM
 
@@ -40,89 +38,28 @@ from ...llm.oci_genai import initialize_llm
 
 chat = initialize_llm()
 
-## Load PDF
-
-if USE_LOCAL_PDF=="true":
-    loader = PyPDFLoader(LOCAL_PDF_PATH)
-    pages = loader.load()
-else:
-    import oci
-    # from PyPDFLoader import PyPDFLoader
-    from io import BytesIO
-
-    # OCI Object Storage configuration
-    config = oci.config.from_file()
-    object_storage = oci.object_storage.ObjectStorageClient(config)
-
-    # Bucket and object details
-    # Download the PDF from OCI Object Storage
-    response = object_storage.get_object(OBJECT_STORAGE_NAMESPACE_NAME, BUCKET_NAME, BUCKET_PDF_NAME)
-    pdf_content = response.data.content
-
-    # Load the PDF into PyPDFLoader
-    pdf_bytes = BytesIO(pdf_content)
-
-    ## Save pdf_bytes to a temporary file
-
-    import tempfile
-    from langchain_community.document_loaders import PyPDFLoader
-
-    # pdf_bytes is a BytesIO object
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
-        tmp_file.write(pdf_bytes.getvalue())  # Extract raw bytes
-        tmp_file_path = tmp_file.name
-
-    loader = PyPDFLoader(tmp_file_path)
-    pages = loader.load()
-    ## clean up temporary file
-    import os
-    os.remove(tmp_file_path)
-
-
-## Combined raw text from all pages
-
-raw_text = ''
-
-for i, doc in enumerate(pages):
-    text = doc.page_content
-    if text:
-        raw_text += text
-
-## Text splitter
-
-text_splitter = RecursiveCharacterTextSplitter(
-    # chunk_size should enable as many characters as can fit in max number of tokens allowed for embedding model i.e. 512 characters. Source: https://docs.oracle.com/en-us/iaas/Content/generative-ai/use-playground-embed.htm
-    chunk_size=2000,
-    chunk_overlap=100
-)
-
-texts = text_splitter.split_text(raw_text)
-
-## Text chunk into a document structure
-
-from langchain_core.documents import Document
-
-documents = []
-for i in range(len(texts)):
-    doc = Document(page_content=texts[i])
-    # doc = texts[i]
-    documents.append(doc)
+## Load PDF page by page, chunk each page, embed and insert the chunks in batches
+## (chunks keep their page number, see src/utils/ingest_pipeline.py)
 
 from src.llm.oci_embedding_model import initialize_embedding_model
+from src.utils.ingest_pipeline import PrecomputedEmbeddings, ingest_pdf, local_pdf
 
 ## Initialize a vector database
 
 embed_model = initialize_embedding_model()
+# the store inserts the vectors computed by the pipeline's embed stage instead of embedding again
+embeddings = PrecomputedEmbeddings(embed_model)
 
 vectordb = Chroma(
     collection_name='summaries',
-    embedding_function=embed_model,
+    embedding_function=embeddings,
     persist_directory='./data'
 )
 
-MAX_NUMBER_DOCUMENTS_IN_VECTOR_DB = 5461
-
-vectordb.add_documents(documents[:MAX_NUMBER_DOCUMENTS_IN_VECTOR_DB])
+# checkpointed per batch: a rerun after a failure continues where it stopped
+with local_pdf(USE_LOCAL_PDF == "true", LOCAL_PDF_PATH, OBJECT_STORAGE_NAMESPACE_NAME,
+               BUCKET_NAME, BUCKET_PDF_NAME) as pdf_path:
+    ingest_pdf(pdf_path, vectordb, embeddings, target=f"chroma:{Path('./data').resolve()}:summaries")
 
 ## Create a retriever
 retriever = vectordb.as_retriever(search_kwargs={"k": 4})
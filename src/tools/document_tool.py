@@ -36,10 +36,7 @@ from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import RetrievalQA
 from langchain_community.document_loaders import TextLoader
 from src.llm.oci_embedding_model import initialize_embedding_model
-from io import BytesIO
-import tempfile
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_core.documents import Document
+from src.utils.ingest_pipeline import PrecomputedEmbeddings, ingest_pdf, local_pdf
 
 from oci.addons.adk import Toolkit, tool
 from pathlib import Path
@@ -82,69 +79,9 @@ def store_documents():
     Tool to store docs as vectors in Oracle 23ai
     """
 
-    # RAG Step1 : Load the PDF document and create pdf reader object
+    # RAG Step1-4 : Load the PDF page by page, chunk each page (chunks keep their page number),
+    # then embed and insert the chunks in batches (see src/utils/ingest_pipeline.py)
 
-    if USE_LOCAL_PDF=="true":
-        loader = PyPDFLoader(LOCAL_PDF_PATH)
-        pages = loader.load()
-    else:
-        # OCI Object Storage configuration
-        config = oci.config.from_file()
-        object_storage = oci.object_storage.ObjectStorageClient(config)
-
-        # Bucket and object details
-        # Download the PDF from OCI Object Storage
-        response = object_storage.get_object(OBJECT_STORAGE_NAMESPACE_NAME, BUCKET_NAME, BUCKET_PDF_NAME)
-        pdf_content = response.data.content
-
-        # Load the PDF into PyPDFLoader
-        pdf_bytes = BytesIO(pdf_content)
-
-        ## Save pdf_bytes to a temporary file
-        # pdf_bytes is a BytesIO object
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
-            tmp_file.write(pdf_bytes.getvalue())  # Extract raw bytes
-            tmp_file_path = tmp_file.name
-
-        loader = PyPDFLoader(tmp_file_path)
-        pages = loader.load()
-        
-        ## clean up temporary file
-        os.remove(tmp_file_path)
-
-
-    ## RAG step2 : Combined raw text from all pages
-    raw_text = ''
-
-    for i, doc in enumerate(pages):
-        text = doc.page_content
-        if text:
-            raw_text += text
-
-    print("You have transformed the PDF document to text format")
-
-    ## RAG step3 : Chunk the text into smaller chunks
-    ### Text splitter
-
-    text_splitter = RecursiveCharacterTextSplitter(
-        # chunk_size should enable as many characters as can fit in max number of tokens allowed for embedding model\
-        #  i.e. 512 characters. Source: https://docs.oracle.com/en-us/iaas/Content/generative-ai/use-playground-embed.htm
-        chunk_size=2000,
-        chunk_overlap=100
-    )
-
-    chunks = text_splitter.split_text(raw_text)
-    print(len(chunks))
-
-    ## RAG step4 : Text chunk into a document structure
-
-    documents = []
-    for i in range(len(chunks)):
-        doc = Document(page_content=chunks[i])
-        # doc = texts[i]
-        documents.append(doc)
-
-    
     # RAG step5 : using an embedding model embed the chunks as vectors into oracle database 23ai
 
     ## Initialize a vector database (replaced Chroma with Oracle 23ai Vector Search)
@@ -166,24 +103,27 @@ def store_documents():
     # Initialize Oracle Vector Store
     # Assumes a table named 'vector_table' exists or will be created with vector columns.
     # You may need to create the table beforehand with appropriate schema (e.g., ID, VECTOR(embedding_dim, FLOAT32), METADATA, CONTENT)
+    # The store inserts the vectors computed by the pipeline's embed stage instead of embedding again
+    embeddings = PrecomputedEmbeddings(embed_model)
     vectordb = OracleVS(
         client=connection,
-        embedding_function=embed_model,
+        embedding_function=embeddings,
         table_name="vector_table",  # Table name for storing vectors
         distance_strategy=DistanceStrategy.COSINE,  # Or DOT_PRODUCT, EUCLIDEAN, etc.
     )
-    
-
-    MAX_NUMBER_DOCUMENTS_IN_VECTOR_DB = 5461
 
-    # Add documents to Oracle Vector Store (this will embed and insert into the DB table)
-    vectordb.add_documents(documents[:MAX_NUMBER_DOCUMENTS_IN_VECTOR_DB])
+    # Stream pages -> chunks -> embedded batches -> inserts into the Oracle Vector Store.
+    # Every committed batch is checkpointed: a rerun after a failure continues where it stopped
+    try:
+        with local_pdf(USE_LOCAL_PDF == "true", LOCAL_PDF_PATH, OBJECT_STORAGE_NAMESPACE_NAME,
+                       BUCKET_NAME, BUCKET_PDF_NAME) as pdf_path:
+            ingest_pdf(pdf_path, vectordb, embeddings, target=f"oracle:{DB_DSN}:{DB_USER}:vector_table")
+    finally:
+        # Clean up: Close connection
+        connection.close()
 
     print("Chunks are stored in the vector_table")
 
-    # Clean up: Close connection
-    connection.close()
-
 # #%% md
 ### Tool Creation to retrive docs from Oracle 23ai
 
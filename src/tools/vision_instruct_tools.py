@@ -1,16 +1,19 @@
 # Convert Image to Text
 from typing import Dict, Any
 from oci.addons.adk import Toolkit, tool
-import base64
 import json
+from pathlib import Path
 from langchain_core.messages import HumanMessage, SystemMessage
-from src.llm.oci_genai_vision import initialize_vision_llm
+from src.llm.oci_genai_vision import MODEL_ID, initialize_vision_llm
+from src.llm.oci_genai import MODEL_ID as TEXT_MODEL_ID, initialize_llm
 from src.data.sales_order import Transaction as data_structure
+from src.utils.image_preprocess import encode_image, image_data_url, preprocess_settings
+from src.utils.vision_cache import cached_extraction, schema_version, usable_answer
+from src.utils.vision_batch import extract_pages, load_pages, parse_transaction
 
-# Load and encode your image (local file)
+# Load, preprocess (orient, downscale, re-encode; see src/utils/image_preprocess.py) and encode your image (local file)
 def encode_image_as_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded = base64.b64encode(image_file.read()).decode("utf-8")
+    encoded, _ = encode_image(image_path)
     return encoded
 
 
@@ -22,31 +25,90 @@ def image_to_text(image_path:str, question:str) -> str:
     :param question:
     :return:
     """
+    return extract_image(Path(image_path).read_bytes(), question)
 
-    # Encode image
-    image_base64 = encode_image_as_base64(image_path)
-
-    data_schema_str = json.dumps(data_structure.model_json_schema(), indent=2)
-
-    # Construct message with image and text
-    messages = [
-        HumanMessage(
-            content=[
-                {"type": "text", "text": f"{question}"},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
-            ]
-        ),
-        SystemMessage(
-            "You are a helpful assistant. Use the schema below to extract structured JSON from the user's request.\n"
-            "Respond with valid JSON inside triple backticks like ```json ... ```.\n\n"
-            "Schema:\n```json\n{data_schema_str}\n```"
-            )
-    ]
-
-    llm = initialize_vision_llm()
-    response = llm.invoke(messages)
-    #print(response.content)
-    return response.content
+
+@tool
+def images_to_text(image_paths: list, question: str) -> str:
+    """
+     a tool to convert a multi-page order (several images and/or PDF files) to one order
+    :param image_paths: image and PDF file paths, in page order
+    :param question:
+    :return: the merged order JSON, per-page results (with the tier used: "text" or "vision") and conflicting header values
+    """
+    # PDF pages with a text layer are read locally and structured by the text model; only the rest go to vision
+    result = extract_pages(
+        load_pages(image_paths),
+        lambda image: extract_image(image, question),
+        extract_text=lambda text: extract_text(text, question),
+    )
+    return json.dumps(result)
+
+
+def order_answer(answer: str) -> bool:
+    """Cache only answers that carry the order JSON the schema asked for."""
+    return usable_answer(answer) and parse_transaction(answer) is not None
+
+
+def extract_image(image_bytes: bytes, question: str) -> str:
+    """Vision model answer for one image, served from the cache when the same image was seen."""
+    data_schema = data_structure.model_json_schema()
+
+    def extract() -> str:
+        # Preprocess and encode image, labelled with its real MIME type
+        image_url = image_data_url(image_bytes)
+
+        data_schema_str = json.dumps(data_schema, indent=2)
+
+        # Construct message with image and text
+        messages = [
+            HumanMessage(
+                content=[
+                    {"type": "text", "text": f"{question}"},
+                    {"type": "image_url", "image_url": {"url": image_url}}
+                ]
+            ),
+            SystemMessage(
+                "You are a helpful assistant. Use the schema below to extract structured JSON from the user's request.\n"
+                "Respond with valid JSON inside triple backticks like ```json ... ```.\n\n"
+                "Schema:\n```json\n{data_schema_str}\n```"
+                )
+        ]
+
+        llm = initialize_vision_llm()
+        response = llm.invoke(messages)
+        #print(response.content)
+        return response.content
+
+    # The same image is extracted by the supervisor, the sub-agent and on retries: serve repeats from the cache
+    return cached_extraction(
+        image_bytes, question, schema_version(data_schema), MODEL_ID, extract,
+        cacheable=order_answer, **preprocess_settings()
+    )
+
+def extract_text(page_text: str, question: str) -> str:
+    """Text model answer for one PDF page read from its text layer (no vision call)."""
+    data_schema = data_structure.model_json_schema()
+
+    def extract() -> str:
+        data_schema_str = json.dumps(data_schema, indent=2)
+        messages = [
+            SystemMessage(
+                "You are a helpful assistant. Use the schema below to extract structured JSON from the order document text.\n"
+                "Respond with valid JSON inside triple backticks like ```json ... ```.\n\n"
+                f"Schema:\n```json\n{data_schema_str}\n```"
+            ),
+            HumanMessage(f"{question}\n\nOrder document text:\n{page_text}"),
+        ]
+
+        llm = initialize_llm()
+        response = llm.invoke(messages)
+        return response.content
+
+    return cached_extraction(
+        page_text.encode("utf-8"), question, schema_version(data_schema), TEXT_MODEL_ID, extract,
+        cacheable=order_answer, tier="text"
+    )
 
 def test_image_to_text():
     import os
@@ -0,0 +1,129 @@
+"""
+image_preprocess.py
+==========================
+==Image Preprocessing for Vision LLM Calls==
+==========================
+Phone photos of handwritten orders are several MB at 12+ megapixels, far more than the
+vision model needs to read them; upload size and model latency both grow with it.
+Before an image is sent:
+
+1. the real MIME type is detected from the file's magic bytes (not the extension)
+2. EXIF orientation is applied, so rotated phone photos arrive upright
+3. the longest edge is downscaled to VISION_MAX_EDGE pixels (never upscaled)
+4. optionally converted to grayscale with auto-contrast (VISION_GRAYSCALE; handwriting)
+5. re-encoded as JPEG or WebP (VISION_IMAGE_FORMAT) at VISION_IMAGE_QUALITY
+
+The original bytes are kept when no change was needed and re-encoding would not make
+them smaller. VISION_PREPROCESS=false sends the original file (with its real MIME type).
+"""
+
+import base64
+import io
+import os
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+PREPROCESS = os.getenv("VISION_PREPROCESS", "true").lower() == "true"
+MAX_EDGE = int(os.getenv("VISION_MAX_EDGE", "1600"))
+IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+GRAYSCALE = os.getenv("VISION_GRAYSCALE", "false").lower() == "true"
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+
+
+def preprocess_settings() -> dict:
+    """Settings that change the image sent to the model (part of the vision cache key)."""
+    if not PREPROCESS:
+        return {"preprocess": False}
+    return {"max_edge": MAX_EDGE, "format": IMAGE_FORMAT, "quality": IMAGE_QUALITY, "grayscale": GRAYSCALE}
+
+
+def detect_mime(data: bytes) -> Optional[str]:
+    """MIME type from the image's magic bytes; None when the format is not recognised."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in _SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    return None
+
+
+def preprocess_image(
+    image: Union[str, Path, bytes],
+    max_edge: int = MAX_EDGE,
+    grayscale: bool = GRAYSCALE,
+    image_format: str = IMAGE_FORMAT,
+    quality: int = IMAGE_QUALITY,
+) -> Tuple[bytes, str]:
+    """
+    :param image: file path or encoded image bytes
+    :param max_edge: longest edge in pixels after downscaling; 0 keeps the size
+    :param grayscale: convert to grayscale with auto-contrast
+    :param image_format: "JPEG" or "WEBP"
+    :param quality: encoder quality, 1-100
+    :return: (encoded image, MIME type)
+    """
+    data = image if isinstance(image, bytes) else Path(image).read_bytes()
+    source_mime = detect_mime(data) or "image/jpeg"
+    if not PREPROCESS:
+        return data, source_mime
+
+    with Image.open(io.BytesIO(data)) as original:
+        original_size = original.size
+        changed = original.getexif().get(0x0112, 1) != 1  # EXIF orientation
+        if max_edge and original.format == "JPEG":
+            # decode at a reduced scale (1/2, 1/4, 1/8) that still covers max_edge
+            scale = max_edge / max(original.size)
+            original.draft(original.mode, (round(original.size[0] * scale), round(original.size[1] * scale)))
+        img = ImageOps.exif_transpose(original)
+
+        if max_edge and max(img.size) > max_edge:
+            img = img.copy()
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            changed = True
+
+        if grayscale:
+            img = ImageOps.autocontrast(img.convert("L"), cutoff=1)
+            changed = True
+        elif img.mode not in ("RGB", "L"):
+            # JPEG has no alpha: flatten transparent areas onto white
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, "white")
+            img.paste(rgba, mask=rgba.getchannel("A"))
+
+        image_format = image_format.upper()
+        output = io.BytesIO()
+        img.save(output, format=image_format, quality=quality, optimize=True)
+        encoded = output.getvalue()
+
+    target_mime = MIME_TYPES.get(image_format, f"image/{image_format.lower()}")
+    if not changed and len(encoded) >= len(data) and source_mime in (*MIME_TYPES.values(), "image/gif"):
+        return data, source_mime
+    print(f"Preprocessed image: {original_size[0]}x{original_size[1]} {len(data) // 1024} KB -> "
+          f"{img.size[0]}x{img.size[1]} {len(encoded) // 1024} KB {target_mime}")
+    return encoded, target_mime
+
+
+def encode_image(image: Union[str, Path, bytes], **kwargs) -> Tuple[str, str]:
+    """:return: (base64 of the preprocessed image, MIME type); kwargs as for preprocess_image"""
+    data, mime = preprocess_image(image, **kwargs)
+    return base64.b64encode(data).decode("utf-8"), mime
+
+
+def image_data_url(image: Union[str, Path, bytes], **kwargs) -> str:
+    """data: URL for an image_url message part, labelled with the real MIME type."""
+    encoded, mime = encode_image(image, **kwargs)
+    return f"data:{mime};base64,{encoded}"
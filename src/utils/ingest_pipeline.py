@@ -0,0 +1,455 @@
+"""
+ingest_pipeline.py
+==========================
+==Streaming Document Ingestion==
+==========================
+store_documents and the custom RAG / vector index scripts loaded the whole PDF, joined
+every page into one string (quadratic concatenation), split it, built every Document and
+only then embedded and inserted them in one call. A 10-K filing is held in memory several
+times over and the embedding model and the database never work at the same time.
+
+This pipeline streams instead:
+
+1. load: pages are read one at a time (PyPDFLoader.lazy_load); a PDF in Object Storage is
+   streamed to a temporary file first, not read into memory
+2. split: each page is split on its own, chunks keep the page metadata ("source", "page")
+   plus their "chunk" position on the page
+3. embed: chunks are embedded in batches of INGEST_BATCH_SIZE by INGEST_EMBED_WORKERS threads
+4. insert: a separate thread inserts embedded batches into the vector store while the next
+   batches are being embedded
+
+Stages are connected by bounded queues (INGEST_QUEUE_DEPTH batches): a slow database stops
+the embedding, which stops the loading, so memory stays constant whatever the document size.
+
+==Resumable Ingestion==
+There is no cap on the number of chunks. Batches are sized to the embedding API limits
+(INGEST_BATCH_SIZE inputs, at most INGEST_BATCH_MAX_CHARS characters) and a throttled or
+transient embedding failure (429, 5xx, timeouts, connection errors) is retried
+INGEST_EMBED_RETRIES times with backoff; other errors fail at once. After every committed
+batch a checkpoint (chunks done) is stored in SQLite under INGEST_CHECKPOINT_DB, keyed by
+the PDF's sha256, the target store (database, user and table, or Chroma directory and
+collection) and the chunk settings. Re-running after a
+crash skips the chunks already stored instead of embedding everything again; a completed
+job is not ingested twice. The checkpoint lives outside the store, so before trusting it
+the store is counted (Chroma collection.count(), OracleVS COUNT(*)): a store holding fewer
+chunks than checkpointed was dropped or recreated, and the PDF is ingested from the start.
+"""
+
+import hashlib
+import itertools
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.utils.pdf_raster import file_digest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "2000"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "100"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "96"))  # OCI GenAI embeds at most 96 inputs per call
+INGEST_BATCH_MAX_CHARS = int(os.getenv("INGEST_BATCH_MAX_CHARS", "200000"))
+INGEST_EMBED_RETRIES = int(os.getenv("INGEST_EMBED_RETRIES", "3"))
+INGEST_RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "2"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))
+INGEST_RESUME = os.getenv("INGEST_RESUME", "true").lower() == "true"
+INGEST_CHECKPOINT_DB = Path(os.getenv("INGEST_CHECKPOINT_DB", PROJECT_ROOT / ".ingest_checkpoints" / "checkpoints.db"))
+
+TRANSIENT_MARKERS = ("429", "throttl", "toomanyrequests", "timeout", "timed out", "temporarily", "unavailable", "connection")
+
+
+@contextmanager
+def local_pdf(use_local: bool, local_path: str = None, namespace: str = None, bucket: str = None,
+              object_name: str = None) -> Iterator[str]:
+    """
+    Path of the PDF to ingest: local_path, or the Object Storage object streamed to a
+    temporary file that is removed afterwards.
+    """
+    if use_local:
+        yield local_path
+        return
+
+    import oci
+
+    config = oci.config.from_file()
+    object_storage = oci.object_storage.ObjectStorageClient(config)
+    response = object_storage.get_object(namespace, bucket, object_name)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+        for block in response.data.raw.stream(1024 * 1024, decode_content=False):
+            tmp_file.write(block)
+        tmp_file_path = tmp_file.name
+    try:
+        yield tmp_file_path
+    finally:
+        os.remove(tmp_file_path)
+
+
+def load_pages(pdf_path: str) -> Iterator[Document]:
+    """One Document per page, read lazily."""
+    return PyPDFLoader(pdf_path).lazy_load()
+
+
+def split_pages(pages: Iterable[Document], splitter=None) -> Iterator[Document]:
+    """Chunks of each page, with the page metadata and their "chunk" index on the page."""
+    if splitter is None:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        # chunk_size should enable as many characters as can fit in max number of tokens allowed for embedding model
+        splitter = RecursiveCharacterTextSplitter(chunk_size=INGEST_CHUNK_SIZE, chunk_overlap=INGEST_CHUNK_OVERLAP)
+    for page in pages:
+        if not page.page_content:
+            continue
+        for number, text in enumerate(splitter.split_text(page.page_content)):
+            yield Document(page_content=text, metadata={**page.metadata, "chunk": number})
+
+
+def batched(documents: Iterable[Document], size: int, max_chars: int = 0) -> Iterator[List[Document]]:
+    """Batches of at most size documents and (when max_chars) max_chars characters."""
+    batch: List[Document] = []
+    chars = 0
+    for doc in documents:
+        if batch and (len(batch) >= size or (max_chars and chars + len(doc.page_content) > max_chars)):
+            yield batch
+            batch, chars = [], 0
+        batch.append(doc)
+        chars += len(doc.page_content)
+    if batch:
+        yield batch
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for throttling and transient service errors; bad input or auth fails the same way again."""
+    # oci.exceptions.ServiceError has .status, requests / httpx errors a .response
+    status = getattr(error, "status", None)
+    if not isinstance(status, int):
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in TRANSIENT_MARKERS)
+
+
+def with_retries(call: Callable[[], Any], retries: int = INGEST_EMBED_RETRIES, backoff: float = INGEST_RETRY_BACKOFF) -> Any:
+    """call(), retried with exponential backoff on throttling and transient errors (see is_transient)."""
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"Embedding failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+
+class IngestCheckpoints:
+
+    def __init__(self, path: Optional[Path] = None):
+        """
+        :param path: SQLite file; None keeps checkpoints in memory
+        """
+        if path is None:
+            database = ":memory:"
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            database = str(path)
+        self._conn = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        if path is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+                job        TEXT PRIMARY KEY,
+                source     TEXT,
+                target     TEXT,
+                documents  INTEGER NOT NULL,
+                batches    INTEGER NOT NULL,
+                last_page  INTEGER,
+                done       INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._lock = threading.Lock()
+
+    def get(self, job: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT documents, batches, last_page, done, updated_at FROM ingest_checkpoints WHERE job = ?", (job,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"documents": row[0], "batches": row[1], "last_page": row[2], "done": bool(row[3]), "updated_at": row[4]}
+
+    def save(self, job: str, source: str, target: str, documents: int, batches: int,
+             last_page: Optional[int], done: bool = False) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingest_checkpoints "
+                "(job, source, target, documents, batches, last_page, done, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job, source, target, documents, batches, last_page, int(done), time.time()),
+            )
+
+    def reset(self, job: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM ingest_checkpoints WHERE job = ?", (job,))
+
+
+_checkpoints: Optional[IngestCheckpoints] = None
+_checkpoints_lock = threading.Lock()
+
+
+def get_checkpoints() -> IngestCheckpoints:
+    """The process-wide checkpoint store, opened on first use."""
+    global _checkpoints
+    with _checkpoints_lock:
+        if _checkpoints is None:
+            _checkpoints = IngestCheckpoints(INGEST_CHECKPOINT_DB)
+        return _checkpoints
+
+
+def stored_documents(vectordb) -> Optional[int]:
+    """Chunks in the vector store: Chroma collection.count() or COUNT(*) of the OracleVS table; None when unknown."""
+    try:
+        collection = getattr(vectordb, "_collection", None)
+        if collection is not None:
+            return collection.count()
+        client, table = getattr(vectordb, "client", None), getattr(vectordb, "table_name", None)
+        if client is not None and table:
+            with client.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Could not count the chunks in the vector store ({e}); trusting the checkpoint")
+    return None
+
+
+def ingest_job_id(pdf_path: str, target: str, **settings: Any) -> str:
+    """Checkpoint key: the PDF content, the target store and anything that changes the chunks."""
+    meta = f"{file_digest(pdf_path)}|{target}|{sorted(settings.items())}"
+    return hashlib.sha256(meta.encode("utf-8")).hexdigest()
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """
+    Embedding function handed to a vector store so add_texts() inserts vectors computed
+    by the embed stage instead of embedding again; queries use the real model.
+    """
+
+    def __init__(self, embed_model: Embeddings):
+        self.embed_model = embed_model
+        self._vectors: Dict[str, List[List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def provide(self, texts: List[str], vectors: List[List[float]]) -> None:
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                self._vectors.setdefault(text, []).append(vector)
+
+    def discard(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """Drop vectors provided for texts that add_texts() did not consume (e.g. the insert failed)."""
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                pending = self._vectors.get(text, [])
+                # by identity: another batch may have provided the same text
+                self._vectors[text] = [other for other in pending if other is not vector]
+                if not self._vectors[text]:
+                    del self._vectors[text]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            vectors = [self._take(text) for text in texts]
+        missing = [text for text, vector in zip(texts, vectors) if vector is None]
+        if missing:  # texts added without going through provide()
+            computed = iter(self.embed_model.embed_documents(missing))
+            vectors = [next(computed) if vector is None else vector for vector in vectors]
+        return vectors
+
+    def _take(self, text: str) -> Optional[List[float]]:
+        # caller holds self._lock
+        pending = self._vectors.get(text)
+        if not pending:
+            return None
+        vector = pending.pop(0)
+        if not pending:
+            del self._vectors[text]
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_model.embed_query(text)
+
+
+def ingest_documents(
+    documents: Iterable[Document],
+    embed: Callable[[List[str]], List[List[float]]],
+    insert: Callable[[List[Document], List[List[float]]], Any],
+    batch_size: int = INGEST_BATCH_SIZE,
+    embed_workers: int = INGEST_EMBED_WORKERS,
+    queue_depth: int = INGEST_QUEUE_DEPTH,
+    max_documents: Optional[int] = None,
+    max_chars: int = INGEST_BATCH_MAX_CHARS,
+    skip: int = 0,
+    on_batch: Optional[Callable[[int, List[Document]], Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Embed and insert a stream of Documents, overlapping the two stages.
+    :param embed: texts -> vectors, e.g. embed_model.embed_documents
+    :param insert: (documents, vectors) -> None, called from one thread in document order
+    :param max_documents: stop after this many documents (default: all)
+    :param skip: documents at the start of the stream already stored (resume)
+    :param on_batch: (documents stored including skipped, batch) after every committed batch
+    :return: {"documents", "skipped", "batches", "pages", "elapsed_s", "embed_s", "insert_s"}
+    """
+    started = time.monotonic()
+    if skip or max_documents is not None:
+        documents = itertools.islice(documents, skip, None if max_documents is None else skip + max_documents)
+    stats = {"documents": 0, "skipped": skip, "batches": 0, "embed_s": 0.0, "insert_s": 0.0}
+    pages = set()
+    inserts: "queue.Queue" = queue.Queue(maxsize=max(1, queue_depth))
+    failure: List[BaseException] = []
+
+    def insert_worker() -> None:
+        while True:
+            item = inserts.get()
+            if item is None:
+                return
+            if failure:
+                continue  # drain so the producer is never blocked
+            batch, vectors = item
+            insert_started = time.monotonic()
+            try:
+                insert(batch, vectors)
+            except BaseException as e:
+                failure.append(e)
+                continue
+            stats["insert_s"] += time.monotonic() - insert_started
+            stats["documents"] += len(batch)
+            stats["batches"] += 1
+            pages.update((doc.metadata.get("source"), doc.metadata.get("page")) for doc in batch)
+            if on_batch is not None:
+                try:
+                    on_batch(skip + stats["documents"], batch)
+                except BaseException as e:
+                    failure.append(e)
+                    continue
+            print(f"Ingested {skip + stats['documents']} chunks")
+
+    def embed_batch(batch: List[Document]):
+        embed_started = time.monotonic()
+        texts = [doc.page_content for doc in batch]
+        vectors = with_retries(lambda: embed(texts))
+        return batch, vectors, time.monotonic() - embed_started
+
+    inserter = threading.Thread(target=insert_worker, name="ingest-insert", daemon=True)
+    inserter.start()
+    in_flight: deque = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, embed_workers), thread_name_prefix="ingest-embed") as executor:
+            for batch in batched(documents, batch_size, max_chars):
+                in_flight.append(executor.submit(embed_batch, batch))
+                # at most queue_depth batches being embedded: backpressure on loading and splitting
+                while len(in_flight) >= max(1, queue_depth) or (in_flight and in_flight[0].done()):
+                    batch, vectors, elapsed = in_flight.popleft().result()
+                    stats["embed_s"] += elapsed
+                    inserts.put((batch, vectors))
+                if failure:
+                    break
+            while in_flight and not failure:
+                batch, vectors, elapsed = in_flight.popleft().result()
+                stats["embed_s"] += elapsed
+                inserts.put((batch, vectors))
+            for future in in_flight:
+                future.cancel()
+    finally:
+        inserts.put(None)
+        inserter.join()
+    if failure:
+        raise failure[0]
+
+    stats["pages"] = len(pages)
+    stats["embed_s"] = round(stats["embed_s"], 2)
+    stats["insert_s"] = round(stats["insert_s"], 2)
+    stats["elapsed_s"] = round(time.monotonic() - started, 2)
+    return stats
+
+
+def vector_store_inserter(vectordb, embeddings: PrecomputedEmbeddings) -> Callable[[List[Document], List[List[float]]], Any]:
+    """insert() for ingest_documents: add_texts on a store built with embedding_function=embeddings."""
+
+    def insert(batch: List[Document], vectors: List[List[float]]) -> Any:
+        texts = [doc.page_content for doc in batch]
+        embeddings.provide(texts, vectors)
+        try:
+            return vectordb.add_texts(texts, metadatas=[doc.metadata for doc in batch])
+        finally:
+            embeddings.discard(texts, vectors)
+
+    return insert
+
+
+def ingest_pdf(pdf_path: str, vectordb, embeddings: PrecomputedEmbeddings, target: str = "default",
+               resume: bool = INGEST_RESUME, checkpoints: Optional[IngestCheckpoints] = None, **kwargs) -> Dict[str, Any]:
+    """
+    load page -> split -> embed batch -> insert batch for one PDF, checkpointed after every batch.
+    :param vectordb: vector store created with embedding_function=embeddings
+    :param target: identity of the store, part of the checkpoint key: database + user + table
+                   or Chroma persist directory + collection, so another store is not skipped
+    :param resume: continue after the last checkpoint; False ingests from the start. A checkpoint
+                   is also ignored when the store holds fewer chunks than it records
+    :param kwargs: as for ingest_documents
+    """
+    checkpoints = checkpoints or get_checkpoints()
+    job = ingest_job_id(pdf_path, target, chunk_size=INGEST_CHUNK_SIZE, chunk_overlap=INGEST_CHUNK_OVERLAP)
+    checkpoint = checkpoints.get(job) if resume else None
+    if not resume:
+        checkpoints.reset(job)
+    if checkpoint and checkpoint["documents"]:
+        # the checkpoint outlives the store: a dropped or recreated table / collection must not be skipped
+        stored = stored_documents(vectordb)
+        if stored is not None and stored < checkpoint["documents"]:
+            print(f"{target} holds {stored} chunks, fewer than the {checkpoint['documents']} checkpointed "
+                  f"for {pdf_path}: the store was recreated, ingesting from the start")
+            checkpoints.reset(job)
+            checkpoint = None
+    if checkpoint and checkpoint["done"]:
+        print(f"{pdf_path} is already ingested into {target} ({checkpoint['documents']} chunks)")
+        return {"documents": 0, "skipped": checkpoint["documents"], "batches": 0, "done": True}
+    skip = checkpoint["documents"] if checkpoint else 0
+    batches = checkpoint["batches"] if checkpoint else 0
+    last_page = checkpoint["last_page"] if checkpoint else None
+    if skip:
+        print(f"Resuming {pdf_path} after {skip} chunks (page {checkpoint['last_page']})")
+
+    def on_batch(documents: int, batch: List[Document]) -> None:
+        nonlocal batches, last_page
+        batches += 1
+        last_page = batch[-1].metadata.get("page")
+        checkpoints.save(job, pdf_path, target, documents, batches, last_page)
+
+    stats = ingest_documents(
+        split_pages(load_pages(pdf_path)),
+        embeddings.embed_model.embed_documents,
+        vector_store_inserter(vectordb, embeddings),
+        skip=skip,
+        on_batch=on_batch,
+        **kwargs,
+    )
+    # a run limited by max_documents can be continued later
+    checkpoints.save(job, pdf_path, target, skip + stats["documents"], batches, last_page,
+                     done=kwargs.get("max_documents") is None)
+    print(f"Ingested {pdf_path}: {stats}")
+    return stats
@@ -0,0 +1,284 @@
+"""
+pdf_raster.py
+==========================
+==Streaming PDF Rasterization==
+==========================
+convert_from_path(pdf, dpi=1024) with Image.MAX_IMAGE_PIXELS = None keeps every page
+of the document in memory as an uncompressed bitmap; one A4 page at 1024 DPI is about
+300 MB, and large-format drawings (images/M-13BM14-0001-DRAWING.pdf is 141 x 183 in)
+are far beyond what a worker can hold. Instead:
+
+1. pages are rendered in chunks of PDF_RENDER_CHUNK_PAGES (or a requested page range)
+   by poppler straight to files (output_folder + paths_only): nothing is decoded in Python
+2. each chunk uses up to PDF_RENDER_THREADS poppler processes
+3. the DPI of a page is lowered when the page would exceed PDF_MAX_PAGE_PIXELS at the
+   requested DPI (page sizes are read with pypdf, without rendering)
+4. page paths are yielded as each chunk finishes, named page_<n>.<ext>
+
+==Render Cache==
+The same PDF is rendered again on every agent retry and step. Rendered pages are kept
+under PDF_RENDER_CACHE_DIR, keyed by the sha256 of the PDF, the page number, the DPI and
+the format:
+
+1. cached pages are hard-linked (or copied) into output_dir without starting poppler
+2. pages are rendered into a staging folder inside the cache and moved into place with
+   os.replace, so concurrent workers never see a partial file (the last writer wins)
+3. hits refresh the file's mtime; beyond PDF_RENDER_CACHE_MAX_MB the least recently used
+   pages are deleted (pages already linked into an output_dir stay valid, which is why a
+   new page is placed in output_dir before it is stored, and never evicted by its own put)
+"""
+
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from pdf2image import convert_from_path
+from pypdf import PdfReader
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+PDF_RENDER_FORMAT = os.getenv("PDF_RENDER_FORMAT", "png")
+PDF_RENDER_CHUNK_PAGES = int(os.getenv("PDF_RENDER_CHUNK_PAGES", "4"))
+PDF_RENDER_THREADS = int(os.getenv("PDF_RENDER_THREADS", "2"))
+PDF_MAX_PAGE_PIXELS = int(os.getenv("PDF_MAX_PAGE_PIXELS", "40000000"))
+
+PDF_RENDER_CACHE = os.getenv("PDF_RENDER_CACHE", "true").lower() == "true"
+PDF_RENDER_CACHE_DIR = Path(os.getenv("PDF_RENDER_CACHE_DIR", PROJECT_ROOT / ".render_cache"))
+PDF_RENDER_CACHE_MAX_MB = float(os.getenv("PDF_RENDER_CACHE_MAX_MB", "2048"))
+
+EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "jpg": ".jpg", "tiff": ".tif", "ppm": ".ppm"}
+
+
+def page_sizes(pdf_path: str) -> List[tuple]:
+    """(width, height) of every page in points (1/72 inch)."""
+    return [(float(page.mediabox.width), float(page.mediabox.height)) for page in PdfReader(pdf_path).pages]
+
+
+def capped_dpi(size: tuple, dpi: int, max_pixels: int = PDF_MAX_PAGE_PIXELS) -> int:
+    """dpi, lowered so a page of size (points) renders to at most max_pixels."""
+    width, height = size
+    pixels = (width / 72 * dpi) * (height / 72 * dpi)
+    if not max_pixels or pixels <= max_pixels:
+        return dpi
+    return max(1, math.floor(72 * math.sqrt(max_pixels / (width * height))))
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RenderCache:
+
+    def __init__(self, root: Path, max_bytes: float = PDF_RENDER_CACHE_MAX_MB * 1024 * 1024):
+        """
+        :param root: cache folder; pages are stored as <root>/<sha[:2]>/<sha>/<dpi>-<fmt>/page_<n>.<ext>
+        :param max_bytes: total size of cached pages before LRU eviction
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.staging = self.root / ".staging"
+        self.staging.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # counted on the first put
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, digest: str, page: int, dpi: int, fmt: str) -> Path:
+        return self.root / digest[:2] / digest / f"{dpi}-{fmt}" / f"page_{page}{EXTENSIONS.get(fmt, '.' + fmt)}"
+
+    def get(self, digest: str, page: int, dpi: int, fmt: str) -> Optional[Path]:
+        path = self.path(digest, page, dpi, fmt)
+        try:
+            os.utime(path)  # LRU position
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, rendered: str, digest: str, page: int, dpi: int, fmt: str) -> Path:
+        """Move a page rendered under self.staging into the cache (atomic replace)."""
+        target = self.path(digest, page, dpi, fmt)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        size = os.path.getsize(rendered)
+        os.replace(rendered, target)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._scan_bytes()
+            else:
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict(keep=target)
+        return target
+
+    def _pages(self) -> List[Path]:
+        return [path for path in self.root.glob("*/*/*/page_*") if path.is_file()]
+
+    def _scan_bytes(self) -> int:
+        total = 0
+        for path in self._pages():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:  # evicted by another worker
+                pass
+        return total
+
+    def _evict(self, keep: Optional[Path] = None) -> None:
+        # caller holds self._lock; the directory is shared, so sizes are re-read from disk
+        pages = []
+        for path in self._pages():
+            if path == keep:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            pages.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in pages) + (keep.stat().st_size if keep else 0)
+        for _, size, path in sorted(pages):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._bytes = total
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self.root.iterdir():
+                if entry != self.staging:
+                    shutil.rmtree(entry, ignore_errors=True)
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": PDF_RENDER_CACHE,
+                "pages": len(self._pages()),
+                "bytes": self._scan_bytes(),
+                "max_bytes": int(self.max_bytes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[RenderCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> RenderCache:
+    """The process-wide render cache, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache(PDF_RENDER_CACHE_DIR)
+        return _cache
+
+
+def _place(source: Path, target: Path) -> None:
+    """Put a cached page at target: a hard link when possible, else a copy; atomic either way."""
+    temporary = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}")
+    try:
+        os.link(source, temporary)
+    except OSError:
+        shutil.copyfile(source, temporary)
+    os.replace(temporary, target)
+    if temporary.exists():  # rename is a no-op when target already is a link to the same file
+        temporary.unlink()
+
+
+def iter_pdf_pages(
+    pdf_path: str,
+    output_dir: str,
+    dpi: int = PDF_RENDER_DPI,
+    first_page: Optional[int] = None,
+    last_page: Optional[int] = None,
+    fmt: str = PDF_RENDER_FORMAT,
+    chunk_pages: int = PDF_RENDER_CHUNK_PAGES,
+    thread_count: int = PDF_RENDER_THREADS,
+    max_pixels: int = PDF_MAX_PAGE_PIXELS,
+    cache: Optional[bool] = None,
+) -> Iterator[str]:
+    """
+    Render pages first_page..last_page (1-based, inclusive; default all) to output_dir.
+    :param fmt: "png", "jpeg", "tiff" or "ppm"
+    :param cache: use the render cache; default PDF_RENDER_CACHE
+    :return: generator of page image paths, in page order
+    """
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    sizes = page_sizes(pdf_path)
+    first = max(1, first_page or 1)
+    last = min(len(sizes), last_page or len(sizes))
+    render_cache = get_render_cache() if (PDF_RENDER_CACHE if cache is None else cache) else None
+    digest = file_digest(pdf_path) if render_cache else None
+    page_dpi = {number: capped_dpi(sizes[number - 1], dpi, max_pixels) for number in range(first, last + 1)}
+
+    def render(start: int, end: int) -> Iterator[str]:
+        chunk_dpi = page_dpi[start]
+        if chunk_dpi < dpi:
+            print(f"Rendering pages {start}-{end} of {pdf_path} at {chunk_dpi} DPI instead of {dpi} (page size)")
+        # poppler output is found again by file name: keep concurrent renders in their own folder
+        folder = Path(tempfile.mkdtemp(dir=render_cache.staging if render_cache else output))
+        try:
+            paths = convert_from_path(
+                pdf_path,
+                dpi=chunk_dpi,
+                first_page=start,
+                last_page=end,
+                fmt=fmt,
+                output_folder=str(folder),
+                output_file="page",
+                paths_only=True,
+                thread_count=max(1, min(thread_count, end - start + 1)),
+            )
+            for number, path in zip(range(start, end + 1), paths):
+                target = output / f"page_{number}{Path(path).suffix}"
+                if render_cache:
+                    _place(Path(path), target)  # linked before put(): evictions cannot reach it
+                    render_cache.put(path, digest, number, chunk_dpi, fmt)
+                else:
+                    os.replace(path, target)
+                yield str(target)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    # consecutive uncached pages with the same DPI are rendered together, up to chunk_pages
+    pending: List[int] = []
+    for number in range(first, last + 1):
+        cached = render_cache.get(digest, number, page_dpi[number], fmt) if render_cache else None
+        if pending and (cached or page_dpi[number] != page_dpi[pending[0]] or len(pending) >= max(1, chunk_pages)):
+            yield from render(pending[0], pending[-1])
+            pending = []
+        if cached:
+            target = output / f"page_{number}{cached.suffix}"
+            try:
+                _place(cached, target)
+            except FileNotFoundError:  # evicted since the lookup
+                pending.append(number)
+                continue
+            yield str(target)
+        else:
+            pending.append(number)
+    if pending:
+        yield from render(pending[0], pending[-1])
@@ -0,0 +1,49 @@
+"""
+pdf_text.py
+==========================
+==PDF Text Layer Extraction==
+==========================
+Most PDF orders are generated by an ERP or a word processor and carry a real text layer;
+rasterizing them and asking the vision model to read the pixels back costs a model call
+and seconds per page for text that is already in the file. This module:
+
+1. reads the text layer of every page locally with pypdf (milliseconds per page)
+2. decides per page whether the text is usable: at least PDF_TEXT_MIN_CHARS letters or
+   digits, and mostly readable characters (scanned pages have no text; PDFs with broken
+   font encodings yield "(cid:12)" or replacement characters)
+3. pages that fail the check are left to rasterization + the vision model
+"""
+
+import os
+import re
+from typing import List
+
+from pypdf import PdfReader
+
+PDF_TEXT_FIRST = os.getenv("PDF_TEXT_FIRST", "true").lower() == "true"
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "40"))
+PDF_TEXT_MIN_READABLE = float(os.getenv("PDF_TEXT_MIN_READABLE", "0.8"))
+
+_UNREADABLE = re.compile(r"\(cid:\d+\)|�")
+
+
+def page_texts(pdf_path: str) -> List[str]:
+    """Text layer of every page, in page order ("" for pages without one)."""
+    texts = []
+    for page in PdfReader(pdf_path).pages:
+        try:
+            texts.append(page.extract_text() or "")
+        except Exception as e:  # a damaged content stream only costs that page its text tier
+            print(f"Text extraction failed on a page of {pdf_path}: {e}")
+            texts.append("")
+    return texts
+
+
+def usable_text(text: str, min_chars: int = PDF_TEXT_MIN_CHARS, min_readable: float = PDF_TEXT_MIN_READABLE) -> bool:
+    """True when the text layer carries enough readable content to extract the page from."""
+    text = (text or "").strip()
+    if sum(ch.isalnum() for ch in text) < min_chars:
+        return False
+    unreadable = sum(len(match) for match in _UNREADABLE.findall(text))
+    unreadable += sum(1 for ch in text if not ch.isprintable() and not ch.isspace())
+    return 1 - unreadable / len(text) >= min_readable
@@ -0,0 +1,205 @@
+"""
+vision_batch.py
+==========================
+==Multi-Page Vision Extraction==
+==========================
+Orders arrive as multi-page PDFs and image sets. Extracting them one image_to_text call
+at a time makes a 10 page order take 10 model round trips. This module:
+
+1. expands the inputs into pages: images as they are; PDF pages with a usable text layer
+   as text (tier "text", see src/utils/pdf_text.py), the others rendered at VISION_PDF_DPI
+   (tier "vision"). Text pages skip the vision model entirely
+2. runs the per-page extraction concurrently, at most VISION_BATCH_CONCURRENCY at a time,
+   so the batch takes about as long as its slowest page
+3. parses each page's answer into a Transaction fragment (```json``` block or bare JSON)
+4. merges the fragments into one order: header fields from the first page that has them
+   (differing values are reported as conflicts), lines concatenated in page order with
+   lines carried over to the next page (the same numbered line on the previous page with
+   lines) dropped and line numbers made unique
+"""
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from src.data.sales_order import LineItem, Transaction
+from src.utils.pdf_raster import iter_pdf_pages
+from src.utils.pdf_text import PDF_TEXT_FIRST, page_texts, usable_text
+
+VISION_BATCH_CONCURRENCY = int(os.getenv("VISION_BATCH_CONCURRENCY", "4"))
+VISION_PDF_DPI = int(os.getenv("VISION_PDF_DPI", "200"))
+
+LINE_NUMBER_FIELDS = ("SourceTransactionLineNumber", "SourceTransactionLineId")
+
+
+class Page(NamedTuple):
+    source: str                # label like "order.pdf#2"
+    tier: str                  # "text": the PDF text layer, "vision": an image for the vision model
+    content: Union[str, bytes]
+
+
+def _pdf_pages(path: Path, dpi: int, text_first: bool) -> List[Page]:
+    pages: Dict[int, Page] = {}
+    raster = [[None, None]]  # page ranges to render; (None, None) is the whole document
+    if text_first:
+        raster = []
+        for number, text in enumerate(page_texts(str(path)), start=1):
+            if usable_text(text):
+                pages[number] = Page(f"{path.name}#{number}", "text", text)
+            elif raster and raster[-1][1] == number - 1:
+                raster[-1][1] = number
+            else:
+                raster.append([number, number])
+
+    # render only the pages without a usable text layer
+    with TemporaryDirectory() as output_dir:
+        for first, last in raster:
+            page_paths = iter_pdf_pages(str(path), output_dir, dpi=dpi, first_page=first, last_page=last, fmt="jpeg")
+            for number, page_path in enumerate(page_paths, start=first or 1):
+                pages[number] = Page(f"{path.name}#{number}", "vision", Path(page_path).read_bytes())
+    return [pages[number] for number in sorted(pages)]
+
+
+def load_pages(paths: Iterable[str], dpi: int = VISION_PDF_DPI, text_first: bool = PDF_TEXT_FIRST) -> List[Page]:
+    """
+    :param paths: image files and/or PDFs
+    :param text_first: use the text layer of PDF pages that have one instead of rendering them
+    :return: pages in input order
+    """
+    pages = []
+    for path in paths:
+        path = Path(path)
+        if path.suffix.lower() == ".pdf":
+            pages.extend(_pdf_pages(path, dpi, text_first))
+        else:
+            pages.append(Page(path.name, "vision", path.read_bytes()))
+    return pages
+
+
+def parse_transaction(text: str) -> Optional[Dict[str, Any]]:
+    """The order JSON in a model answer: a ```json``` block, else the outermost {...}."""
+    candidates = re.findall(r"```(?:json)?\s*(.*?)```", text or "", re.DOTALL)
+    start, end = (text or "").find("{"), (text or "").rfind("}")
+    if -1 < start < end:  # an answer cut off after its "{" has no outermost object
+        candidates.append(text[start:end + 1])
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, list):
+            data = next((item for item in data if isinstance(item, dict)), None)
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def _line_key(line: Dict[str, Any]) -> str:
+    return json.dumps(line, sort_keys=True, default=str)
+
+
+def merge_transactions(fragments: List[Optional[Dict[str, Any]]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Combine per-page Transaction fragments (None for pages without one).
+    :return: (merged order, conflicts as {"field", "values": [{"page", "value"}]})
+    """
+    order: Dict[str, Any] = {}
+    seen: Dict[str, List[Dict[str, Any]]] = {}
+    lines: List[Dict[str, Any]] = []
+    previous_keys = set()  # numbered lines of the last page that had lines
+
+    for page, fragment in enumerate(fragments, start=1):
+        if not fragment:
+            continue
+        for name, value in fragment.items():
+            if name == "lines" or name not in Transaction.model_fields or value in (None, "", [], {}):
+                continue
+            values = seen.setdefault(name, [])
+            if all(entry["value"] != value for entry in values):
+                values.append({"page": page, "value": value})
+            order.setdefault(name, value)
+        page_keys = set()
+        for line in fragment.get("lines") or []:
+            if not isinstance(line, dict):
+                continue
+            line = {k: v for k, v in line.items() if k in LineItem.model_fields and v not in (None, "")}
+            if not line:
+                continue
+            # only a numbered line repeated from the previous page is a carry-over; the same
+            # product and quantity ordered again on another page is a separate line
+            if any(name in line for name in LINE_NUMBER_FIELDS):
+                key = _line_key(line)
+                page_keys.add(key)
+                if key in previous_keys:
+                    continue
+            lines.append(line)
+        if fragment.get("lines"):
+            previous_keys = page_keys
+
+    for name in LINE_NUMBER_FIELDS:
+        numbers = [line[name] for line in lines if name in line]
+        if len(set(numbers)) != len(numbers):  # pages numbered their lines from 1 each
+            for number, line in enumerate(lines, start=1):
+                if name in line:
+                    line[name] = str(number)
+    if lines:
+        order["lines"] = lines
+
+    conflicts = [{"field": name, "values": values} for name, values in seen.items() if len(values) > 1]
+    return order, conflicts
+
+
+def extract_pages(
+    pages: List[Page],
+    extract: Callable[[bytes], str],
+    concurrency: int = VISION_BATCH_CONCURRENCY,
+    extract_text: Optional[Callable[[str], str]] = None,
+) -> Dict[str, Any]:
+    """
+    Run extract(image bytes) -> model answer for every vision page and extract_text(page text)
+    for every text page concurrently, and merge the results.
+    :return: {"order", "conflicts", "tiers", "elapsed_ms",
+              "pages": [{"page", "source", "tier", "elapsed_ms", "lines" | "error"}]}
+    """
+    started = time.monotonic()
+
+    def run(page: Page) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        page_started = time.monotonic()
+        report: Dict[str, Any] = {"source": page.source, "tier": page.tier}
+        fragment = None
+        try:
+            if page.tier == "text":
+                if extract_text is None:
+                    raise ValueError("no extractor for text pages")
+                answer = extract_text(page.content)
+            else:
+                answer = extract(page.content)
+            fragment = parse_transaction(answer)
+            if fragment is None:
+                report["error"] = "no order JSON in the model answer"
+            else:
+                report["lines"] = len(fragment.get("lines") or [])
+        except Exception as e:
+            report["error"] = str(e)
+        report["elapsed_ms"] = round((time.monotonic() - page_started) * 1000)
+        return fragment, report
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pages) or 1))) as executor:
+        results = list(executor.map(run, pages))
+
+    order, conflicts = merge_transactions([fragment for fragment, _ in results])
+    tiers: Dict[str, int] = {}
+    for page in pages:
+        tiers[page.tier] = tiers.get(page.tier, 0) + 1
+    return {
+        "order": order,
+        "conflicts": conflicts,
+        "tiers": tiers,
+        "pages": [{"page": page, **report} for page, (_, report) in enumerate(results, start=1)],
+        "elapsed_ms": round((time.monotonic() - started) * 1000),
+    }
@@ -0,0 +1,240 @@
+"""
+vision_cache.py
+==========================
+==Content-Addressed Cache for image_to_text==
+==========================
+The same order image is extracted several times: by the supervisor, by the
+receive_sales_order sub-agent, again in the create step and on UI retries. Each time is
+a paid vision LLM call taking seconds. Results are cached by content:
+
+1. key = sha256 of the image bytes, the question, the schema version, the model id and
+   the preprocessing settings (anything that changes what the model sees)
+2. stored in SQLite under VISION_CACHE_DIR, shared by every process on the host
+3. entries expire after VISION_CACHE_TTL seconds; when the stored results exceed
+   VISION_CACHE_MAX_MB the least recently used entries are evicted
+4. concurrent extractions of the same key wait for the first one instead of calling
+   the model again
+5. only usable answers are stored: empty answers, refusals and error text (and, for
+   schema extractions, answers without parseable JSON) are returned but not cached,
+   so the next call asks the model again
+6. stats() reports hits, misses, evictions, uncached answers and the model time saved
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+VISION_CACHE = os.getenv("VISION_CACHE", "true").lower() == "true"
+VISION_CACHE_DIR = Path(os.getenv("VISION_CACHE_DIR", PROJECT_ROOT / ".vision_cache"))
+VISION_CACHE_MAX_MB = float(os.getenv("VISION_CACHE_MAX_MB", "200"))
+VISION_CACHE_TTL = float(os.getenv("VISION_CACHE_TTL", "604800"))
+
+# answers starting like this report a failure or a refusal, not an extraction
+ERROR_PREFIXES = ("error", "api call failed", "sorry", "i'm sorry", "i am sorry", "i cannot", "i can't",
+                  "i am unable", "i'm unable", "unable to")
+
+
+def schema_version(schema: Optional[Dict]) -> str:
+    """Short hash of a JSON schema; changes whenever the extraction model changes."""
+    if schema is None:
+        return "none"
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def usable_answer(value: Any) -> bool:
+    """False for an answer not worth caching: empty, or an error message / refusal instead of content."""
+    if not isinstance(value, str) or not value.strip():
+        return False
+    return not value.strip().lower().startswith(ERROR_PREFIXES)
+
+
+def extraction_key(image: bytes, question: str, schema: str, model_id: Optional[str], **settings: Any) -> str:
+    """
+    :param image: raw image bytes (before preprocessing)
+    :param schema: schema version, see schema_version()
+    :param settings: anything else that changes the request, e.g. preprocessing options
+    """
+    digest = hashlib.sha256(image)
+    meta = json.dumps({"question": question, "schema": schema, "model": model_id, **settings}, sort_keys=True, default=str)
+    digest.update(b"\0" + meta.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class VisionCache:
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: float = VISION_CACHE_MAX_MB * 1024 * 1024,
+                 ttl: float = VISION_CACHE_TTL):
+        """
+        :param path: SQLite file; None keeps entries in memory
+        :param max_bytes: total size of stored results before LRU eviction
+        :param ttl: seconds an entry is served
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        if path is None:
+            database = ":memory:"
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            database = str(path)
+        self._conn = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        if path is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vision_cache (
+                key         TEXT PRIMARY KEY,
+                value       TEXT NOT NULL,
+                size        INTEGER NOT NULL,
+                elapsed     REAL NOT NULL,
+                created_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vision_cache_accessed ON vision_cache (accessed_at)")
+        self._lock = threading.Lock()
+        # key -> [lock, callers holding or waiting for it]; dropped when the last one leaves
+        self._key_locks: Dict[str, list] = {}
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+        self.evictions = 0
+        self.expired = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, elapsed, created_at FROM vision_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, elapsed, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM vision_cache WHERE key = ?", (key,))
+                self.expired += 1
+                return None
+            self._conn.execute("UPDATE vision_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self.saved_seconds += elapsed
+        return value
+
+    def put(self, key: str, value: str, elapsed: float = 0.0) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vision_cache (key, value, size, elapsed, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, size, elapsed, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # caller holds self._lock
+        self.expired += self._conn.execute(
+            "DELETE FROM vision_cache WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM vision_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM vision_cache ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM vision_cache WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], str],
+                       cacheable: Callable[[str], bool] = usable_answer) -> str:
+        """
+        Cached value for key, or compute(), store and return it. Only one caller per key
+        computes at a time; the others wait and get the stored result.
+        :param cacheable: values failing this check are returned but not stored; the next
+                          waiter computes again
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                value = self.get(key)
+                if value is not None:
+                    return value
+                self.misses += 1
+                started = time.monotonic()
+                value = compute()
+                if cacheable(value):
+                    self.put(key, value, time.monotonic() - started)
+                else:
+                    self.uncached += 1
+            return value
+        finally:
+            # the last caller drops the lock, also when compute() raises; popping it while
+            # others still wait would let the next caller compute alongside them
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0 and self._key_locks.get(key) is entry:
+                    del self._key_locks[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM vision_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM vision_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": VISION_CACHE,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": int(self.max_bytes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "saved_seconds": round(self.saved_seconds, 1),
+        }
+
+
+_cache: Optional[VisionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_vision_cache() -> VisionCache:
+    """The process-wide cache, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VisionCache(VISION_CACHE_DIR / "image_to_text.db")
+        return _cache
+
+
+def cached_extraction(image: bytes, question: str, schema: str, model_id: Optional[str],
+                      compute: Callable[[], str], cacheable: Callable[[str], bool] = usable_answer,
+                      **settings: Any) -> str:
+    """
+    compute() through the cache, or directly when VISION_CACHE=false.
+    :param cacheable: which answers may be stored, see VisionCache.get_or_compute()
+    """
+    if not VISION_CACHE:
+        return compute()
+    key = extraction_key(image, question, schema, model_id, **settings)
+    return get_vision_cache().get_or_compute(key, compute, cacheable)